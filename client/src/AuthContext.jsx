@@ -1,4 +1,5 @@
 import { createContext, useContext, useState, useEffect } from "react";
+import axios from "axios";
 
 const AuthContext = createContext();
 
@@ -7,6 +8,15 @@ export const AuthProvider = ({ children }) => {
     () => JSON.parse(localStorage.getItem("user")) || null
   );
 
+  // Every API call carries the signed token issued at login.
+  useEffect(() => {
+    if (user?.token) {
+      axios.defaults.headers.common.Authorization = `Bearer ${user.token}`;
+    } else {
+      delete axios.defaults.headers.common.Authorization;
+    }
+  }, [user]);
+
   const login = (userData) => {
     localStorage.setItem("user", JSON.stringify(userData));
     setUser(userData);
@@ -17,6 +27,18 @@ export const AuthProvider = ({ children }) => {
     setUser(null);
   };
 
+  // A 401 on a request that carried our token means it expired or the server
+  // no longer accepts it: drop it so the user is sent back to the login page.
+  useEffect(() => {
+    const interceptor = axios.interceptors.response.use(undefined, (error) => {
+      if (error.response?.status === 401 && error.config?.headers?.Authorization) {
+        logout();
+      }
+      return Promise.reject(error);
+    });
+    return () => axios.interceptors.response.eject(interceptor);
+  }, []);
+
   return (
     <AuthContext.Provider value={{ user, login, logout }}>
       {children}
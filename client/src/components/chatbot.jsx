@@ -1,9 +1,12 @@
 import React, { useState, useRef, useEffect } from 'react';
-import axios from 'axios';
+import { useAuth } from '../AuthContext';
 
 const Chatbot = () => {
+  const { user, logout } = useAuth();
   const [message, setMessage] = useState('');
   const [chat, setChat] = useState([]);
+  // The server keeps the conversation; the client only remembers which one this is.
+  const [conversationId, setConversationId] = useState(null);
   const messagesEndRef = useRef(null);
 
   const sendMessage = async () => {
@@ -14,9 +17,48 @@ const Chatbot = () => {
     setMessage('');
 
     try {
-      const res = await axios.post('http://localhost:5000/api/chat', { message });
-      const reply = res.data.reply;
-      setChat([...newChat, { sender: 'bot', text: reply }]);
+      // Stream the reply token by token over server-sent events.
+      const res = await fetch('http://localhost:5000/api/chat/stream', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          ...(user?.token && { Authorization: `Bearer ${user.token}` }),
+        },
+        body: JSON.stringify({
+          message,
+          userId: user?.id,
+          conversationId: conversationId || undefined,
+          newConversation: !conversationId,
+        }),
+      });
+      if (res.status === 401 && user?.token) {
+        logout();
+        return;
+      }
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let reply = '';
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const event of events) {
+          const dataLine = event.split('\n').find((line) => line.startsWith('data: '));
+          if (!dataLine) continue;
+          const data = JSON.parse(dataLine.slice(6));
+          if (data.error) throw new Error(data.error);
+          if (data.conversationId) setConversationId(data.conversationId);
+          if (data.token) {
+            reply += data.token;
+            setChat([...newChat, { sender: 'bot', text: reply }]);
+          }
+        }
+      }
     } catch (err) {
       console.error('Chat error:', err);
       setChat([...newChat, { sender: 'bot', text: 'Something went wrong. Please try again.' }]);
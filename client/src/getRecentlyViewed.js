@@ -0,0 +1,25 @@
+import axios from "axios";
+
+const API_URL = import.meta.env.VITE_API_URL;
+
+// Fire-and-forget: the server buffers views and writes them in bulk.
+export const recordView = (userId, home) =>
+  axios
+    .post(`${API_URL}/recently-viewed`, {
+      userId,
+      homeId: home.id || home.zpid,
+      title: home.title,
+      city: home.city,
+      price: home.price,
+      bedrooms: home.bedrooms,
+      bathrooms: home.bathrooms,
+      image: home.image,
+    })
+    .catch((err) => console.error(err));
+
+export default async function getRecentlyViewed(userId, limit = 20) {
+  const res = await axios.get(`${API_URL}/recently-viewed`, {
+    params: { userId, limit },
+  });
+  return res.data.views || [];
+}
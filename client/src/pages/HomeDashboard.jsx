@@ -14,26 +14,20 @@ const HomeDashboard = () => {
 
   const USER_ID = user?.id;
 
-// Fetch tasks and favorite homes for the user on component mount/update
+// Fetch tasks and favorite homes for the user on component mount/update (one call)
 useEffect(() => {
   if (!user?.id) return;
 
-  // Get current tasks for the user
   axios
-    .get("http://localhost:5000/api/tasks", {
-      params: { user_id: USER_ID },
-    })
-    .then((res) => setTasks(res.data.tasks))
-    .catch((err) => console.error("Failed to fetch tasks:", err));
-
-  // Get favorited homes for the user (✅ use /api/favorites now)
-  axios
-    .get("http://localhost:5000/api/favorites", {
+    .get("http://localhost:5000/api/dashboard", {
       params: { userId: USER_ID },
     })
-    .then((res) => setFavorites(res.data.favorites || []))
+    .then((res) => {
+      setTasks(res.data.tasks || []);
+      setFavorites(res.data.favorites || []);
+    })
     .catch((err) => {
-      console.error("Failed to fetch favorite homes:", err);
+      console.error("Failed to load dashboard:", err);
       setFavorites([]);
     });
 }, [user?.id]);
@@ -76,10 +70,7 @@ useEffect(() => {
     await axios.delete(
       `http://localhost:5000/api/favorites/${home._id}`
     );
-    const res = await axios.get("http://localhost:5000/api/favorites", {
-      params: { userId: user.id },
-    });
-    setFavorites(res.data.favorites || []);
+    setFavorites((prev) => prev.filter((fav) => fav._id !== home._id));
   } catch (err) {
     console.error("Failed to unfavorite:", err);
   }
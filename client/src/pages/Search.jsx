@@ -1,6 +1,7 @@
 import React, { useState } from 'react';
 import axios from 'axios';
 import { useAuth } from '../AuthContext';
+import { recordView } from '../getRecentlyViewed';
 
 const Search = () => {
   const { user } = useAuth(); // Assuming useAuth is available
@@ -76,6 +77,7 @@ const addFavorite = async (home) => {
               src={home.image || "https://via.placeholder.com/300"}
               alt={home.title}
               className="w-full h-40 object-cover mb-2 rounded"
+              onClick={() => user?.id && recordView(user.id, home)}
             />
             <h3 className="font-semibold">{home.title}</h3>
             <p className="text-sm text-gray-600">{home.city}</p>
@@ -1,11 +1,33 @@
 from flask import Flask
 from flask_cors import CORS
+from app.migrations import migrate_command
+from app.price_refresh import refresh_prices_command, start_price_refresh
+from app.responses import FastJSONProvider
 from app.routes import api
 
-def create_app():
+def create_app(background=True):
+    """The Flask app; background=False leaves background workers to the caller (see app/prefork.py)."""
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     CORS(app)
     app.register_blueprint(api, url_prefix="/api")
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(refresh_prices_command)
+    if background:
+        start_price_refresh()
+
+    return app
+
+
+def create_async_app():
+    """Quart app for the async serving mode; see app/asgi.py."""
+    from quart import Quart
+    from quart_cors import cors
+
+    from app.async_routes import async_api
+
+    app = cors(Quart(__name__))
+    app.register_blueprint(async_api, url_prefix="/api")
 
     return app
 
@@ -0,0 +1,24 @@
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+
+from app import create_app, create_async_app
+
+# Run with:  uvicorn --factory app.asgi:create_asgi_app --port 5000
+
+
+def create_asgi_app():
+    """Serve the async endpoints natively and hand every other route to the sync Flask app."""
+    async_app = create_async_app()
+    sync_app = WsgiToAsgi(create_app())
+
+    async def app(scope, receive, send):
+        if scope["type"] == "http":
+            adapter = async_app.url_map.bind("")
+            try:
+                adapter.match(scope["path"], method=scope["method"])
+            except (NotFound, MethodNotAllowed):
+                return await sync_app(scope, receive, send)
+        # Quart also owns the lifespan protocol (startup/shutdown hooks).
+        return await async_app(scope, receive, send)
+
+    return app
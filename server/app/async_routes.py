@@ -0,0 +1,237 @@
+import asyncio
+import os
+import traceback
+
+from openai import RateLimitError
+from quart import Blueprint, Response, g, jsonify, request
+
+from app.auth import request_user_id
+from app.conversations import open_conversation, remember
+from app.db import get_async_db
+from app.listings import is_covered, location_match, save_listings, search_listings, stale_search
+from app.llm import LLMBusy, gateway
+from app.metrics import instrument_async, log_event
+from app.plan_cache import plan_cache, plan_key
+from app.routes import (
+    SSE_HEADERS,
+    TASK_MODEL,
+    async_search_refresh,
+    build_task_prompt,
+    chat_prompt,
+    conversation_fields,
+    llm_unavailable,
+    parse_search_response,
+    parse_task_reply,
+    search_args,
+    search_cache,
+    search_cache_key,
+    search_page_key,
+    serialize_task,
+    sse_event,
+    task_document,
+    zillow_search_request,
+)
+from app.task_repository import replace_tasks_async
+from app.upstream import async_http_client
+
+# Async versions of the I/O-bound endpoints. Everything else is still served by
+# the sync blueprint in app.routes (see app/asgi.py).
+
+async_api = Blueprint("async_api", __name__)
+instrument_async(async_api)
+zillow = async_http_client()
+
+
+@async_api.before_request
+async def authenticate():
+    g.user_id, g.auth_error = request_user_id(request.headers.get("Authorization"))
+
+
+@async_api.route("/tasks/generate", methods=["POST"])
+async def generate_tasks():
+    data = await request.get_json()
+    credit_score = data.get("credit_score")
+    refinancing_info = data.get("refinancing_info")
+    user_id = data.get("user_id")
+    if g.get("user_id") is not None:
+        if user_id and user_id != g.user_id:
+            return jsonify({"error": "Token does not match user_id"}), 403
+        user_id = g.user_id
+
+    db = get_async_db()
+    house = await db["Home"].find_one({"listedById": user_id})
+    prompt = build_task_prompt(credit_score, refinancing_info, house)
+
+    generated = False
+
+    async def generate_plan():
+        nonlocal generated
+        generated = True
+        response = await gateway.acomplete(
+            model=TASK_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=500,
+            n=1
+        )
+        reply = response.choices[0].message.content.strip()
+        tokens = response.usage.total_tokens if response.usage else 0
+        return {"tasks": parse_task_reply(reply), "tokens": tokens}
+
+    try:
+        key = plan_key(TASK_MODEL, credit_score, refinancing_info, house)
+        plan = await plan_cache.aget_or_load(key, generate_plan)
+        plan_cache.record(plan, generated)
+        task_objects = plan["tasks"]
+    except (RateLimitError, LLMBusy) as e:
+        payload, status, headers = llm_unavailable(e)
+        return jsonify(payload), status, headers
+    except ValueError as e:
+        log_event("task_generation_failed", level="error", user_id=user_id, reason="invalid_json", error=str(e))
+        return jsonify({"error": "Failed to parse AI response as JSON."}), 500
+    except Exception as e:
+        log_event("task_generation_failed", level="error", user_id=user_id, reason="llm_error", error=str(e))
+        traceback.print_exc()
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+    docs = await replace_tasks_async(user_id, [task_document(task, user_id) for task in task_objects])
+    new_tasks = [serialize_task(doc["_id"], doc) for doc in docs]
+
+    return jsonify({"tasks": new_tasks}), 201
+
+
+async def chat_conversation(data):
+    """(conversation, error response) for this message; conversation is None for anonymous chat."""
+    user_id = data.get("userId")
+    if g.get("user_id") is not None:
+        if user_id and user_id != g.user_id:
+            return None, (jsonify({"error": "Token does not match user_id"}), 403)
+        user_id = g.user_id
+    if not user_id:
+        return None, None
+    new = str(data.get("newConversation", "")).lower() in ("1", "true")
+    conversation = await asyncio.to_thread(open_conversation, user_id, data.get("conversationId"), new)
+    if conversation is None:
+        return None, (jsonify({"error": "Conversation not found"}), 404)
+    return conversation, None
+
+
+@async_api.route("/chat", methods=["POST"])
+async def chat():
+    data = await request.get_json()
+    user_message = data.get("message")
+    conversation, error = await chat_conversation(data)
+    if error:
+        return error
+
+    try:
+        response = await gateway.acomplete(
+            model="gpt-4",
+            messages=await asyncio.to_thread(chat_prompt, conversation, user_message),
+            temperature=0.7,
+        )
+        reply = response.choices[0].message.content.strip()
+        if conversation:
+            await asyncio.to_thread(remember, conversation, user_message, reply)
+        return jsonify({"reply": reply, **conversation_fields(conversation)})
+    except (RateLimitError, LLMBusy) as e:
+        payload, status, headers = llm_unavailable(e)
+        return jsonify(payload), status, headers
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@async_api.route("/chat/stream", methods=["GET", "POST"])
+async def chat_stream():
+    if request.method == "GET":
+        data = request.args
+    else:
+        data = (await request.get_json(silent=True)) or {}
+    user_message = data.get("message")
+    if not user_message:
+        return jsonify({"error": "message is required"}), 400
+    conversation, error = await chat_conversation(data)
+    if error:
+        return error
+
+    try:
+        stream = await gateway.astream(
+            model="gpt-4",
+            messages=await asyncio.to_thread(chat_prompt, conversation, user_message),
+            temperature=0.7,
+        )
+    except (RateLimitError, LLMBusy) as e:
+        payload, status, headers = llm_unavailable(e)
+        return jsonify(payload), status, headers
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    async def generate():
+        tokens = []
+        try:
+            async for chunk in stream:
+                token = chunk.choices[0].delta.content if chunk.choices else None
+                if token:
+                    tokens.append(token)
+                    yield sse_event({"token": token}).encode()
+            if conversation:
+                await asyncio.to_thread(remember, conversation, user_message, "".join(tokens).strip())
+            yield sse_event({"done": True, **conversation_fields(conversation)}, event="done").encode()
+        except Exception as e:
+            yield sse_event({"error": str(e)}, event="error").encode()
+        finally:
+            # Quart cancels this generator when the client disconnects.
+            await stream.close()
+
+    response = Response(generate(), mimetype="text/event-stream", headers=SSE_HEADERS)
+    response.timeout = None  # streams may outlive Quart's default response timeout
+    return response
+
+
+async def fetch_zillow_search(location, status_type, home_type):
+    url, headers, params = zillow_search_request(location, status_type, home_type)
+    resp = await zillow.get(url, headers=headers, params=params)
+    resp.raise_for_status()
+    return parse_search_response(resp.json())
+
+
+async def refresh_listings(location, status_type, home_type):
+    results = await fetch_zillow_search(location, status_type, home_type)
+    await asyncio.to_thread(save_listings, results, location, status_type, home_type)
+    return results
+
+
+@async_api.route("/search", methods=["GET"])
+async def search_homes():
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"results": []})
+
+    key, location, status_type, home_type = search_cache_key(request.args)
+    try:
+        filters, keywords, limit = search_args(request.args)
+    except ValueError:
+        return jsonify({"error": "Filters and limit must be numbers"}), 400
+
+    # The listing index is queried with the sync driver, off the event loop.
+    source = "local"
+
+    async def load_page():
+        nonlocal source
+        if not await asyncio.to_thread(is_covered, location, status_type, home_type):
+            if not os.getenv("ZILLOW_API_KEY"):
+                raise RuntimeError("ZILLOW_API_KEY not configured")
+            await async_search_refresh.do(key, lambda: refresh_listings(location, status_type, home_type))
+            source = "upstream"
+        match = location_match(location, status_type, home_type, filters)
+        return await asyncio.to_thread(search_listings, match, keywords, limit)
+
+    try:
+        page = await search_cache.aget_or_load(search_page_key(key, filters, keywords, limit), load_page)
+    except Exception as e:
+        traceback.print_exc()
+        page = await asyncio.to_thread(stale_search, location, status_type, home_type, filters, keywords, limit)
+        if not page or not page["results"]:
+            return jsonify({"error": str(e)}), 500
+        source = "stale"
+
+    return jsonify({**page, "source": source})
@@ -0,0 +1,92 @@
+import hmac
+import os
+
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from app.cache import TieredCache
+from app.db import db
+from app.metrics import log_event
+
+# Must be the same for every worker, or tokens issued by one are rejected by the others.
+SECRET_KEY = os.getenv("AUTH_SECRET_KEY") or os.getenv("SECRET_KEY")
+TOKEN_MAX_AGE = int(os.getenv("AUTH_TOKEN_MAX_AGE", str(7 * 24 * 3600)))
+# Shared secret for internal jobs (e.g. nightly re-planning) acting on many users; unset disables them.
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN")
+
+if not SECRET_KEY:
+    # Tokens signed with this key fail in other workers and after a restart; see request_user_id.
+    log_event("auth.ephemeral_secret", level="warning",
+              message="AUTH_SECRET_KEY is not set; using a per-process key, tokens will not survive restarts.")
+    SECRET_KEY = os.urandom(32).hex()
+
+_serializer = URLSafeTimedSerializer(SECRET_KEY, salt="auth-token")
+
+# Resolved user records (never the password hash), so authenticated endpoints skip a User read.
+user_cache = TieredCache(
+    "auth_users",
+    maxsize=int(os.getenv("AUTH_USER_CACHE_SIZE", "10000")),
+    ttl=int(os.getenv("AUTH_USER_CACHE_TTL", "300")),
+)
+
+
+class AuthError(Exception):
+    """Bearer token missing the expected format, forged or expired."""
+
+
+def issue_token(user_id):
+    return _serializer.dumps(str(user_id))
+
+
+def verify_token(token):
+    """Return the user id a token was issued for; raises AuthError. Pure CPU, no Mongo."""
+    try:
+        return _serializer.loads(token, max_age=TOKEN_MAX_AGE)
+    except SignatureExpired:
+        raise AuthError("Token expired")
+    except BadSignature:
+        raise AuthError("Invalid token")
+
+
+def user_id_from_header(authorization):
+    """User id from an `Authorization: Bearer <token>` header, or None if the header is absent."""
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise AuthError("Expected a Bearer token")
+    return verify_token(token.strip())
+
+
+def request_user_id(authorization):
+    """(user id, error) for a request's Authorization header.
+
+    A token this process cannot verify (expired, or signed with another key)
+    is treated as absent rather than failing the request: the legacy
+    user_id parameter keeps working, and endpoints that require a token
+    answer 401 with the error.
+    """
+    try:
+        return user_id_from_header(authorization), None
+    except AuthError as e:
+        log_event("auth.invalid_token", sample=True, level="warning", error=str(e))
+        return None, str(e)
+
+
+def is_internal(token):
+    """True if token is the configured X-Internal-Token secret."""
+    return bool(INTERNAL_API_TOKEN and token) and hmac.compare_digest(token, INTERNAL_API_TOKEN)
+
+
+def load_user(user_id):
+    """User record (id, name, email) through the LRU; None if the user no longer exists."""
+
+    def fetch():
+        try:
+            doc = db["User"].find_one({"_id": ObjectId(user_id)}, {"name": 1, "email": 1})
+        except InvalidId:
+            return None
+        return {"id": str(doc["_id"]), "name": doc.get("name"), "email": doc.get("email")} if doc else None
+
+    return user_cache.get_or_load(user_id, fetch)
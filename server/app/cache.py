@@ -0,0 +1,289 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+# Every named cache registers itself here so /api/cache/stats can report it.
+CACHES = {}
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class MongoCacheTier:
+    """Cache tier shared by all workers, stored one document per key in Mongo."""
+
+    def __init__(self, collection_name, ttl=300):
+        self.collection_name = collection_name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._index_ready = False
+
+    def _collection(self):
+        from app.db import db
+
+        collection = db[self.collection_name]
+        if not self._index_ready:
+            # Mongo's TTL monitor removes documents once expiresAt has passed.
+            collection.create_index("expiresAt", expireAfterSeconds=0)
+            self._index_ready = True
+        return collection
+
+    def get(self, key, default=None):
+        try:
+            doc = self._collection().find_one(
+                {"_id": key, "expiresAt": {"$gt": datetime.now(timezone.utc)}},
+                {"value": 1},
+            )
+        except Exception as e:
+            # The shared tier is best-effort; an outage must not break the request.
+            print(f" Cache tier {self.collection_name} read failed:", e)
+            self.errors += 1
+            return default
+        if doc is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return doc["value"]
+
+    def set(self, key, value, ttl=None):
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl if ttl is None else ttl)
+        try:
+            self._collection().replace_one(
+                {"_id": key},
+                {"_id": key, "value": value, "expiresAt": expires_at},
+                upsert=True,
+            )
+        except Exception as e:
+            print(f" Cache tier {self.collection_name} write failed:", e)
+            self.errors += 1
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution."""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class LeaderCancelled(Exception):
+    """The coalesced call was cancelled with its leader; followers retry it themselves."""
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight for the async serving mode."""
+
+    def __init__(self):
+        self._calls = {}
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+            self.coalesced += 1
+            try:
+                # Shield so a cancelled follower does not cancel the shared call.
+                return await asyncio.shield(future)
+            except LeaderCancelled:
+                # The leader's request went away (e.g. client disconnect) but ours is
+                # still live: retry, and the first follower back becomes the leader.
+                continue
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.set_exception(LeaderCancelled(key))
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._calls[key]
+
+
+class TieredCache:
+    """Local LRU in front of an optional shared tier, with single-flight loads."""
+
+    def __init__(self, name, maxsize=256, ttl=300, shared=None):
+        self.name = name
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.shared = shared
+        self.flight = SingleFlight()
+        self.async_flight = AsyncSingleFlight()
+        self.loads = 0
+        CACHES[name] = self
+
+    def get(self, key, default=None):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value)
+                return value
+        return default
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() once on a miss."""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        def load():
+            # Another thread may have filled the cache while we waited for the lock.
+            cached = self.local.get(key)
+            if cached is not None:
+                return cached
+            self.loads += 1
+            loaded = loader()
+            if loaded is not None:
+                self.set(key, loaded)
+            return loaded
+
+        return self.flight.do(key, load)
+
+    async def aget_or_load(self, key, loader):
+        """Async get_or_load; loader is a coroutine function and the shared tier runs off-loop."""
+        value = self.local.get(key)
+        if value is not None:
+            return value
+
+        async def load():
+            if self.shared is not None:
+                cached = await asyncio.to_thread(self.shared.get, key)
+                if cached is not None:
+                    self.local.set(key, cached)
+                    return cached
+            self.loads += 1
+            loaded = await loader()
+            if loaded is not None:
+                self.local.set(key, loaded)
+                if self.shared is not None:
+                    await asyncio.to_thread(self.shared.set, key, loaded)
+            return loaded
+
+        return await self.async_flight.do(key, load)
+
+    def stats(self):
+        stats = {
+            "local": self.local.stats(),
+            "loads": self.loads,
+            "coalesced": self.flight.coalesced + self.async_flight.coalesced,
+        }
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats()
+        return stats
+
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in CACHES.items()}
@@ -0,0 +1,243 @@
+"""Chat conversation memory with a bounded prompt.
+
+One document per conversation in Conversation: {_id, userId, summary,
+turns: [{id, role, content, tokens, at}], compactions, summarizedTurns,
+createdAt, updatedAt}. Prompts are assembled in a fixed order so the front
+of the prompt is byte-identical from one turn to the next, which is what
+upstream prompt caching keys on:
+
+1. the system prompt plus a compact block describing the user's saved homes
+   and tasks (changes only when those do);
+2. the running summary of older turns (changes only at a compaction);
+3. the turns since the last compaction, verbatim, oldest first;
+4. the new message.
+
+Once the verbatim turns pass CHAT_HISTORY_TOKENS, the oldest are folded into
+the summary by a bulk-lane completion in the background, down to
+CHAT_KEEP_TOKENS. Compacting in large steps keeps the cached prefix stable
+for many turns in between. Until a compaction lands, build_messages drops the
+oldest turns that don't fit CHAT_CONTEXT_TOKENS, so the prompt stays bounded
+however long the conversation gets.
+"""
+import os
+import threading
+import traceback
+from datetime import datetime, timezone
+
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from pymongo import DESCENDING
+
+from app.db import db
+from app.favorite_repository import FAVORITE_PROJECTION
+from app.llm import BULK, gateway
+
+COLLECTION = "Conversation"
+CHAT_SYSTEM_PROMPT = "You are a helpful real estate assistant."
+SUMMARY_MODEL = os.getenv("CHAT_SUMMARY_MODEL", "gpt-3.5-turbo")
+
+# Prompt tokens per chat call, excluding the reply.
+CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "3000"))
+# Verbatim turns past this are compacted into the summary...
+HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "2000"))
+# ...leaving the newest turns up to this many tokens.
+KEEP_TOKENS = int(os.getenv("CHAT_KEEP_TOKENS", "800"))
+SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "300"))
+PROFILE_FAVORITES = int(os.getenv("CHAT_PROFILE_FAVORITES", "5"))
+PROFILE_TASKS = int(os.getenv("CHAT_PROFILE_TASKS", "5"))
+# Conversations untouched this long are removed by a TTL index (see migrations).
+CONVERSATION_TTL = int(os.getenv("CHAT_CONVERSATION_TTL_DAYS", "30")) * 86400
+
+# Role/name framing OpenAI adds to every message.
+MESSAGE_OVERHEAD = 4
+PROFILE_TEXT_LIMIT = 80
+
+SUMMARY_PROMPT = (
+    "You maintain the running summary of a conversation between a home buyer and a real estate "
+    "assistant. Merge the new turns into the summary so far. Keep the buyer's goals, budget, "
+    "preferences, numbers and open questions; drop pleasantries. Reply with the summary only, "
+    f"in at most {SUMMARY_TOKENS * 3 // 4} words."
+)
+ROLE_LABELS = {"user": "Buyer", "assistant": "Assistant"}
+
+
+def count_tokens(text):
+    """Rough token count (~4 characters each), the same estimate the LLM gateway budgets with."""
+    return len(text or "") // 4 + 1
+
+
+def message_tokens(messages):
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD for m in messages)
+
+
+def _clip(value):
+    text = str(value or "").strip()
+    return text if len(text) <= PROFILE_TEXT_LIMIT else text[:PROFILE_TEXT_LIMIT - 1] + "…"
+
+
+def _price(value):
+    return f"${value:,.0f}" if isinstance(value, (int, float)) and not isinstance(value, bool) else "price unknown"
+
+
+def profile_block(user_id):
+    """The user's newest saved homes and tasks as a few short lines, in a stable order."""
+    favorites = db["Favorite"].find({"userId": user_id}, FAVORITE_PROJECTION).sort("_id", DESCENDING)
+    tasks = db["Task"].find({"userId": user_id}, {"title": 1, "due_date": 1, "priority": 1}).sort("_id", DESCENDING)
+    lines = [
+        f"- {_clip(f.get('title'))}, {_clip(f.get('city'))}: {_price(f.get('price'))}, "
+        f"{f.get('bedrooms') or '?'} bd / {f.get('bathrooms') or '?'} ba"
+        for f in favorites.limit(PROFILE_FAVORITES)
+    ]
+    if lines:
+        lines.insert(0, "Homes the user has saved:")
+    task_lines = [
+        f"- {_clip(t.get('title'))} (due {_clip(t.get('due_date'))}, {_clip(t.get('priority'))} priority)"
+        for t in tasks.limit(PROFILE_TASKS)
+    ]
+    if task_lines:
+        lines += ["Tasks on the user's home-buying plan:"] + task_lines
+    return "\n".join(lines)
+
+
+def open_conversation(user_id, conversation_id=None, new=False):
+    """The conversation to continue: conversation_id, else the user's latest, else a fresh one.
+
+    Returns None if conversation_id isn't one of the user's conversations.
+    A fresh conversation is only stored once its first exchange is remembered.
+    """
+    if not new:
+        query = {"userId": user_id}
+        if conversation_id:
+            try:
+                query["_id"] = ObjectId(conversation_id)
+            except (InvalidId, TypeError):
+                return None
+        doc = db[COLLECTION].find_one(query, sort=[("updatedAt", DESCENDING)])
+        if doc is not None:
+            return doc
+        if conversation_id:
+            return None
+    return {"_id": ObjectId(), "userId": user_id, "summary": "", "turns": []}
+
+
+def build_messages(conversation, user_message):
+    """Prompt for the next turn: stable prefix, summary, as many recent turns as fit, the new message."""
+    system = CHAT_SYSTEM_PROMPT
+    profile = profile_block(conversation["userId"])
+    if profile:
+        system += "\n\n" + profile
+    messages = [{"role": "system", "content": system}]
+    if conversation.get("summary"):
+        messages.append({"role": "system", "content": "Summary of the conversation so far:\n" + conversation["summary"]})
+    message = {"role": "user", "content": user_message}
+
+    budget = CONTEXT_TOKENS - message_tokens(messages + [message])
+    recent = []
+    for turn in reversed(conversation.get("turns", [])):
+        cost = turn["tokens"] + MESSAGE_OVERHEAD
+        if cost > budget:
+            break
+        budget -= cost
+        recent.append({"role": turn["role"], "content": turn["content"]})
+    return messages + recent[::-1] + [message]
+
+
+def make_turn(role, content):
+    return {"id": ObjectId(), "role": role, "content": content, "tokens": count_tokens(content),
+            "at": datetime.now(timezone.utc)}
+
+
+def remember(conversation, user_message, reply):
+    """Store one exchange and start a compaction if the verbatim history has outgrown its budget."""
+    turns = [make_turn("user", user_message), make_turn("assistant", reply)]
+    now = datetime.now(timezone.utc)
+    db[COLLECTION].update_one(
+        {"_id": conversation["_id"]},
+        {
+            "$push": {"turns": {"$each": turns}},
+            "$set": {"updatedAt": now},
+            "$setOnInsert": {"userId": conversation["userId"], "summary": "", "compactions": 0,
+                             "summarizedTurns": 0, "createdAt": now},
+        },
+        upsert=True,
+    )
+    conversation["turns"] = conversation.get("turns", []) + turns
+    if sum(turn["tokens"] for turn in conversation["turns"]) > HISTORY_TOKENS:
+        schedule_compaction(conversation["_id"])
+
+
+def turns_to_fold(turns):
+    """The oldest turns to summarize so the rest fit KEEP_TOKENS; empty while under HISTORY_TOKENS."""
+    remaining = sum(turn["tokens"] for turn in turns)
+    if remaining <= HISTORY_TOKENS:
+        return []
+    folded = 0
+    # Never leave an assistant reply at the front without the question it answers.
+    while folded < len(turns) - 1 and (remaining > KEEP_TOKENS or turns[folded]["role"] != "user"):
+        remaining -= turns[folded]["tokens"]
+        folded += 1
+    return turns[:folded]
+
+
+def summarize(summary, turns):
+    transcript = "\n".join(f"{ROLE_LABELS.get(t['role'], t['role'])}: {t['content']}" for t in turns)
+    response = gateway.complete(
+        lane=BULK,
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Summary so far:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"},
+        ],
+        max_tokens=SUMMARY_TOKENS,
+        temperature=0,
+    )
+    return response.choices[0].message.content.strip()
+
+
+def compact(conversation_id):
+    """Fold the oldest verbatim turns into the summary; True if the conversation changed."""
+    doc = db[COLLECTION].find_one({"_id": conversation_id})
+    folded = turns_to_fold(doc.get("turns", [])) if doc else []
+    if not folded:
+        return False
+    summary = summarize(doc.get("summary"), folded)
+    # Guarded by the compaction count: a concurrent compaction wins and this one is dropped.
+    # Turns appended meanwhile are untouched, since only the folded ids are pulled.
+    result = db[COLLECTION].update_one(
+        {"_id": conversation_id, "compactions": doc.get("compactions", 0)},
+        {
+            "$set": {"summary": summary},
+            "$inc": {"compactions": 1, "summarizedTurns": len(folded)},
+            "$pull": {"turns": {"id": {"$in": [turn["id"] for turn in folded]}}},
+        },
+    )
+    return result.modified_count == 1
+
+
+_compacting = set()
+_compacting_lock = threading.Lock()
+
+
+def _run_compaction(conversation_id):
+    try:
+        compact(conversation_id)
+    except Exception:
+        # The next exchange retries; meanwhile build_messages keeps the prompt within budget.
+        traceback.print_exc()
+    finally:
+        with _compacting_lock:
+            _compacting.discard(conversation_id)
+
+
+def schedule_compaction(conversation_id):
+    """Compact on a background thread, at most once at a time per conversation in this process."""
+    with _compacting_lock:
+        if conversation_id in _compacting:
+            return
+        _compacting.add(conversation_id)
+    threading.Thread(target=_run_compaction, args=(conversation_id,), name="chat-compaction", daemon=True).start()
+
+
+def compactions_running():
+    with _compacting_lock:
+        return len(_compacting)
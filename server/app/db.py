@@ -1,82 +1,78 @@
 import os
-from pymongo import ASCENDING, TEXT, MongoClient
+import threading
+
+from pymongo import AsyncMongoClient, MongoClient
 from dotenv import load_dotenv
 import certifi
 
+from app.metrics import mongo_listener
+
 load_dotenv()  # Load environment variables from .env
 
-client = MongoClient(
-    os.getenv("DATABASE_URL"),
-    tls=True,
-    tlsCAFile=certifi.where()
-)
-db = client.get_database()  
-
-# ---- Create performance indexes ----
-# Listings collection
-db.listings.create_index([("location", ASCENDING)])
-db.listings.create_index([("price", ASCENDING)])
-db.listings.create_index([("propertyType", ASCENDING)])
-db.listings.create_index([("title", TEXT), ("description", TEXT)])  # for full-text search
-
-# Users collection
-db.users.create_index([("email", ASCENDING)], unique=True)
-
-# Favorites collection
-db.favorites.create_index([("userId", ASCENDING)])
-
-# ---- Schema validation rules ----
-# User collection
-db.command("collMod", "User", validator={
-    "$jsonSchema": {
-        "bsonType": "object",
-        "required": ["email", "password"],
-        "properties": {
-            "email": {"bsonType": "string", "description": "must be a string and is required"},
-            "password": {"bsonType": "string", "description": "must be a string and is required"},
-            "name": {"bsonType": "string", "description": "optional but must be a string if present"}
-        }
-    }
-}, validationAction="error")
-
-# Listings collection
-db.command("collMod", "listings", validator={
-    "$jsonSchema": {
-        "bsonType": "object",
-        "required": ["title", "price", "location", "listedById"],
-        "properties": {
-            "title": {"bsonType": "string"},
-            "price": {"bsonType": "number"},
-            "location": {"bsonType": "string"},
-            "propertyType": {"bsonType": "string"},
-            "listedById": {"bsonType": "string"}
-        }
-    }
-}, validationAction="error")
-
-# Favorites collection
-db.command("collMod", "favorites", validator={
-    "$jsonSchema": {
-        "bsonType": "object",
-        "required": ["userId", "listingId"],
-        "properties": {
-            "userId": {"bsonType": "string"},
-            "listingId": {"bsonType": "string"}
-        }
-    }
-}, validationAction="error")
-
-# Task collection
-db.command("collMod", "Task", validator={
-    "$jsonSchema": {
-        "bsonType": "object",
-        "required": ["title", "category", "due_date", "priority", "userId"],
-        "properties": {
-            "title": {"bsonType": "string"},
-            "category": {"bsonType": "string"},
-            "due_date": {"bsonType": "string"},
-            "priority": {"bsonType": "string"},
-            "userId": {"bsonType": "string"}
-        }
-    }
-}, validationAction="error")
+# Atlas needs TLS; set MONGO_TLS=0 for a plain local mongod (benchmarks, development).
+MONGO_TLS = os.getenv("MONGO_TLS", "1") == "1"
+TLS_OPTIONS = {"tls": True, "tlsCAFile": certifi.where()} if MONGO_TLS else {}
+# Fail fast (instead of pymongo's 30 s default) when the cluster is unreachable.
+CLIENT_OPTIONS = {
+    **TLS_OPTIONS,
+    "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    # Feeds the mongo_command_* metrics and the per-request Mongo totals in the access log.
+    "event_listeners": [mongo_listener],
+}
+
+# Nothing connects at import time: the client is built on first use, and index
+# builds / schema validators are applied by `flask --app app:create_app migrate`
+# (see app/migrations.py) instead of in every worker.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_async_client = None
+
+
+def get_client():
+    """The process's MongoClient, created on first use and again after a fork.
+
+    A client is not fork-safe: a pre-fork server that touched Mongo while
+    preloading (see app/prefork.py) must not share its sockets with workers.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = MongoClient(os.getenv("DATABASE_URL"), **CLIENT_OPTIONS)
+                _client_pid = os.getpid()
+    return _client
+
+
+def close_client():
+    """Close this process's client (e.g. the pre-fork master's once preloading is done)."""
+    global _client
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+
+
+def get_db():
+    return get_client().get_database()
+
+
+class LazyDatabase:
+    """Stand-in for the Database object that connects on first attribute or item access."""
+
+    def __getitem__(self, name):
+        return get_db()[name]
+
+    def __getattr__(self, name):
+        return getattr(get_db(), name)
+
+
+db = LazyDatabase()
+
+
+def get_async_db():
+    """Database handle for the async serving mode, created on first use inside the event loop."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncMongoClient(os.getenv("DATABASE_URL"), **CLIENT_OPTIONS)
+    return _async_client.get_database()
@@ -0,0 +1,106 @@
+import os
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.db import db
+
+# Mongo error code for a unique index violation.
+DUPLICATE_KEY = 11000
+
+FAVORITE_FIELDS = ("title", "city", "price", "bedrooms", "bathrooms", "image")
+# Everything the favorites listing, forecast and dashboard read. Every field (and _id)
+# is in the covering index from migrations, so these reads never fetch documents.
+FAVORITE_PROJECTION = {
+    field: 1 for field in ("userId", "zpid") + FAVORITE_FIELDS + ("priceRefreshedAt",)
+}
+BATCH_LIMIT = int(os.getenv("FAVORITES_BATCH_LIMIT", "1000"))
+
+
+def normalize_zpid(zpid):
+    """zpids arrive as numbers or strings depending on the page; store one form so the unique index holds."""
+    if zpid is None or isinstance(zpid, (bool, dict, list)):
+        return None
+    zpid = str(zpid).strip()
+    return zpid or None
+
+
+def _upsert(user_id, zpid, details):
+    """(filter, update) that inserts the favorite only if the pair doesn't exist yet."""
+    # $setOnInsert: re-adding never overwrites prices kept fresh by the price refresh.
+    doc = {field: details.get(field) for field in FAVORITE_FIELDS}
+    return {"userId": user_id, "zpid": zpid}, {"$setOnInsert": doc}
+
+
+def add_favorite(user_id, zpid, details):
+    """Favorite one home in a single round-trip; True if it was added, False if already there."""
+    try:
+        result = db["Favorite"].update_one(*_upsert(user_id, zpid, details), upsert=True)
+    except DuplicateKeyError:
+        # A concurrent request (e.g. a double click) inserted the same pair first.
+        return False
+    return result.upserted_id is not None
+
+
+def add_favorites(user_id, items):
+    """Upsert many favorites with one unordered bulk write.
+
+    items are dicts with a zpid and optional FAVORITE_FIELDS. Returns
+    (added, existing, invalid) where invalid lists the indexes of items
+    without a usable zpid.
+    """
+    ops, invalid, seen = [], [], set()
+    for i, item in enumerate(items):
+        zpid = normalize_zpid(item.get("zpid")) if isinstance(item, dict) else None
+        if zpid is None:
+            invalid.append(i)
+        elif zpid not in seen:
+            seen.add(zpid)
+            ops.append(UpdateOne(*_upsert(user_id, zpid, item), upsert=True))
+    if not ops:
+        return 0, 0, invalid
+
+    try:
+        result = db["Favorite"].bulk_write(ops, ordered=False)
+        return result.upserted_count, len(ops) - result.upserted_count, invalid
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error["code"] != DUPLICATE_KEY for error in errors):
+            raise
+        # Lost races with concurrent adds: those favorites exist, just not from this batch.
+        added = e.details.get("nUpserted", 0)
+        return added, len(ops) - added, invalid
+
+
+def remove_favorites(user_id, zpids):
+    """Delete a user's favorites of these homes; returns how many were removed."""
+    zpids = [zpid for zpid in map(normalize_zpid, zpids) if zpid is not None]
+    if not zpids:
+        return 0
+    return db["Favorite"].delete_many({"userId": user_id, "zpid": {"$in": zpids}}).deleted_count
+
+
+def find_favorites(user_id, limit=0):
+    """A user's favorites in _id order, read from the covering index."""
+    return db["Favorite"].find({"userId": user_id}, FAVORITE_PROJECTION).sort("_id", 1).limit(limit)
+
+
+def normalize_favorite_zpids(collection, log=print):
+    """Store numeric zpids as strings, so they dedupe and index together with the string form."""
+    result = collection.update_many({"zpid": {"$type": "number"}}, [{"$set": {"zpid": {"$toString": "$zpid"}}}])
+    if result.modified_count:
+        log(f"converted {result.modified_count} numeric favorite zpids to strings")
+    return result.modified_count
+
+
+def dedupe_favorites(collection, log=print):
+    """Remove duplicate (userId, zpid) favorites, keeping the oldest, so the unique index can build."""
+    pipeline = [
+        {"$group": {"_id": {"userId": "$userId", "zpid": "$zpid"}, "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}}},
+    ]
+    extra = [_id for group in collection.aggregate(pipeline, allowDiskUse=True) for _id in sorted(group["ids"])[1:]]
+    if extra:
+        collection.delete_many({"_id": {"$in": extra}})
+        log(f"removed {len(extra)} duplicate favorites")
+    return len(extra)
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from app.model_artifact import ModelArtifact
+
+CURRENT_YEAR = 2025
+HORIZON_YEARS = 5
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "house_price_model.joblib")
+# Memory-mapped successor of MODEL_PATH; regenerated whenever the joblib file is newer.
+COMPACT_MODEL_PATH = os.getenv("COMPACT_MODEL_PATH", os.path.splitext(MODEL_PATH)[0] + ".hpm")
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "5"))
+
+
+def region_key(city):
+    return str(city).strip().lower() if city else ""
+
+
+class ForecastEngine:
+    """Precomputed forecast ratios, applied to many homes as one array operation.
+
+    Built from a ModelArtifact (memory-mapped) or any joblib model dict: the
+    nested {"forecast", "lower", "upper", "confidence"} layout, the older flat
+    {year: price} layout (no interval, so min == max == price), or version 2
+    with per-region curves. Homes whose city matches a region use its curve,
+    everyone else the national one.
+    """
+
+    def __init__(self, model, current_year=CURRENT_YEAR, horizon=HORIZON_YEARS):
+        artifact = model if isinstance(model, ModelArtifact) else ModelArtifact.from_dict(model)
+        self.confidence = artifact.confidence
+        self.trained_at = artifact.trained_at
+        self.years = [
+            str(current_year + i) for i in range(1, horizon + 1) if str(current_year + i) in artifact.years
+        ]
+        self.regions = {key: i for i, key in enumerate(artifact.regions) if i}
+
+        # Shape (G, 3, H): per group, rows are price / min / max ratios per horizon year.
+        # A slice of the artifact's table, so a memory-mapped model is never copied.
+        start = artifact.years.index(self.years[0]) if self.years else 0
+        if artifact.years[start:start + len(self.years)] == self.years:
+            self.ratios = artifact.ratios[:, :, start:start + len(self.years)]
+        else:
+            self.ratios = artifact.ratios[:, :, [artifact.years.index(y) for y in self.years]]
+
+    def region_indexes(self, cities):
+        return np.fromiter((self.regions.get(region_key(c), 0) for c in cities), dtype=np.intp, count=len(cities))
+
+    def forecast_matrix(self, prices, cities=None):
+        """Return an (N, 3, H) array of price/min/max forecasts for N base prices."""
+        prices = np.asarray(prices, dtype=np.float64)
+        if cities is None or not self.regions:
+            ratios = self.ratios[0][None, :, :]
+        else:
+            ratios = self.ratios[self.region_indexes(cities)]
+        return np.round(prices[:, None, None] * ratios, 2)
+
+    def forecast(self, prices, cities=None):
+        """Return one list of {date, price, min, max} points per base price."""
+        if len(prices) == 0:
+            return []
+        matrix = self.forecast_matrix(prices, cities).tolist()
+        return [
+            [
+                {"date": year, "price": price, "min": low, "max": high}
+                for year, price, low, high in zip(self.years, *home)
+            ]
+            for home in matrix
+        ]
+
+    def forecast_one(self, price, city=None):
+        return self.forecast([price], [city])[0]
+
+
+_engine = None
+_engine_state = None
+_next_check = 0.0
+_engine_lock = threading.Lock()
+
+
+def _file_state(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def _artifact_state():
+    return _file_state(COMPACT_MODEL_PATH), _file_state(MODEL_PATH)
+
+
+def load_engine():
+    """Build an engine from the compact artifact, converting the joblib model if it is newer."""
+    compact, source = _artifact_state()
+    if compact and (source is None or compact[2] >= source[2]):
+        try:
+            return ForecastEngine(ModelArtifact.open(COMPACT_MODEL_PATH))
+        except ValueError:
+            if source is None:
+                raise
+            # An artifact from an older release: rebuild it from the joblib model.
+
+    from joblib import load
+
+    artifact = ModelArtifact.from_dict(load(MODEL_PATH))
+    try:
+        artifact.save(COMPACT_MODEL_PATH)
+    except OSError as e:
+        print(f" Could not write {COMPACT_MODEL_PATH}, serving the model from memory:", e)
+        return ForecastEngine(artifact)
+    return ForecastEngine(ModelArtifact.open(COMPACT_MODEL_PATH))
+
+
+def get_forecast_engine():
+    """Return the current engine, loading it on first use and reloading it when the model file changes.
+
+    The files are stat()ed at most every MODEL_RELOAD_INTERVAL seconds. A reload
+    builds the new engine first and then swaps the reference, so in-flight
+    requests finish on the engine they started with.
+    """
+    global _engine, _engine_state, _next_check
+    now = time.monotonic()
+    if _engine is not None and now < _next_check:
+        return _engine
+
+    with _engine_lock:
+        if _engine is None or now >= _next_check:
+            _next_check = now + MODEL_RELOAD_INTERVAL
+            state = _artifact_state()
+            if _engine is None or state != _engine_state:
+                try:
+                    engine = load_engine()
+                except Exception as e:
+                    if _engine is None:
+                        raise
+                    print(" Forecast model reload failed, keeping the previous model:", e)
+                else:
+                    _engine, _engine_state = engine, _artifact_state()
+    return _engine
@@ -0,0 +1,153 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+
+from app.db import db
+from app.similar_homes import index_homes
+
+# A location fetched from Zillow within this window is served from `listings` alone.
+LISTING_STALE_AFTER = int(os.getenv("LISTING_STALE_AFTER", str(6 * 3600)))
+DEFAULT_RESULTS = 100
+MAX_RESULTS = 500
+# Lower bounds of the price facet ranges.
+PRICE_FACET_BOUNDARIES = [0, 150_000, 300_000, 500_000, 1_000_000, float("inf")]
+
+RESULT_PROJECTION = {
+    "_id": 0, "id": "$zpid", "title": 1, "city": 1, "price": 1, "bedrooms": 1, "bathrooms": 1, "image": 1,
+}
+
+
+def save_listings(results, location, status_type, home_type):
+    """Upsert search results into `listings` and mark the location as freshly covered."""
+    now = datetime.now(timezone.utc)
+    ops = []
+    for result in results:
+        if not result.get("id"):
+            continue
+        ops.append(UpdateOne(
+            {"zpid": result["id"]},
+            {
+                "$set": {
+                    "title": result["title"],
+                    # description feeds the (title, description) text index.
+                    "description": f"{result['title']}, {result['city']}",
+                    "city": result["city"],
+                    "location": result["city"],
+                    "price": result.get("price") or 0,
+                    "bedrooms": result.get("bedrooms") or 0,
+                    "bathrooms": result.get("bathrooms") or 0,
+                    "image": result.get("image"),
+                    "propertyType": home_type,
+                    "statusType": status_type,
+                    "fetchedAt": now,
+                },
+                "$setOnInsert": {"zpid": result["id"], "listedById": "zillow"},
+                "$addToSet": {"locations": location},
+            },
+            upsert=True,
+        ))
+    if ops:
+        db["listings"].bulk_write(ops, ordered=False)
+        index_homes([{**result, "zpid": result["id"]} for result in results if result.get("id")])
+    # Homes this search no longer returns (sold, withdrawn) stop matching the location.
+    db["listings"].update_many(
+        {**location_match(location, status_type, home_type, {}),
+         "zpid": {"$nin": [result["id"] for result in results if result.get("id")]}},
+        {"$pull": {"locations": location}},
+    )
+    db["ListingQueries"].replace_one(
+        {"_id": coverage_key(location, status_type, home_type)},
+        {"fetchedAt": now, "count": len(ops)},
+        upsert=True,
+    )
+
+
+def coverage_key(location, status_type, home_type):
+    return f"{location}|{status_type}|{home_type}"
+
+
+def is_covered(location, status_type, home_type):
+    """True if this location was fetched from Zillow recently enough to serve locally."""
+    doc = db["ListingQueries"].find_one({"_id": coverage_key(location, status_type, home_type)})
+    if not doc:
+        return False
+    fetched_at = doc["fetchedAt"]
+    if fetched_at.tzinfo is None:
+        fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - fetched_at < timedelta(seconds=LISTING_STALE_AFTER)
+
+
+def facet_filters(args):
+    """Build a Mongo filter from the price/bedrooms/bathrooms/city query parameters."""
+    query = {}
+    price = {}
+    if args.get("min_price"):
+        price["$gte"] = float(args["min_price"])
+    if args.get("max_price"):
+        price["$lte"] = float(args["max_price"])
+    if price:
+        query["price"] = price
+    if args.get("bedrooms"):
+        query["bedrooms"] = {"$gte": float(args["bedrooms"])}
+    if args.get("bathrooms"):
+        query["bathrooms"] = {"$gte": float(args["bathrooms"])}
+    if args.get("city"):
+        query["city"] = args["city"]
+    return query
+
+
+def location_match(location, status_type, home_type, filters):
+    """Filter for the listings a Zillow search of this location returned."""
+    return {"locations": location, "statusType": status_type, "propertyType": home_type, **filters}
+
+
+def search_listings(match, keywords=None, limit=DEFAULT_RESULTS):
+    """Run a filtered, optionally text-ranked query over `listings`, with facet counts.
+
+    Returns {"results": [...], "total": n, "facets": {...}}, results in the /api/search format.
+    """
+    match = dict(match)
+    if keywords:
+        # $text must sit in the first $match stage; results are ranked by textScore.
+        match["$text"] = {"$search": keywords}
+        ranking = [{"$sort": {"score": {"$meta": "textScore"}, "_id": 1}}]
+    else:
+        ranking = [{"$sort": {"_id": 1}}]
+
+    pipeline = [
+        {"$match": match},
+        {"$facet": {
+            "results": ranking + [{"$limit": max(1, min(limit, MAX_RESULTS))}, {"$project": RESULT_PROJECTION}],
+            "total": [{"$count": "count"}],
+            "city": [{"$group": {"_id": "$city", "count": {"$sum": 1}}}, {"$sort": {"count": -1}}],
+            "bedrooms": [{"$group": {"_id": "$bedrooms", "count": {"$sum": 1}}}, {"$sort": {"_id": 1}}],
+            "bathrooms": [{"$group": {"_id": "$bathrooms", "count": {"$sum": 1}}}, {"$sort": {"_id": 1}}],
+            "price": [{"$bucket": {
+                "groupBy": "$price", "boundaries": PRICE_FACET_BOUNDARIES, "default": "other",
+            }}],
+        }},
+    ]
+    facets = next(db["listings"].aggregate(pipeline))
+    results = facets.pop("results")
+    total = facets.pop("total")
+    return {
+        "results": results,
+        "total": total[0]["count"] if total else 0,
+        "facets": {
+            name: [{"value": bucket["_id"], "count": bucket["count"]} for bucket in buckets]
+            for name, buckets in facets.items()
+        },
+    }
+
+
+def stale_search(location, status_type, home_type, filters, keywords, limit=DEFAULT_RESULTS):
+    """Fallback while Zillow is unavailable: the location's listings from its last refresh, however old.
+
+    Returns None if the local index cannot be queried either.
+    """
+    try:
+        return search_listings(location_match(location, status_type, home_type, filters), keywords, limit)
+    except Exception as e:
+        print(" Local listing fallback failed:", e)
+        return None
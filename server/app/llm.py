@@ -0,0 +1,442 @@
+"""OpenAI clients and the gateway every completion goes through.
+
+The gateway keeps this process inside the account's RPM/TPM limits with two
+token buckets, serves interactive calls (chat) ahead of bulk ones (batch task
+regeneration), retries 429s and 5xx honouring Retry-After, folds identical
+in-flight prompts into one upstream call and accounts tokens per call.
+"""
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from email.utils import parsedate_to_datetime
+
+from app.metrics import llm_calls, llm_queue_wait, log_event, record_tokens
+from app.upstream import OPENAI_READ_TIMEOUT, async_http_client, openai_http_client
+
+# Account limits; 0 disables that bucket. Set them a little under the real limits
+# divided by the number of worker processes.
+LLM_RPM = float(os.getenv("LLM_RPM", "0"))
+LLM_TPM = float(os.getenv("LLM_TPM", "0"))
+# OpenAI enforces per-minute limits over shorter windows too, so the buckets only
+# hold this many seconds' worth of budget rather than a whole minute's burst.
+LLM_BURST_SECONDS = float(os.getenv("LLM_BURST_SECONDS", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+# How long a call may wait (queueing plus retry delays) before it gives up.
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "20"))
+LLM_BULK_QUEUE_TIMEOUT = float(os.getenv("LLM_BULK_QUEUE_TIMEOUT", "300"))
+# Completion tokens reserved for calls that don't set max_tokens; corrected from usage afterwards.
+LLM_DEFAULT_COMPLETION_TOKENS = int(os.getenv("LLM_DEFAULT_COMPLETION_TOKENS", "500"))
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANE_PRIORITY = {INTERACTIVE: 0, BULK: 1}
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+# Async waiters poll at most this far apart; sync waiters are woken by a condition.
+ASYNC_POLL_INTERVAL = 0.05
+
+# OpenAI clients are created on first use rather than at import time.
+_client = None
+_client_pid = None
+_async_client = None
+_lock = threading.Lock()
+
+
+def get_client():
+    global _client, _client_pid
+    # Recreated after a fork so workers never share the parent's keep-alive connections.
+    if _client is None or _client_pid != os.getpid():
+        with _lock:
+            if _client is None or _client_pid != os.getpid():
+                from openai import OpenAI
+
+                # Retries belong to the gateway, which shares Retry-After across callers.
+                _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=openai_http_client(),
+                                 max_retries=0)
+                _client_pid = os.getpid()
+    return _client
+
+
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        from openai import AsyncOpenAI
+
+        _async_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=async_http_client(read_timeout=OPENAI_READ_TIMEOUT),
+            max_retries=0,
+        )
+    return _async_client
+
+
+class LLMBusy(Exception):
+    """Raised when a call can't be admitted (or retried) within its queue timeout."""
+
+    def __init__(self, message, retry_after=1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """`per_minute` units, refilled continuously, holding at most `burst_seconds` worth.
+
+    Callers hold the gateway lock.
+    """
+
+    def __init__(self, per_minute, burst_seconds=LLM_BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount, now):
+        """Seconds until `amount` is available; requests larger than the bucket wait for a full one."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount):
+        if self.rate > 0:
+            self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount):
+        """Correct an estimate once real usage is known; the level may go negative."""
+        if self.rate > 0:
+            self.level = min(self.capacity, self.level - amount)
+
+
+def estimate_tokens(params):
+    """Rough prompt tokens (~4 chars each) plus the completion budget."""
+    chars = sum(len(m.get("content") or "") for m in params.get("messages", ()))
+    return chars // 4 + (params.get("max_tokens") or LLM_DEFAULT_COMPLETION_TOKENS)
+
+
+def dedup_key(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait, from retry-after-ms / Retry-After, else None."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    from openai import APIConnectionError, APIStatusError
+
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRY_STATUSES
+    return isinstance(error, APIConnectionError)
+
+
+class LLMGateway:
+    """Admission control, retries, dedup and accounting for OpenAI chat completions.
+
+    Waiting calls queue in a heap ordered by (lane priority, arrival), so a
+    chat message never waits behind a batch of task regenerations; only the
+    head of the queue is admitted, once a concurrency slot and both rate
+    buckets allow it. A 429 pauses admission for everyone until its
+    Retry-After has passed.
+    """
+
+    def __init__(self, rpm=LLM_RPM, tpm=LLM_TPM, max_concurrency=LLM_MAX_CONCURRENCY,
+                 max_retries=LLM_MAX_RETRIES, backoff=LLM_RETRY_BACKOFF,
+                 client=get_client, async_client=get_async_client):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._client = client
+        self._async_client = async_client
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        # dedup key -> Future shared by every caller of an identical in-flight prompt
+        self._pending = {}
+
+    # ------ ADMISSION ------
+    def _try_admit(self, ticket, cost):
+        """0 if admitted, else seconds to wait (None: until another call finishes). Holds the lock."""
+        if self._waiting[0] != ticket or self._in_flight >= self.max_concurrency:
+            return None
+        now = time.monotonic()
+        delay = max(self._paused_until - now, self.requests.delay(1, now), self.tokens.delay(cost, now))
+        if delay > 0:
+            return delay
+        heapq.heappop(self._waiting)
+        self.requests.take(1)
+        self.tokens.take(cost)
+        self._in_flight += 1
+        # The next caller in line may be admissible too.
+        self._cond.notify_all()
+        return 0
+
+    def _abandon(self, ticket):
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        self._cond.notify_all()
+
+    def _busy(self, lane):
+        llm_calls.inc("", lane, "busy")
+        return LLMBusy("The assistant is busy, please retry shortly.", retry_after=max(1.0, self._paused_until - time.monotonic()))
+
+    def _acquire(self, ticket, lane, cost, deadline):
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                delay = self._try_admit(ticket, cost)
+                if delay == 0:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._abandon(ticket)
+                    raise self._busy(lane)
+                self._cond.wait(remaining if delay is None else min(delay, remaining))
+
+    async def _aacquire(self, ticket, lane, cost, deadline):
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._try_admit(ticket, cost)
+                if delay == 0:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._busy(lane)
+                await asyncio.sleep(min(delay or ASYNC_POLL_INTERVAL, remaining, ASYNC_POLL_INTERVAL))
+        except BaseException:
+            # Timed out or cancelled (client went away): give up our place in line.
+            with self._cond:
+                if ticket in self._waiting:
+                    self._abandon(ticket)
+            raise
+
+    def _release(self, cost, usage=None):
+        with self._cond:
+            self._in_flight -= 1
+            if usage is not None and usage.total_tokens:
+                self.tokens.adjust(usage.total_tokens - cost)
+            self._cond.notify_all()
+
+    def _retry_delay(self, error, attempt, deadline):
+        """Seconds to wait before retrying `error`, or None if it should be raised."""
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+        delay = retry_after(error)
+        if delay is None:
+            # Exponential backoff with full jitter.
+            delay = random.uniform(0, self.backoff * (2 ** attempt))
+        if getattr(error, "status_code", None) == 429:
+            with self._cond:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        if time.monotonic() + delay > deadline:
+            return None
+        return delay
+
+    def _account(self, model, lane, outcome, usage, attempts, waited):
+        llm_calls.inc(model, lane, outcome)
+        llm_queue_wait.observe(waited, lane)
+        record_tokens(model, usage)
+        log_event(
+            "llm.call", sample=outcome == "ok", model=model, lane=lane, outcome=outcome,
+            attempts=attempts, wait_ms=round(waited * 1000, 1),
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+        )
+
+    # ------ CALLS ------
+    def _call(self, lane, timeout, params):
+        """Admit and send one request, retrying as needed. The caller must _release the slot."""
+        cost = estimate_tokens(params)
+        ticket = (LANE_PRIORITY[lane], next(self._seq))
+        deadline = time.monotonic() + (timeout if timeout is not None else lane_timeout(lane))
+        waited, attempt = 0.0, 0
+        while True:
+            start = time.monotonic()
+            self._acquire(ticket, lane, cost, deadline)
+            waited += time.monotonic() - start
+            try:
+                return self._client().chat.completions.create(**params), cost, attempt + 1, waited
+            except Exception as e:
+                self._release(cost)
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    self._account(params.get("model", ""), lane, "error", None, attempt + 1, waited)
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def _acall(self, lane, timeout, params):
+        cost = estimate_tokens(params)
+        ticket = (LANE_PRIORITY[lane], next(self._seq))
+        deadline = time.monotonic() + (timeout if timeout is not None else lane_timeout(lane))
+        waited, attempt = 0.0, 0
+        while True:
+            start = time.monotonic()
+            await self._aacquire(ticket, lane, cost, deadline)
+            waited += time.monotonic() - start
+            try:
+                return await self._async_client().chat.completions.create(**params), cost, attempt + 1, waited
+            except BaseException as e:
+                self._release(cost)
+                delay = self._retry_delay(e, attempt, deadline) if isinstance(e, Exception) else None
+                if delay is None:
+                    self._account(params.get("model", ""), lane, "error", None, attempt + 1, waited)
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _finish(self, params, lane, response, cost, attempts, waited):
+        usage = getattr(response, "usage", None)
+        self._release(cost, usage)
+        self._account(params.get("model", ""), lane, "ok", usage, attempts, waited)
+        return response
+
+    def _join(self, key, lane, model):
+        """(leader future, None) for the first caller of a prompt, (None, existing future) for the rest."""
+        with self._cond:
+            existing = self._pending.get(key)
+            if existing is None:
+                future = self._pending[key] = Future()
+                return future, None
+        llm_calls.inc(model, lane, "deduplicated")
+        return None, existing
+
+    def _settle(self, key, future, result=None, error=None):
+        with self._cond:
+            self._pending.pop(key, None)
+        if error is None:
+            future.set_result(result)
+        else:
+            # Followers of a cancelled leader get an error they can report, not a cancellation.
+            future.set_exception(error if isinstance(error, Exception) else LLMBusy("Request was cancelled."))
+
+    def complete(self, lane=INTERACTIVE, timeout=None, **params):
+        """chat.completions.create(**params) through the gateway; identical in-flight calls share a result."""
+        key = dedup_key(params)
+        future, existing = self._join(key, lane, params.get("model", ""))
+        if existing is not None:
+            return existing.result()
+        try:
+            response = self._finish(params, lane, *self._call(lane, timeout, params))
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, response)
+        return response
+
+    async def acomplete(self, lane=INTERACTIVE, timeout=None, **params):
+        key = dedup_key(params)
+        future, existing = self._join(key, lane, params.get("model", ""))
+        if existing is not None:
+            return await asyncio.wrap_future(existing)
+        try:
+            response = self._finish(params, lane, *(await self._acall(lane, timeout, params)))
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, response)
+        return response
+
+    def stream(self, lane=INTERACTIVE, timeout=None, **params):
+        """Streaming completion; holds its slot until the returned stream is closed."""
+        params = {**params, "stream": True, "stream_options": {"include_usage": True}}
+        return GatewayStream(self, params, lane, *self._call(lane, timeout, params))
+
+    async def astream(self, lane=INTERACTIVE, timeout=None, **params):
+        params = {**params, "stream": True, "stream_options": {"include_usage": True}}
+        return AsyncGatewayStream(self, params, lane, *(await self._acall(lane, timeout, params)))
+
+
+def lane_timeout(lane):
+    return LLM_BULK_QUEUE_TIMEOUT if lane == BULK else LLM_QUEUE_TIMEOUT
+
+
+class GatewayStream:
+    """Iterates an OpenAI stream, picking up the final usage chunk; close() frees the gateway slot."""
+
+    def __init__(self, gateway, params, lane, stream, cost, attempts, waited):
+        self._gateway, self._params, self._lane = gateway, params, lane
+        self._stream, self._cost, self._attempts, self._waited = stream, cost, attempts, waited
+        self.usage = None
+        self._closed = False
+
+    def __iter__(self):
+        for chunk in self._stream:
+            if getattr(chunk, "usage", None) is not None:
+                self.usage = chunk.usage
+            yield chunk
+
+    def _done(self):
+        if not self._closed:
+            self._closed = True
+            self._gateway._finish(self._params, self._lane, self, self._cost, self._attempts, self._waited)
+
+    def close(self):
+        if self._closed:
+            return
+        try:
+            self._stream.close()
+        finally:
+            self._done()
+
+    def __del__(self):
+        # A response generator that never started never runs its finally; don't leak the slot.
+        self._done()
+
+
+class AsyncGatewayStream(GatewayStream):
+    def __aiter__(self):
+        return self._aiter()
+
+    async def _aiter(self):
+        async for chunk in self._stream:
+            if getattr(chunk, "usage", None) is not None:
+                self.usage = chunk.usage
+            yield chunk
+
+    async def close(self):
+        if self._closed:
+            return
+        try:
+            await self._stream.close()
+        finally:
+            self._done()
+
+
+gateway = LLMGateway()
@@ -0,0 +1,275 @@
+"""In-process request, Mongo, upstream and cache metrics, rendered in Prometheus text format.
+
+Each worker process keeps its own registry; scrape every worker (or sum in
+Prometheus) to get totals. Debug output goes through log_event(), which
+samples routine events so logging stays off the hot path.
+"""
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, timezone
+
+from pymongo import monitoring
+
+# Fraction of routine events (request access lines, raw upstream replies) that are logged.
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+# Requests slower than this, and every 5xx, are always logged.
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# LLM calls routinely take tens of seconds.
+UPSTREAM_BUCKETS = DEFAULT_BUCKETS + (30, 60)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, labels, [le])} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {total:.6f}")
+                lines.append(f"{self.name}_count{_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "API request latency.", ("route", "method", "status")
+)
+mongo_duration = Histogram(
+    "mongo_command_duration_seconds", "Mongo command latency.", ("command", "outcome"), MONGO_BUCKETS
+)
+upstream_duration = Histogram(
+    "upstream_request_duration_seconds",
+    "Outbound HTTP latency (time to response headers for streams).",
+    ("host", "status"),
+    UPSTREAM_BUCKETS,
+)
+llm_tokens = Counter("llm_tokens_total", "OpenAI tokens used.", ("model", "kind"))
+llm_calls = Counter(
+    "llm_calls_total", "LLM gateway calls by lane and outcome.", ("model", "lane", "outcome")
+)
+llm_queue_wait = Histogram(
+    "llm_queue_seconds", "Time LLM calls waited for a gateway slot or rate budget.", ("lane",), UPSTREAM_BUCKETS
+)
+
+
+# ------ LOGGING ------
+def log_event(event, sample=False, level="info", **fields):
+    """Write one JSON log line. sample=True events are kept at LOG_SAMPLE_RATE."""
+    if sample and random.random() >= LOG_SAMPLE_RATE:
+        return
+    record = {"ts": datetime.now(timezone.utc).isoformat(), "level": level, "event": event, **fields}
+    print(json.dumps(record, default=str), flush=False)
+
+
+# ------ MONGO ------
+# Per-request Mongo totals, so the access log can say how much of a request was database time.
+_request_mongo = contextvars.ContextVar("request_mongo", default=None)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo listener; passed to every client via app.db.CLIENT_OPTIONS."""
+
+    def _record(self, event, outcome):
+        seconds = event.duration_micros / 1e6
+        mongo_duration.observe(seconds, event.command_name, outcome)
+        totals = _request_mongo.get()
+        if totals is not None:
+            totals[0] += 1
+            totals[1] += seconds
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, "ok")
+
+    def failed(self, event):
+        self._record(event, "error")
+
+
+mongo_listener = MongoCommandMetrics()
+
+
+# ------ UPSTREAM ------
+def observe_upstream(host, status, seconds):
+    upstream_duration.observe(seconds, host, str(status))
+
+
+def _mark_request(request):
+    request.extensions["metrics_start"] = time.perf_counter()
+
+
+def _observe_response(response):
+    start = response.request.extensions.get("metrics_start")
+    if start is not None:
+        observe_upstream(response.request.url.netloc.decode(), response.status_code, time.perf_counter() - start)
+
+
+async def _amark_request(request):
+    _mark_request(request)
+
+
+async def _aobserve_response(response):
+    _observe_response(response)
+
+
+# httpx event hooks for the OpenAI clients (sync and async variants).
+HTTPX_HOOKS = {"request": [_mark_request], "response": [_observe_response]}
+ASYNC_HTTPX_HOOKS = {"request": [_amark_request], "response": [_aobserve_response]}
+
+
+def record_tokens(model, usage):
+    """Count prompt/completion tokens from a chat completion's usage block."""
+    if usage is None:
+        return
+    llm_tokens.inc(model, "prompt", amount=usage.prompt_tokens or 0)
+    llm_tokens.inc(model, "completion", amount=usage.completion_tokens or 0)
+
+
+# ------ REQUESTS ------
+def _start_request():
+    return time.perf_counter(), _request_mongo.set([0, 0.0])
+
+
+def _finish_request(start, token, route, method, status):
+    elapsed = time.perf_counter() - start
+    totals = _request_mongo.get() or [0, 0.0]
+    _request_mongo.reset(token)
+    request_duration.observe(elapsed, route, method, str(status))
+    ms = elapsed * 1000
+    log_event(
+        "request",
+        sample=not (ms >= SLOW_REQUEST_MS or status >= 500),
+        route=route, method=method, status=status, ms=round(ms, 1),
+        mongo_ops=totals[0], mongo_ms=round(totals[1] * 1000, 1),
+    )
+
+
+def instrument(blueprint):
+    """Time every request on a Flask blueprint."""
+    from flask import g, request
+
+    @blueprint.before_request
+    def start_timer():
+        g.metrics = _start_request()
+
+    @blueprint.teardown_request
+    def stop_timer(error=None):
+        started = g.pop("metrics", None)
+        if started is None:
+            return
+        status = getattr(g, "metrics_status", 500)
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        _finish_request(*started, route, request.method, status)
+
+    @blueprint.after_request
+    def remember_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+
+def instrument_async(blueprint):
+    """instrument() for the Quart blueprint of the async serving mode."""
+    from quart import g, request
+
+    @blueprint.before_request
+    async def start_timer():
+        g.metrics = _start_request()
+
+    @blueprint.after_request
+    async def stop_timer(response):
+        started = g.pop("metrics", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            _finish_request(*started, route, request.method, response.status_code)
+        return response
+
+
+# ------ EXPOSITION ------
+def _cache_lines(stats):
+    """Render cache_stats() as hit/miss counters per cache and tier."""
+    lookups = ["# HELP app_cache_lookups_total Cache lookups by tier and result.",
+               "# TYPE app_cache_lookups_total counter"]
+    events = ["# HELP app_cache_events_total Other cache counters (loads, coalesced, evictions, saved tokens).",
+              "# TYPE app_cache_events_total counter"]
+    for name, cache in sorted(stats.items()):
+        for tier in ("local", "shared"):
+            tier_stats = cache.get(tier) or {}
+            for result in ("hits", "misses"):
+                if result in tier_stats:
+                    labels = _labels(("cache", "tier", "result"), (name, tier, result))
+                    lookups.append(f"app_cache_lookups_total{labels} {tier_stats[result]}")
+            for key in ("evictions", "expirations", "errors"):
+                if key in tier_stats:
+                    labels = _labels(("cache", "event"), (name, f"{tier}_{key}"))
+                    events.append(f"app_cache_events_total{labels} {tier_stats[key]}")
+        for key in ("loads", "coalesced", "saved_tokens"):
+            if key in cache:
+                events.append(f"app_cache_events_total{_labels(('cache', 'event'), (name, key))} {cache[key]}")
+    return lookups + events
+
+
+def render_metrics(cache_stats=None):
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    if cache_stats:
+        lines.extend(_cache_lines(cache_stats))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,142 @@
+import click
+from pymongo import ASCENDING, DESCENDING, TEXT
+
+from app.conversations import CONVERSATION_TTL
+from app.db import get_db
+from app.favorite_repository import dedupe_favorites, normalize_favorite_zpids
+
+# ---- Performance indexes ----
+INDEXES = {
+    "listings": [
+        [("location", ASCENDING)],
+        [("price", ASCENDING)],
+        [("propertyType", ASCENDING)],
+        [("title", TEXT), ("description", TEXT)],  # for full-text search
+        ([("zpid", ASCENDING)], {"unique": True}),
+        [("locations", ASCENDING), ("_id", ASCENDING)],
+    ],
+    "users": [
+        ([("email", ASCENDING)], {"unique": True}),
+    ],
+    # register_user relies on this instead of checking for an existing user first.
+    "User": [
+        ([("email", ASCENDING)], {"unique": True}),
+    ],
+    # Keyset pagination: equality filter first, then the _id the pages are ordered by.
+    "Task": [
+        [("userId", ASCENDING), ("_id", ASCENDING)],
+    ],
+    "Favorite": [
+        # One favorite per user and home; add_favorite upserts against it.
+        ([("userId", ASCENDING), ("zpid", ASCENDING)], {"unique": True}),
+        # Covers FAVORITE_PROJECTION: keyset pages, forecasts and the dashboard read only the index.
+        [("userId", ASCENDING), ("_id", ASCENDING), ("zpid", ASCENDING), ("title", ASCENDING),
+         ("city", ASCENDING), ("price", ASCENDING), ("bedrooms", ASCENDING), ("bathrooms", ASCENDING),
+         ("image", ASCENDING), ("priceRefreshedAt", ASCENDING)],
+        # Price refresh: stalest-first grouping and per-zpid bulk updates.
+        [("zpid", ASCENDING), ("priceRefreshedAt", ASCENDING)],
+    ],
+    "Home": [
+        [("listedById", ASCENDING), ("_id", ASCENDING)],
+    ],
+    "Conversation": [
+        # open_conversation: the user's latest conversation.
+        [("userId", ASCENDING), ("updatedAt", DESCENDING)],
+        ([("updatedAt", ASCENDING)], {"expireAfterSeconds": CONVERSATION_TTL}),
+    ],
+}
+
+# Indexes earlier releases created that the ones above make redundant; dropped after those build.
+RETIRED_INDEXES = {
+    # Prefixes of the unique (userId, zpid) and covering (userId, _id, ...) indexes.
+    "Favorite": ["userId_1", "userId_1__id_1"],
+}
+
+# ---- Schema validation rules ----
+VALIDATORS = {
+    "User": {
+        "$jsonSchema": {
+            "bsonType": "object",
+            "required": ["email", "password"],
+            "properties": {
+                "email": {"bsonType": "string", "description": "must be a string and is required"},
+                "password": {"bsonType": "string", "description": "must be a string and is required"},
+                "name": {"bsonType": "string", "description": "optional but must be a string if present"}
+            }
+        }
+    },
+    "listings": {
+        "$jsonSchema": {
+            "bsonType": "object",
+            "required": ["title", "price", "location", "listedById"],
+            "properties": {
+                "title": {"bsonType": "string"},
+                "price": {"bsonType": "number"},
+                "location": {"bsonType": "string"},
+                "propertyType": {"bsonType": "string"},
+                "listedById": {"bsonType": "string"}
+            }
+        }
+    },
+    "favorites": {
+        "$jsonSchema": {
+            "bsonType": "object",
+            "required": ["userId", "listingId"],
+            "properties": {
+                "userId": {"bsonType": "string"},
+                "listingId": {"bsonType": "string"}
+            }
+        }
+    },
+    "Task": {
+        "$jsonSchema": {
+            "bsonType": "object",
+            "required": ["title", "category", "due_date", "priority", "userId"],
+            "properties": {
+                "title": {"bsonType": "string"},
+                "category": {"bsonType": "string"},
+                "due_date": {"bsonType": "string"},
+                "priority": {"bsonType": "string"},
+                "userId": {"bsonType": "string"}
+            }
+        }
+    },
+}
+
+
+def migrate(log=print):
+    """Create indexes and apply schema validators. Safe to run repeatedly."""
+    db = get_db()
+    existing = set(db.list_collection_names())
+
+    for name, validator in VALIDATORS.items():
+        if name in existing:
+            db.command("collMod", name, validator=validator, validationAction="error")
+        else:
+            db.create_collection(name, validator=validator, validationAction="error")
+            existing.add(name)
+        log(f"validator applied: {name}")
+
+    if "Favorite" in existing:
+        # Before deduping: 123 and "123" are the same home but distinct index keys.
+        normalize_favorite_zpids(db["Favorite"], log=log)
+        dedupe_favorites(db["Favorite"], log=log)
+
+    for name, indexes in INDEXES.items():
+        for spec in indexes:
+            keys, options = spec if isinstance(spec, tuple) else (spec, {})
+            index_name = db[name].create_index(keys, **options)
+            log(f"index ready: {name}.{index_name}")
+
+    for name, index_names in RETIRED_INDEXES.items():
+        present = db[name].index_information() if name in existing else {}
+        for index_name in index_names:
+            if index_name in present:
+                db[name].drop_index(index_name)
+                log(f"index dropped: {name}.{index_name}")
+
+
+@click.command("migrate")
+def migrate_command():
+    """Create indexes and schema validators (run once per deploy, not per worker)."""
+    migrate(log=click.echo)
@@ -0,0 +1,101 @@
+"""Compact binary forecast artifact that workers memory-map instead of unpickling.
+
+Layout: MAGIC, a little-endian uint32 header length, a JSON header (years,
+regions, confidence, shape), zero padding to a 64-byte boundary, then one
+C-ordered float64 array of shape (groups, 3, years) holding the
+forecast / lower / upper ratio per year, relative to the group's forecast for
+its first year. Group 0 is the national curve. The engine slices this table
+as it is, so every worker serves from the same page-cache pages.
+
+Files are written to a temporary name and renamed into place, so readers
+only ever see a complete artifact; a worker still mapping the previous
+file keeps its inode alive until it reloads.
+"""
+import json
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+MAGIC = b"HPMF0002"
+ALIGNMENT = 64
+DTYPE = "<f8"
+
+
+def _curves(model):
+    """Return (forecast, lower, upper, confidence) for either joblib layout."""
+    if "forecast" in model:
+        forecast = model["forecast"]
+        return forecast, model.get("lower", forecast), model.get("upper", forecast), model.get("confidence", 95)
+    return model, model, model, 95
+
+
+class ModelArtifact:
+    """Year-indexed forecast arrays, per region when the model has regions."""
+
+    def __init__(self, years, regions, ratios, confidence=95, trained_at=None):
+        self.years = list(years)
+        # regions[i] is the lowercased key of group i; "" is the national curve.
+        self.regions = list(regions)
+        self.ratios = ratios
+        self.confidence = confidence
+        self.trained_at = trained_at
+
+    @classmethod
+    def from_dict(cls, model):
+        """Convert a joblib model (flat, nested or version 2 with regions)."""
+        forecast, lower, upper, confidence = _curves(model)
+        years = list(forecast)
+        rows = [[[float(curve[y]) for y in years] for curve in (forecast, lower, upper)]]
+        regions = [""]
+        for key, region in model.get("regions", {}).items():
+            r_forecast, r_lower, r_upper, _ = _curves(region)
+            # Every group shares the national year axis; train_model forecasts them all from the same year.
+            missing = [y for y in years if y not in r_forecast]
+            if missing:
+                raise ValueError(f"region {key!r} has no forecast for {', '.join(missing[:3])}; retrain the model")
+            rows.append([[float(curve[y]) for y in years] for curve in (r_forecast, r_lower, r_upper)])
+            regions.append(key)
+        prices = np.array(rows, dtype=DTYPE)
+        ratios = prices / prices[:, 0, 0][:, None, None]
+        return cls(years, regions, ratios, confidence, model.get("trained_at"))
+
+    def save(self, path):
+        """Write the artifact atomically (temp file + rename)."""
+        header = json.dumps({
+            "years": self.years,
+            "regions": self.regions,
+            "confidence": self.confidence,
+            "trained_at": self.trained_at,
+            "shape": list(self.ratios.shape),
+        }).encode()
+        prefix = len(MAGIC) + 4 + len(header)
+        padding = b"\0" * (-prefix % ALIGNMENT)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".model-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(MAGIC + struct.pack("<I", len(header)) + header + padding)
+                f.write(np.ascontiguousarray(self.ratios, dtype=DTYPE).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map an artifact read-only; pages are shared through the page cache."""
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a compact forecast model")
+            (length,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(length))
+        prefix = len(MAGIC) + 4 + length
+        offset = prefix + (-prefix % ALIGNMENT)
+        ratios = np.memmap(path, dtype=DTYPE, mode="r", offset=offset, shape=tuple(header["shape"]))
+        return cls(header["years"], header["regions"], ratios, header["confidence"], header.get("trained_at"))
@@ -0,0 +1,85 @@
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from flask import Response, current_app, jsonify, request, stream_with_context
+
+from app.auth import is_internal
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+# Documents fetched per cursor batch when streaming an export.
+EXPORT_BATCH_SIZE = 500
+
+
+def page_args(args):
+    """Read limit/after from the query string; raises ValueError on bad input."""
+    try:
+        limit = int(args.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    limit = min(limit, MAX_LIMIT)
+
+    after = args.get("after")
+    if after:
+        try:
+            after = ObjectId(after)
+        except (InvalidId, TypeError):
+            raise ValueError("after must be a cursor returned by a previous page")
+    return limit, after or None
+
+
+def find_page(collection, query, projection, limit, after=None):
+    """Keyset-paginate on _id. Returns (documents, next_cursor or None)."""
+    if after is not None:
+        query = {**query, "_id": {"$gt": after}}
+    # Fetch one extra document to know whether another page exists.
+    docs = list(collection.find(query, projection).sort("_id", 1).limit(limit + 1))
+    if len(docs) > limit:
+        return docs[:limit], str(docs[limit - 1]["_id"])
+    return docs, None
+
+
+def stream_json_array(key, cursor, serialize):
+    """Stream {"<key>": [...]} straight from a cursor, one batch in memory at a time."""
+
+    def generate():
+        try:
+            yield f'{{"{key}": ['
+            for i, doc in enumerate(cursor.batch_size(EXPORT_BATCH_SIZE)):
+                yield ("," if i else "") + current_app.json.dumps(serialize(doc))
+            yield "]}"
+        finally:
+            cursor.close()
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
+def paginated_response(key, collection, query, projection, serialize, scoped=True):
+    """Body of the listing endpoints.
+
+    With limit or after: one keyset page plus next_cursor. Without either: the
+    full list (the pre-pagination contract clients still rely on), as one
+    body so it gets an ETag and compression. With ?stream=1: the full list,
+    streamed from the cursor, for exports. scoped=False (no user filter) is
+    only served to internal callers (X-Internal-Token), and only page by
+    page, so nobody can walk or dump a whole collection.
+    """
+    if not scoped and not is_internal(request.headers.get("X-Internal-Token")):
+        return jsonify({"error": "Filter by user"}), 400
+    paged = "limit" in request.args or "after" in request.args
+    if request.args.get("stream") == "1" or not paged:
+        if not scoped:
+            return jsonify({"error": "Pass limit to page through results"}), 400
+        cursor = collection.find(query, projection).sort("_id", 1)
+        if request.args.get("stream") == "1":
+            return stream_json_array(key, cursor, serialize)
+        return jsonify({key: [serialize(doc) for doc in cursor]})
+
+    try:
+        limit, after = page_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    docs, next_cursor = find_page(collection, query, projection, limit, after)
+    return jsonify({key: [serialize(doc) for doc in docs], "next_cursor": next_cursor})
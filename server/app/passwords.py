@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Werkzeug method string, fully specified so stored hashes can be compared against it.
+# Changing it makes the next successful login re-hash the password (see needs_rehash).
+HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+SALT_LENGTH = int(os.getenv("PASSWORD_SALT_LENGTH", "16"))
+# KDF processes per API worker.
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+# Hashes queued or running at once; past this, callers wait up to HASH_QUEUE_TIMEOUT, then get HashPoolBusy.
+HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(HASH_WORKERS * 4)))
+HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "0.5"))
+HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+
+
+class HashPoolBusy(Exception):
+    """Raised when the KDF pool is saturated; the route answers 503."""
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(HASH_MAX_PENDING)
+
+
+def _get_pool():
+    """The KDF process pool, created on first use and again after a fork."""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                # spawn: forking a threaded server process can deadlock the children.
+                _pool = ProcessPoolExecutor(HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def _discard_pool(pool):
+    """Drop a broken pool so the next call builds a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(fn, *args):
+    if not _pending.acquire(timeout=HASH_QUEUE_TIMEOUT):
+        raise HashPoolBusy("Password hashing is saturated")
+    pool = _get_pool()
+    try:
+        # The werkzeug functions are submitted directly, so the pool never imports the app.
+        future = pool.submit(fn, *args)
+    except BaseException as e:
+        _pending.release()
+        if isinstance(e, BrokenProcessPool):
+            _discard_pool(pool)
+            raise HashPoolBusy("Password hashing pool is restarting") from e
+        raise
+    future.add_done_callback(lambda _: _pending.release())
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except TimeoutError as e:
+        raise HashPoolBusy("Password hashing timed out") from e
+    except BrokenProcessPool as e:
+        _discard_pool(pool)
+        raise HashPoolBusy("Password hashing pool is restarting") from e
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, HASH_METHOD, SALT_LENGTH)
+
+
+def verify_password(stored_hash, password):
+    return _run(check_password_hash, stored_hash, password)
+
+
+def needs_rehash(stored_hash):
+    """True if the hash was made with different KDF parameters than HASH_METHOD."""
+    return stored_hash.split("$", 1)[0] != HASH_METHOD
@@ -0,0 +1,101 @@
+import os
+
+from app.cache import MongoCacheTier, TieredCache
+
+# Bump whenever build_task_prompt or the task model changes so old plans stop matching.
+PROMPT_VERSION = "tasks-v2"
+
+PLAN_CACHE_TTL = int(os.getenv("PLAN_CACHE_TTL", str(7 * 24 * 3600)))
+
+
+def credit_band(credit_score):
+    """Bucket a credit score into the usual FICO bands."""
+    try:
+        score = int(float(credit_score))
+    except (TypeError, ValueError):
+        return "unknown"
+    if score < 580:
+        return "poor"
+    if score < 670:
+        return "fair"
+    if score < 740:
+        return "good"
+    if score < 800:
+        return "very-good"
+    return "excellent"
+
+
+def refinance_intent(refinancing_info):
+    """Reduce the free-text refinancing answer to refinance / purchase / general."""
+    text = (refinancing_info or "").lower()
+    if "refi" in text:
+        return "refinance"
+    if any(word in text for word in ("buy", "purchas", "first home", "first-time")):
+        return "purchase"
+    return "general"
+
+
+def price_band(house):
+    try:
+        price = float(house["price"])
+    except (TypeError, KeyError, ValueError):
+        return "none"
+    for limit, band in ((150_000, "<150k"), (300_000, "150-300k"), (500_000, "300-500k"), (1_000_000, "500k-1m")):
+        if price < limit:
+            return band
+    return "1m+"
+
+
+def plan_profile(credit_score, refinancing_info, house):
+    """The bucketed profile a plan is generated from; the prompt sees nothing else.
+
+    Plans are shared by everyone in the same buckets, so neither the exact
+    score nor anything identifying the user's home may reach the prompt.
+    """
+    return credit_band(credit_score), refinance_intent(refinancing_info), price_band(house)
+
+
+def plan_key(model, credit_score, refinancing_info, house):
+    return "|".join((PROMPT_VERSION, model) + plan_profile(credit_score, refinancing_info, house))
+
+
+class PlanCache(TieredCache):
+    """Generated task plans keyed on a bucketed profile rather than the exact prompt.
+
+    Cached values are {"tasks": [...], "tokens": n}, where tokens is what the
+    LLM call that produced the plan cost, so hits can report tokens saved.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+
+    def record(self, plan, generated):
+        if generated:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.saved_tokens += plan.get("tokens", 0)
+
+    def stats(self):
+        stats = super().stats()
+        total = self.hits + self.misses
+        stats.update({
+            "prompt_version": PROMPT_VERSION,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            "saved_tokens": self.saved_tokens,
+        })
+        return stats
+
+
+plan_cache = PlanCache(
+    "task_plans",
+    maxsize=int(os.getenv("PLAN_CACHE_SIZE", "512")),
+    ttl=PLAN_CACHE_TTL,
+    shared=MongoCacheTier("PlanCache", ttl=PLAN_CACHE_TTL)
+    if os.getenv("PLAN_CACHE_SHARED", "1") == "1" else None,
+)
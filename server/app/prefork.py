@@ -0,0 +1,61 @@
+"""Preloading and per-worker setup for pre-fork servers (see gunicorn.conf.py).
+
+The master imports the app and loads the read-mostly data every worker needs
+before forking, so workers start warm and share those pages copy-on-write
+instead of each building its own copy:
+
+- the forecast model, memory-mapped from the compact artifact;
+- the similar-homes index (PRELOAD_SIMILAR_HOMES=0 to skip; needs Mongo at boot).
+
+gc.freeze() then moves everything allocated so far out of the collector's
+reach, so collections in the workers don't write to (and thereby copy) the
+shared pages. Connections are never shared: the Mongo, OpenAI and upstream
+HTTP clients check the pid and are recreated in each worker on first use,
+and background threads are started per worker by after_fork().
+"""
+import gc
+import os
+import time
+import traceback
+
+from app.db import close_client
+from app.forecast import get_forecast_engine
+from app.price_refresh import start_price_refresh
+from app.recently_viewed import flush_views
+from app.similar_homes import get_similar_index
+
+PRELOAD_SIMILAR_HOMES = os.getenv("PRELOAD_SIMILAR_HOMES", "1") == "1"
+
+
+def preload(log=print):
+    """Load shared data in the master, then freeze it for copy-on-write sharing."""
+    start = time.perf_counter()
+    try:
+        engine = get_forecast_engine()
+        log(f"preloaded forecast model: {len(engine.years)} years, {len(engine.regions)} regions")
+    except Exception:
+        # Workers load it on first use instead; /api/ready reports the failure.
+        traceback.print_exc()
+    if PRELOAD_SIMILAR_HOMES:
+        try:
+            log(f"preloaded similar-homes index: {len(get_similar_index())} homes")
+        except Exception:
+            traceback.print_exc()
+    # The master serves nothing; don't keep its Mongo connections and monitor threads around.
+    close_client()
+    gc.collect()
+    gc.freeze()
+    log(f"preload finished in {time.perf_counter() - start:.1f}s")
+
+
+def after_fork():
+    """Per-worker setup, run in each worker right after it is forked."""
+    start_price_refresh()
+
+
+def before_exit():
+    """Write state that only lives in this worker before it exits (graceful stop or reload)."""
+    try:
+        flush_views()
+    except Exception:
+        traceback.print_exc()
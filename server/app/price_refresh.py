@@ -0,0 +1,172 @@
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import click
+from pymongo import ReturnDocument, UpdateMany
+from pymongo.errors import DuplicateKeyError
+
+from app.db import db
+from app.zillow import fetch_property
+
+# Seconds between refresh runs of the in-process worker; 0 disables it.
+REFRESH_INTERVAL = float(os.getenv("PRICE_REFRESH_INTERVAL", "0"))
+# zpids fetched (and written back) per batch.
+BATCH_SIZE = int(os.getenv("PRICE_REFRESH_BATCH_SIZE", "50"))
+# Most zpids refreshed per run, stalest first; the rest wait for the next run.
+MAX_PER_RUN = int(os.getenv("PRICE_REFRESH_MAX_PER_RUN", "1000"))
+CONCURRENCY = int(os.getenv("PRICE_REFRESH_CONCURRENCY", "4"))
+# Upstream calls per second across all fetch threads.
+RATE_LIMIT = float(os.getenv("PRICE_REFRESH_RATE", "2"))
+
+LEASE_ID = "price-refresh"
+
+
+class RateLimiter:
+    """Space calls at least 1/rate seconds apart, across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def stalest_zpids(limit=MAX_PER_RUN):
+    """Distinct favorited zpids, least recently refreshed first (never-refreshed ones lead)."""
+    pipeline = [
+        {"$group": {"_id": "$zpid", "refreshedAt": {"$min": "$priceRefreshedAt"}}},
+        {"$sort": {"refreshedAt": 1}},
+        {"$limit": limit},
+    ]
+    return [doc["_id"] for doc in db["Favorite"].aggregate(pipeline) if doc["_id"]]
+
+
+def refresh_update(zpid, detail, now):
+    """One UpdateMany covering every user's favorite of this zpid, or None if Zillow had no price."""
+    price = detail.get("price")
+    if not isinstance(price, (int, float)) or isinstance(price, bool) or price <= 0:
+        return None
+    fields = {"price": price, "priceRefreshedAt": now}
+    for name in ("bedrooms", "bathrooms", "image"):
+        if detail.get(name):
+            fields[name] = detail[name]
+    return UpdateMany({"zpid": zpid}, {"$set": fields})
+
+
+def refresh_prices(zpids=None, fetch=fetch_property, rate=RATE_LIMIT, concurrency=CONCURRENCY, batch_size=BATCH_SIZE):
+    """Re-fetch current details for favorited homes and bulk-write them back.
+
+    Each zpid is fetched once however many users favorited it. Returns a
+    summary dict of zpids seen, fetched, failed and favorites modified.
+    """
+    zpids = stalest_zpids() if zpids is None else zpids
+    limiter = RateLimiter(rate)
+    stats = {"zpids": len(zpids), "fetched": 0, "failed": 0, "modified": 0}
+
+    def fetch_one(zpid):
+        limiter.wait()
+        try:
+            return zpid, fetch(zpid)
+        except Exception as e:
+            print(f" Price refresh failed for zpid {zpid}:", e)
+            return zpid, None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for start in range(0, len(zpids), batch_size):
+            now = datetime.now(timezone.utc)
+            ops = []
+            for zpid, detail in pool.map(fetch_one, zpids[start:start + batch_size]):
+                if detail is None:
+                    stats["failed"] += 1
+                    continue
+                stats["fetched"] += 1
+                op = refresh_update(zpid, detail, now)
+                if op is not None:
+                    ops.append(op)
+            if ops:
+                stats["modified"] += db["Favorite"].bulk_write(ops, ordered=False).modified_count
+    return stats
+
+
+def acquire_lease(owner, ttl):
+    """Claim the refresh lease so only one process runs a refresh at a time."""
+    now = datetime.now(timezone.utc)
+    try:
+        db["JobLeases"].find_one_and_update(
+            {"_id": LEASE_ID, "$or": [{"expiresAt": {"$lt": now}}, {"owner": owner}]},
+            {"$set": {"owner": owner, "expiresAt": now + timedelta(seconds=ttl)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return True
+    except DuplicateKeyError:
+        # The lease exists, is unexpired and belongs to someone else.
+        return False
+
+
+class PriceRefreshWorker:
+    """Daemon thread that runs refresh_prices every `interval` seconds.
+
+    Every API process may start one; the Mongo lease makes sure only one of
+    them actually refreshes per interval.
+    """
+
+    def __init__(self, interval=REFRESH_INTERVAL):
+        self.interval = interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="price-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if acquire_lease(self.owner, self.interval):
+                    stats = refresh_prices()
+                    print(" Price refresh:", stats)
+            except Exception:
+                traceback.print_exc()
+
+
+_worker = None
+
+
+def start_price_refresh():
+    """Start the in-process worker once, if PRICE_REFRESH_INTERVAL is set."""
+    global _worker
+    # Pool children (e.g. the password hashing pool) re-import the main module; they never refresh.
+    if multiprocessing.parent_process() is not None:
+        return None
+    if REFRESH_INTERVAL > 0 and _worker is None:
+        _worker = PriceRefreshWorker().start()
+    return _worker
+
+
+@click.command("refresh-prices")
+@click.option("--limit", default=MAX_PER_RUN, show_default=True, help="Most zpids to refresh.")
+def refresh_prices_command(limit):
+    """Refresh favorited homes' prices from Zillow once (e.g. from cron)."""
+    click.echo(refresh_prices(stalest_zpids(limit)))
@@ -0,0 +1,200 @@
+"""Recently viewed homes.
+
+Views are buffered in-process, where repeat views of a home collapse into
+one entry, and flushed every RECENTLY_VIEWED_FLUSH_INTERVAL seconds as a
+single bulk write: one upsert per user, which prepends the new views, drops
+older views of the same homes and caps the history at HISTORY_SIZE. Reads
+come from a per-user LRU merged with the views still waiting in the buffer.
+
+The history is one document per user in ViewHistory ({_id: userId, views:
+[...]}, newest first) rather than Prisma's one-document-per-pair
+RecentlyViewed shape, so keeping it capped never needs a find or a delete.
+"""
+import atexit
+import os
+import threading
+import traceback
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from app.cache import TieredCache
+from app.db import db
+
+HISTORY_SIZE = int(os.getenv("RECENTLY_VIEWED_SIZE", "50"))
+FLUSH_INTERVAL = float(os.getenv("RECENTLY_VIEWED_FLUSH_INTERVAL", "5"))
+# Flush early once this many distinct (user, home) views are waiting.
+MAX_BUFFERED = int(os.getenv("RECENTLY_VIEWED_MAX_BUFFERED", "5000"))
+COLLECTION = "ViewHistory"
+# Listing details the client may send along, so the history renders without a lookup per home.
+VIEW_FIELDS = ("title", "city", "price", "bedrooms", "bathrooms", "image")
+
+history_cache = TieredCache(
+    "recently_viewed",
+    maxsize=int(os.getenv("RECENTLY_VIEWED_CACHE_SIZE", "5000")),
+    ttl=int(os.getenv("RECENTLY_VIEWED_CACHE_TTL", "120")),
+)
+
+
+def make_view(home_id, details=None, viewed_at=None):
+    view = {"homeId": str(home_id), "viewedAt": viewed_at or datetime.now(timezone.utc)}
+    for field in VIEW_FIELDS:
+        if details and details.get(field) is not None:
+            view[field] = details[field]
+    return view
+
+
+def merge_views(newest, older, limit=HISTORY_SIZE):
+    """Newest-first views with each home listed once, at its most recent view."""
+    seen, merged = set(), []
+    for view in list(newest) + list(older):
+        if view["homeId"] not in seen:
+            seen.add(view["homeId"])
+            merged.append(view)
+            if len(merged) == limit:
+                break
+    return merged
+
+
+def history_update(user_id, views):
+    """One upsert that prepends views (newest first), drops earlier views of those homes and caps the list."""
+    home_ids = [view["homeId"] for view in views]
+    kept = {"$filter": {
+        "input": {"$ifNull": ["$views", []]},
+        "cond": {"$eq": [{"$in": ["$$this.homeId", home_ids]}, False]},
+    }}
+    # $literal: listing titles are user-facing text and may start with "$".
+    views = {"$slice": [{"$concatArrays": [{"$literal": views}, kept]}, HISTORY_SIZE]}
+    return UpdateOne({"_id": user_id}, [{"$set": {"views": views}}], upsert=True)
+
+
+class ViewBuffer:
+    """Views not yet written, per user; a repeat view of a home replaces the pending one."""
+
+    def __init__(self):
+        self._pending = {}  # user_id -> OrderedDict(homeId -> view), oldest first
+        self._size = 0
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.coalesced = 0
+
+    def add(self, user_id, view):
+        """Buffer a view; returns how many views are now waiting."""
+        with self._lock:
+            views = self._pending.setdefault(user_id, OrderedDict())
+            self.recorded += 1
+            if views.pop(view["homeId"], None) is not None:
+                self.coalesced += 1
+                self._size -= 1
+            views[view["homeId"]] = view
+            self._size += 1
+            if len(views) > HISTORY_SIZE:
+                views.popitem(last=False)
+                self._size -= 1
+            return self._size
+
+    def pending(self, user_id):
+        with self._lock:
+            return list(reversed(self._pending.get(user_id, {}).values()))
+
+    def drain(self):
+        """Take every waiting view: {user_id: [views, newest first]}."""
+        with self._lock:
+            pending, self._pending, self._size = self._pending, {}, 0
+        return {user_id: list(reversed(views.values())) for user_id, views in pending.items()}
+
+    def restore(self, batch):
+        """Put back a batch whose write failed, behind any views recorded since."""
+        with self._lock:
+            for user_id, views in batch.items():
+                newer = self._pending.get(user_id, OrderedDict())
+                merged = OrderedDict((v["homeId"], v) for v in reversed(views) if v["homeId"] not in newer)
+                merged.update(newer)
+                while len(merged) > HISTORY_SIZE:
+                    merged.popitem(last=False)
+                self._size += len(merged) - len(newer)
+                self._pending[user_id] = merged
+
+    def __len__(self):
+        return self._size
+
+
+buffer = ViewBuffer()
+
+
+def flush_views():
+    """Write every buffered view with one bulk write; returns the number of users updated."""
+    batch = buffer.drain()
+    if not batch:
+        return 0
+    try:
+        db[COLLECTION].bulk_write([history_update(user_id, views) for user_id, views in batch.items()],
+                                  ordered=False)
+    except Exception:
+        buffer.restore(batch)
+        raise
+    # Keep cached histories current instead of re-reading them after every flush.
+    for user_id, views in batch.items():
+        cached = history_cache.local.get(user_id)
+        if cached is not None:
+            history_cache.local.set(user_id, merge_views(views, cached))
+    return len(batch)
+
+
+class ViewFlusher:
+    """Daemon thread that flushes the buffer every `interval` seconds, or sooner when it fills up."""
+
+    def __init__(self, interval=FLUSH_INTERVAL):
+        self.interval = interval
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="recently-viewed-flush", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                flush_views()
+            except Exception:
+                traceback.print_exc()
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _ensure_flusher():
+    # Started on the first view rather than at import, so only processes that serve views run one.
+    global _flusher
+    if _flusher is None:
+        with _flusher_lock:
+            if _flusher is None:
+                _flusher = ViewFlusher().start()
+                atexit.register(flush_views)
+    return _flusher
+
+
+def record_view(user_id, home_id, details=None):
+    """Buffer one view; it reaches Mongo with the next flush."""
+    flusher = _ensure_flusher()
+    if buffer.add(user_id, make_view(home_id, details)) >= MAX_BUFFERED:
+        flusher.wake()
+
+
+def load_history(user_id):
+    doc = db[COLLECTION].find_one({"_id": user_id}, {"views": 1})
+    return doc["views"] if doc else []
+
+
+def recent_views(user_id, limit=HISTORY_SIZE):
+    """Newest-first history: unflushed views in front of the cached stored history."""
+    stored = history_cache.get_or_load(user_id, lambda: load_history(user_id))
+    return merge_views(buffer.pending(user_id), stored, limit)
@@ -0,0 +1,123 @@
+"""Response layer for the api blueprint: fast JSON, strong ETags and compression."""
+import gzip
+import hashlib
+import os
+from datetime import date, datetime
+
+from bson.objectid import ObjectId
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib provider below still handles ObjectId
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Bodies smaller than this go out uncompressed; the headers would eat the saving.
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# Brotli quality 4 compresses better than gzip -6 at similar CPU cost; 11 is for static assets.
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+COMPRESSIBLE_TYPES = {"application/json", "text/plain", "text/html", "text/csv"}
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """orjson-backed provider that encodes ObjectId and datetimes natively.
+
+    Keys stay sorted, as with Flask's default provider, so identical data
+    always produces identical bytes (and ETags). Without orjson installed it
+    falls back to the stdlib encoder with the same ObjectId/datetime handling.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            kwargs.setdefault("default", _default)
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj, indent="indent" in kwargs).decode()
+
+    def dumps_bytes(self, obj, indent=False):
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+
+    def loads(self, s, **kwargs):
+        if orjson is None:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        # Skip the bytes -> str -> bytes round-trip of the default implementation.
+        return self._app.response_class(self.dumps_bytes(obj, indent) + b"\n", mimetype=self.mimetype)
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick br or gzip from an Accept-Encoding header, honouring q=0."""
+    offered = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[coding.strip().lower()] = q
+    for coding in (("br",) if brotli is not None else ()) + ("gzip",):
+        if offered.get(coding, offered.get("*", 0)) > 0:
+            return coding
+    return None
+
+
+def compress(data, coding):
+    if coding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def finalize_responses(blueprint):
+    """Add strong ETags to GET responses, answer If-None-Match with 304, and compress large bodies."""
+
+    @blueprint.after_request
+    def finalize(response):
+        if response.is_streamed or response.direct_passthrough or response.status_code != 200:
+            return response
+        if response.headers.get("Content-Encoding"):
+            return response
+
+        data = response.get_data()
+        coding = None
+        if len(data) >= COMPRESS_MIN_SIZE and response.mimetype in COMPRESSIBLE_TYPES:
+            coding = negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+            response.vary.add("Accept-Encoding")
+
+        if request.method == "GET":
+            if not response.get_etag()[0]:
+                # Strong ETags identify the exact bytes, so each encoding gets its own tag.
+                digest = hashlib.sha1(data).hexdigest()
+                response.set_etag(f"{digest}-{coding}" if coding else digest)
+            response.make_conditional(request)
+            if response.status_code == 304:
+                return response
+
+        if coding:
+            response.set_data(compress(data, coding))
+            response.headers["Content-Encoding"] = coding
+        return response
@@ -1,41 +1,147 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, abort, g, jsonify, request, stream_with_context
 import os
 import json
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from openai import OpenAI, RateLimitError
+from openai import RateLimitError
+import math
 from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
 from bson.objectid import ObjectId
+from app.auth import is_internal, issue_token, load_user, request_user_id, user_cache
 from app.db import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.cache import AsyncSingleFlight, SingleFlight, TieredCache, cache_stats
+from app.conversations import CHAT_SYSTEM_PROMPT, build_messages, open_conversation, remember
+from app.favorite_repository import (
+    BATCH_LIMIT as FAVORITES_BATCH_LIMIT,
+    FAVORITE_PROJECTION,
+    add_favorite as store_favorite,
+    add_favorites,
+    find_favorites,
+    normalize_zpid,
+    remove_favorites,
+)
+from app.forecast import get_forecast_engine
+from app.listings import (
+    DEFAULT_RESULTS,
+    facet_filters,
+    is_covered,
+    location_match,
+    save_listings,
+    search_listings,
+    stale_search,
+)
+from app.llm import BULK, INTERACTIVE, LLMBusy, gateway, retry_after
+from app.metrics import instrument, log_event, render_metrics
+from app.pagination import paginated_response
+from app.responses import finalize_responses
+from app.similar_homes import get_similar_index, index_homes
+from app.passwords import HashPoolBusy, hash_password, needs_rehash, verify_password
+from app.plan_cache import plan_cache, plan_key, plan_profile
+from app.recently_viewed import HISTORY_SIZE as VIEW_HISTORY_SIZE, record_view, recent_views
+from app.task_repository import replace_many, replace_tasks
+from app.upstream import http
+from app.zillow import parse_property_summary, zillow_headers, zillow_url
 from bson.objectid import ObjectId
 import traceback
-from joblib import load
-import requests
 
 # Test at http://localhost:5000/api/tasks/generate
 
 api = Blueprint("api", __name__)
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+instrument(api)
+finalize_responses(api)
 
-MODEL_PATH = os.path.join(os.path.dirname(__file__), "house_price_model.joblib")
-model = load(MODEL_PATH)
 
-@api.route("/tasks/generate", methods=["POST"])
-def generate_tasks():
+# ------ AUTH ------
+@api.before_request
+def authenticate():
+    """Verify the bearer token, if any, once per request; no Mongo read involved."""
+    g.user_id, g.auth_error = request_user_id(request.headers.get("Authorization"))
 
-    data = request.get_json()
-    credit_score = data.get("credit_score")
-    refinancing_info = data.get("refinancing_info")
-    user_id = data.get("user_id")
 
-    house = db["Home"].find_one({"listedById": user_id})
-    house_details = ""
-    if house:
-        house_details = f"The user is interested in a house titled '{house['title']}' priced at ${house['price']}. "
+def authorization_required():
+    """401 for endpoints that need a valid token, saying why the one sent (if any) was not accepted."""
+    return jsonify({"error": g.get("auth_error") or "Authorization required"}), 401
+
+
+def caller_id(claimed=None):
+    """The caller's user id: the token's when a valid one was sent, else the legacy user_id/userId parameter."""
+    if g.get("user_id") is None:
+        return claimed
+    if claimed and claimed != g.user_id:
+        abort(Response(json.dumps({"error": "Token does not match user_id"}), 403, mimetype="application/json"))
+    return g.user_id
+
+
+@api.route("/me", methods=["GET"])
+def me():
+    if g.get("user_id") is None:
+        return authorization_required()
+    user = load_user(g.user_id)
+    if user is None:
+        return jsonify({"error": "User not found"}), 404
+    return jsonify(user)
+
+
+# ------ HEALTH ------
+@api.route("/health", methods=["GET"])
+def health():
+    """Liveness: the process is up and serving; touches no dependencies."""
+    return jsonify({"status": "ok"})
+
+
+@api.route("/ready", methods=["GET"])
+def ready():
+    """Readiness: Mongo answers and the forecast model is loaded (loading it if needed)."""
+    checks = {}
+    try:
+        db.command("ping")
+        checks["mongo"] = "ok"
+    except Exception as e:
+        checks["mongo"] = f"error: {e}"
+    try:
+        get_forecast_engine()
+        checks["model"] = "ok"
+    except Exception as e:
+        checks["model"] = f"error: {e}"
+
+    is_ready = all(status == "ok" for status in checks.values())
+    return jsonify({"ready": is_ready, "checks": checks}), 200 if is_ready else 503
+
+
+@api.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text exposition of this worker's request, Mongo, upstream and cache metrics."""
+    return Response(render_metrics(cache_stats()), mimetype="text/plain; version=0.0.4")
+
+
+TASK_MODEL = "gpt-3.5-turbo"
+TASK_FIELDS = ("title", "category", "due_date", "priority")
+
+
+CREDIT_TEXT = {
+    "poor": "poor (below 580)",
+    "fair": "fair (580-669)",
+    "good": "good (670-739)",
+    "very-good": "very good (740-799)",
+    "excellent": "excellent (800 or above)",
+}
+INTENT_TEXT = {
+    "refinance": "The user wants to refinance their home. ",
+    "purchase": "The user is buying a home. ",
+    "general": "",
+}
+
 
-    prompt = (
-        f"The user has a credit score of {credit_score}. {refinancing_info}. "
-        f"{house_details}"
+def build_task_prompt(credit_score, refinancing_info, house):
+    """Build the task-plan prompt from the bucketed profile, so plan_key fully determines it."""
+    credit, intent, price = plan_profile(credit_score, refinancing_info, house)
+    credit_text = f"The user's credit is {CREDIT_TEXT[credit]}. " if credit in CREDIT_TEXT else ""
+    house_text = f"The user is interested in a house in the {price} price range. " if price != "none" else ""
+
+    return (
+        f"{credit_text}{INTENT_TEXT[intent]}{house_text}"
         "Generate a JSON array of 5-7 tasks to help this user through buying or refinancing a home. "
         "Each task should be an object with the following fields:\n"
         "- title (string)\n"
@@ -45,81 +151,187 @@ def generate_tasks():
         "Return only raw JSON, no markdown, no explanation, no formatting, just the JSON array."
     )
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
+
+def parse_task_reply(reply):
+    """Parse the model's reply into validated task dicts; raises ValueError if unusable."""
+    task_objects = json.loads(reply)
+
+    # Drop tasks missing required fields so only complete plans are stored or cached.
+    required_keys = set(TASK_FIELDS)
+    valid = []
+    for i, task in enumerate(task_objects):
+        missing = required_keys - task.keys()
+        if missing:
+            log_event("llm.task_incomplete", sample=True, index=i, missing=sorted(missing))
+            continue
+        valid.append(task)
+    if not valid:
+        raise ValueError("AI response contained no complete tasks.")
+    return valid
+
+
+def task_document(task, user_id):
+    doc = {field: task[field] for field in TASK_FIELDS}
+    doc.update({"completed": False, "userId": user_id})
+    return doc
+
+
+def serialize_task(task_id, doc):
+    """Serialize a stored task for the JSON response."""
+    return {"id": str(task_id), **{field: doc[field] for field in TASK_FIELDS},
+            "completed": doc["completed"], "userId": str(doc["userId"])}
+
+
+def llm_unavailable(e):
+    """(payload, status, headers) once the gateway gives up: 503 if it stayed busy, 429 if quota retries ran out."""
+    if isinstance(e, LLMBusy):
+        payload, status, wait = {"error": str(e)}, 503, e.retry_after
+    else:
+        payload, status, wait = {"error": "OpenAI quota exceeded. Please check your API limits."}, 429, retry_after(e)
+    return payload, status, {"Retry-After": str(max(1, math.ceil(wait or 1)))}
+
+
+def plan_for_profile(credit_score, refinancing_info, house, lane=INTERACTIVE):
+    """Return a validated task list for this profile, from the plan cache or the LLM."""
+    generated = False
+
+    def generate_plan():
+        nonlocal generated
+        generated = True
+        prompt = build_task_prompt(credit_score, refinancing_info, house)
+        response = gateway.complete(
+            lane=lane,
+            model=TASK_MODEL,
             messages=[{"role": "user", "content": prompt}],
             max_tokens=500,
             n=1
         )
         reply = response.choices[0].message.content.strip()
-        print("\n GPT raw reply:\n", reply)
-    except RateLimitError:
-        return jsonify({"error": "OpenAI quota exceeded. Please check your API limits."}), 429
-    except Exception as e:
-        print(" GPT error:", e)
-        traceback.print_exc()
-        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+        log_event("llm.reply", sample=True, model=TASK_MODEL, reply=reply)
+        tokens = response.usage.total_tokens if response.usage else 0
+        return {"tasks": parse_task_reply(reply), "tokens": tokens}
+
+    key = plan_key(TASK_MODEL, credit_score, refinancing_info, house)
+    plan = plan_cache.get_or_load(key, generate_plan)
+    plan_cache.record(plan, generated)
+    return plan["tasks"]
+
+
+@api.route("/tasks/generate", methods=["POST"])
+def generate_tasks():
+
+    data = request.get_json()
+    credit_score = data.get("credit_score")
+    refinancing_info = data.get("refinancing_info")
+    user_id = caller_id(data.get("user_id"))
+
+    house = db["Home"].find_one({"listedById": user_id})
 
     try:
-        task_objects = json.loads(reply)
-    except json.JSONDecodeError:
-        print(" Failed to parse GPT response as JSON.")
+        task_objects = plan_for_profile(credit_score, refinancing_info, house)
+    except (RateLimitError, LLMBusy) as e:
+        payload, status, headers = llm_unavailable(e)
+        return jsonify(payload), status, headers
+    except ValueError as e:
+        # json.JSONDecodeError is a ValueError too.
+        log_event("task_generation_failed", level="error", user_id=user_id, reason="invalid_json", error=str(e))
         traceback.print_exc()
         return jsonify({"error": "Failed to parse AI response as JSON."}), 500
+    except Exception as e:
+        log_event("task_generation_failed", level="error", user_id=user_id, reason="llm_error", error=str(e))
+        traceback.print_exc()
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
-    # Optional: Validate structure of tasks
-    required_keys = {"title", "category", "due_date", "priority"}
-    for i, task in enumerate(task_objects):
-        missing = required_keys - task.keys()
-        if missing:
-            print(f" Task {i} is missing fields: {missing}")
+    docs = replace_tasks(user_id, [task_document(task, user_id) for task in task_objects])
+    new_tasks = [serialize_task(doc["_id"], doc) for doc in docs]
 
-    db["Task"].delete_many({"userId": user_id})
-    new_tasks = []
-    for task in task_objects:
-        doc = {
-            "title": task["title"],
-            "category": task["category"],
-            "due_date": task["due_date"],
-            "priority": task["priority"],
-            "completed": False,
-            "userId": user_id
-        }
-        result = db["Task"].insert_one(doc)
-
-        # Serialize safely
-        new_tasks.append({
-            "id": str(result.inserted_id),
-            "title": task["title"],
-            "category": task["category"],
-            "due_date": task["due_date"],
-            "priority": task["priority"],
-            "completed": False,
-            "userId": str(user_id)
-        })
+    return jsonify({"tasks": new_tasks}), 201
 
 
-    return jsonify({"tasks": new_tasks}), 201
+@api.route("/tasks/generate/batch", methods=["POST"])
+def generate_tasks_batch():
+    """Regenerate plans for many users (e.g. nightly re-planning) with a few bulk writes.
+
+    Internal callers (X-Internal-Token) may re-plan anyone; a signed-in user only themselves.
+    """
+    internal = is_internal(request.headers.get("X-Internal-Token"))
+    if not internal and g.get("user_id") is None:
+        return authorization_required()
+
+    data = request.get_json() or {}
+    profiles = data.get("users") or []
+    if not isinstance(profiles, list) or not profiles:
+        return jsonify({"error": "users is required"}), 400
+
+    plans, errors, invalid = {}, {}, 0
+    valid = []
+    for i, profile in enumerate(profiles):
+        user_id = profile.get("user_id") if isinstance(profile, dict) else None
+        if not user_id:
+            errors[f"users[{i}]"] = "user_id is required"
+            invalid += 1
+        elif not internal and user_id != g.user_id:
+            return jsonify({"error": "Token does not match user_id"}), 403
+        else:
+            valid.append(profile)
+
+    houses = {}
+    for house in db["Home"].find({"listedById": {"$in": [p["user_id"] for p in valid]}}):
+        houses.setdefault(house["listedById"], house)
+
+    for profile in valid:
+        user_id = profile["user_id"]
+        try:
+            task_objects = plan_for_profile(
+                profile.get("credit_score"), profile.get("refinancing_info"), houses.get(user_id), lane=BULK
+            )
+        except RateLimitError:
+            errors[user_id] = "OpenAI quota exceeded"
+            continue
+        except LLMBusy:
+            errors[user_id] = "Timed out waiting for the LLM gateway"
+            continue
+        except Exception as e:
+            errors[user_id] = str(e)
+            continue
+        plans[user_id] = [task_document(task, user_id) for task in task_objects]
+
+    errors.update(replace_many(plans))
+    if not plans:
+        # Nothing written: bad input only is the caller's fault, anything else upstream's.
+        status = 400 if invalid == len(errors) else 502
+    else:
+        status = 207 if errors else 201
+    return jsonify({
+        "tasks": {
+            user_id: [serialize_task(doc["_id"], doc) for doc in docs]
+            for user_id, docs in plans.items()
+        },
+        "errors": errors
+    }), status
 
 
+TASK_LIST_PROJECTION = {"title": 1, "completed": 1, "category": 1, "priority": 1, "due_date": 1}
+
+
+def serialize_task_summary(t):
+    return {
+        "id": t["_id"],
+        "title": t.get("title", ""),
+        "completed": t.get("completed", False),
+        "category": t.get("category", ""),
+        "priority": t.get("priority", "low"),
+        "due_date": t.get("due_date", "TBD")
+    }
+
 
 @api.route("/tasks", methods=["GET"])
 def get_tasks():
-    user_id = request.args.get("user_id")
+    user_id = caller_id(request.args.get("user_id"))
     query = {"userId": user_id} if user_id else {}
 
-    cursor = db["Task"].find(query)
-    tasks = [{
-    "id": str(t["_id"]),
-    "title": t.get("title", ""),
-    "completed": t.get("completed", False),
-    "category": t.get("category", ""),
-    "priority": t.get("priority", "low"),
-    "due_date": t.get("due_date", "TBD")
-    } for t in cursor]
-
-    return jsonify({"tasks": tasks})
+    return paginated_response("tasks", db["Task"], query, TASK_LIST_PROJECTION, serialize_task_summary,
+                              scoped=bool(user_id))
 
 
 @api.route("/tasks/<task_id>", methods=["GET"])
@@ -130,7 +342,7 @@ def get_task_by_id(task_id):
             return jsonify({"error": "Task not found"}), 404
 
         return jsonify({
-            "id": str(task["_id"]),
+            "id": task["_id"],
             "title": task["title"],
             "completed": task.get("completed", False)
         })
@@ -143,19 +355,32 @@ def register_user():
     email = data.get("email")
     name = data.get("name")
     password = data.get("password")
+    if not email or not password:
+        return jsonify({"error": "email and password are required"}), 400
 
-    if db["User"].find_one({"email": email}):
-        return jsonify({"error": "User already exists"}), 400
+    try:
+        hashed_pw = hash_password(password)
+    except HashPoolBusy:
+        return hashing_busy()
 
-    hashed_pw = generate_password_hash(password)
-    result = db["User"].insert_one({
-        "name": name,
-        "email": email,
-        "password": hashed_pw
-    })
+    # The unique User.email index (see migrations) rejects duplicates; no find_one first.
+    try:
+        result = db["User"].insert_one({
+            "name": name,
+            "email": email,
+            "password": hashed_pw
+        })
+    except DuplicateKeyError:
+        return jsonify({"error": "User already exists"}), 400
 
     return jsonify({"id": str(result.inserted_id), "email": email}), 201
 
+
+def hashing_busy():
+    response = jsonify({"error": "Too many sign-ins right now, please retry shortly."})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
 @api.route('/init-text-index', methods=['POST'])
 def create_text_index():
     db.homes.create_index([
@@ -169,9 +394,12 @@ def create_text_index():
 # app/routes.py
 @api.route("/users", methods=["GET"])
 def get_users():
-    users_cursor = db["User"].find()
-    users = [{"id": str(user["_id"]), "name": user["name"], "email": user["email"]} for user in users_cursor]
-    return jsonify({"users": users})
+    # Project name/email only so password hashes never leave Mongo; every user, so internal callers only.
+    return paginated_response(
+        "users", db["User"], {}, {"name": 1, "email": 1},
+        lambda user: {"id": user["_id"], "name": user.get("name"), "email": user["email"]},
+        scoped=False,
+    )
 
 @api.route("/login", methods=["POST"])
 def login_user():
@@ -180,14 +408,27 @@ def login_user():
     password = data.get("password")
 
     user = db["User"].find_one({"email": email})
-    if not user or not check_password_hash(user["password"], password):
+    if not user or not password:
         return jsonify({"error": "Invalid credentials"}), 401
-
-    return jsonify({
-        "id": str(user["_id"]),
-        "email": user["email"],
-        "name": user["name"]
-    }), 200
+    try:
+        if not verify_password(user["password"], password):
+            return jsonify({"error": "Invalid credentials"}), 401
+    except HashPoolBusy:
+        return hashing_busy()
+
+    if needs_rehash(user["password"]):
+        # Hash parameters changed since this password was stored: upgrade it now that we know it.
+        try:
+            db["User"].update_one(
+                {"_id": user["_id"], "password": user["password"]},
+                {"$set": {"password": hash_password(password)}},
+            )
+        except HashPoolBusy:
+            pass  # retried on the next login
+
+    record = {"id": str(user["_id"]), "email": user["email"], "name": user["name"]}
+    user_cache.set(record["id"], record)
+    return jsonify({**record, "token": issue_token(user["_id"])}), 200
 
 @api.route("/tasks/<task_id>", methods=["DELETE"])
 def delete_task(task_id):
@@ -199,205 +440,269 @@ def delete_task(task_id):
     except Exception as e:
         return jsonify({"error": f"Invalid task ID or delete failed: {str(e)}"}), 400
 
-# ------ FORECAST ------
-@api.route("/forecast/favorites", methods=["GET"])
-def forecast_all_favorites():
-    user_id = request.args.get("userId")
-    if not user_id:
-        return jsonify({"error": "userId is required"}), 400
+# ------ CHAT BOT ------
+def chat_messages(user_message):
+    return [
+        {"role": "system", "content": CHAT_SYSTEM_PROMPT},
+        {"role": "user", "content": user_message}
+    ]
 
-    # Find all favorites for the user
-    favorites = list(db["Favorite"].find({"userId": user_id}))
-    if not favorites:
-        return jsonify({"error": "No favorites found"}), 404
-
-    current_year = 2025
-    results = []
-
-    for fav in favorites:
-        base_price = fav.get("price")
-        if not base_price:
-            continue  # Skip if no price is stored
-
-        forecast = []
-        for i in range(1, 6):  # Predict next 5 years
-            year = str(current_year + i)
-            if year in model:
-                forecast.append({
-                    "date": year,
-                    "price": round(base_price * (model[year] / list(model.values())[0]), 2)
-                })
-
-        results.append({
-            "home": {
-                "zpid": fav.get("zpid"),
-                "title": fav.get("title"),
-                "city": fav.get("city"),
-                "price": base_price,
-                "bedrooms": fav.get("bedrooms"),
-                "bathrooms": fav.get("bathrooms"),
-                "image": fav.get("image")
-            },
-            "forecast": forecast
-        })
 
-    return jsonify({"forecasts": results})
+def chat_conversation(data):
+    """The signed-in caller's conversation for this message, or None for anonymous (stateless) chat.
+
+    Aborts with 404 when data names a conversationId the caller doesn't own.
+    """
+    user_id = caller_id(data.get("userId"))
+    if not user_id:
+        return None
+    new = str(data.get("newConversation", "")).lower() in ("1", "true")
+    conversation = open_conversation(user_id, data.get("conversationId"), new)
+    if conversation is None:
+        abort(Response(json.dumps({"error": "Conversation not found"}), 404, mimetype="application/json"))
+    return conversation
 
 
+def chat_prompt(conversation, user_message):
+    return build_messages(conversation, user_message) if conversation else chat_messages(user_message)
 
 
+def conversation_fields(conversation):
+    return {"conversationId": str(conversation["_id"])} if conversation else {}
 
 
-# ------ CHAT BOT ------
 @api.route("/chat", methods=["POST"])
 def chat():
     data = request.get_json()
     user_message = data.get("message")
+    conversation = chat_conversation(data)
 
     try:
-        response = client.chat.completions.create(
+        response = gateway.complete(
             model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a helpful real estate assistant."},
-                {"role": "user", "content": user_message}
-            ],
+            messages=chat_prompt(conversation, user_message),
             temperature=0.7,
         )
         reply = response.choices[0].message.content.strip()
-        return jsonify({ "reply": reply })
+        if conversation:
+            remember(conversation, user_message, reply)
+        return jsonify({ "reply": reply, **conversation_fields(conversation) })
+    except (RateLimitError, LLMBusy) as e:
+        payload, status, headers = llm_unavailable(e)
+        return jsonify(payload), status, headers
     except Exception as e:
         return jsonify({ "error": str(e) }), 500
 
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # stop nginx-style proxies from buffering the stream
+}
+
+
+def sse_event(data, event=None):
+    """Format one server-sent event carrying a JSON payload."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def chat_stream_data():
+    """Read the chat fields from a POST body or, for EventSource clients, the query string."""
+    if request.method == "GET":
+        return request.args
+    return request.get_json(silent=True) or {}
+
+
+@api.route("/chat/stream", methods=["GET", "POST"])
+def chat_stream():
+    data = chat_stream_data()
+    user_message = data.get("message")
+    if not user_message:
+        return jsonify({"error": "message is required"}), 400
+    conversation = chat_conversation(data)
+
+    try:
+        stream = gateway.stream(
+            model="gpt-4",
+            messages=chat_prompt(conversation, user_message),
+            temperature=0.7,
+        )
+    except (RateLimitError, LLMBusy) as e:
+        payload, status, headers = llm_unavailable(e)
+        return jsonify(payload), status, headers
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    def generate():
+        tokens = []
+        try:
+            for chunk in stream:
+                token = chunk.choices[0].delta.content if chunk.choices else None
+                if token:
+                    tokens.append(token)
+                    yield sse_event({"token": token})
+            # Only replies that reached the client in full become part of the conversation.
+            if conversation:
+                remember(conversation, user_message, "".join(tokens).strip())
+            yield sse_event({"done": True, **conversation_fields(conversation)}, event="done")
+        except Exception as e:
+            yield sse_event({"error": str(e)}, event="error")
+        finally:
+            # Runs on GeneratorExit too, i.e. when the browser disconnects mid-stream:
+            # closing the upstream response stops OpenAI generating tokens nobody reads.
+            stream.close()
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=SSE_HEADERS)
+
 # ------ SEARCH HOMES ------
-@api.route("/search", methods=["GET"])
-def search_homes():
-    query = request.args.get("q", "").strip()
-    if not query:
-        return jsonify({"results": []})
+# Results are served from `listings` while a location is covered (see app/listings.py).
+# Refreshes are coalesced per location: concurrent misses for one location make one Zillow call.
+search_refresh = SingleFlight()
+async_search_refresh = AsyncSingleFlight()
+# Result pages per normalized query, so repeat searches skip the coverage lookup and the
+# $facet aggregate. Per worker and short-lived: refreshes elsewhere show up within the TTL.
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "60"))
+search_cache = TieredCache("search", maxsize=int(os.getenv("SEARCH_CACHE_SIZE", "1024")), ttl=SEARCH_CACHE_TTL)
 
-    RAPIDAPI_KEY = os.getenv("ZILLOW_API_KEY")
-    if not RAPIDAPI_KEY:
-        return jsonify({"error": "ZILLOW_API_KEY not configured"}), 500
 
-    headers = {
-        "X-RapidAPI-Key": RAPIDAPI_KEY,
-        "X-RapidAPI-Host": "zillow-com1.p.rapidapi.com"
-    }
+def normalize_location(query):
+    """Lowercase and collapse whitespace/commas so equivalent queries share a cache key."""
+    parts = [" ".join(part.split()) for part in query.lower().split(",")]
+    return ", ".join(part for part in parts if part)
+
 
-    url = "https://zillow-com1.p.rapidapi.com/propertyExtendedSearch"
+def zillow_search_request(location, status_type, home_type):
+    """Return (url, headers, params) for Zillow's propertyExtendedSearch."""
     params = {
-        "location": query,
-        "status_type": "ForSale",   # Or "ForRent" if you want rentals
-        "home_type": "Houses"       # Optional: can remove if you want all types
+        "location": location,
+        "status_type": status_type,
+        "home_type": home_type
     }
+    return zillow_url("/propertyExtendedSearch"), zillow_headers(), params
 
-    try:
-        resp = requests.get(url, headers=headers, params=params)
-        data = resp.json()
 
-        import json
-        print("RAW ZILLOW RESPONSE:")
-        print(json.dumps(data, indent=2))
+def parse_search_response(data):
+    """Map a raw propertyExtendedSearch payload to our frontend format."""
+    # Directly get props array
+    items = data.get("props", [])
+    log_event("zillow.search", sample=True, props=len(items))
+    return [parse_property_summary(item) for item in items]
+
+
+def fetch_zillow_search(location, status_type, home_type):
+    url, headers, params = zillow_search_request(location, status_type, home_type)
+    resp = http.get(url, headers=headers, params=params)
+    resp.raise_for_status()
+    return parse_search_response(resp.json())
+
+
+def search_cache_key(args):
+    """Return (key, location, status_type, home_type) for a /search query string."""
+    location = normalize_location(args.get("q", ""))
+    status_type = args.get("status_type", "ForSale")  # Or "ForRent" if you want rentals
+    home_type = args.get("home_type", "Houses")       # Optional: can remove if you want all types
+    return f"{location}|{status_type}|{home_type}", location, status_type, home_type
+
 
+def refresh_listings(location, status_type, home_type):
+    """Fetch a location from Zillow and persist the results into the local listing index."""
+    results = fetch_zillow_search(location, status_type, home_type)
+    save_listings(results, location, status_type, home_type)
+    return results
 
-        # Directly get props array
-        items = data.get("props", [])
-        results = []
 
-        for item in items:
-            results.append({
-                "id": str(item.get("zpid", "")),
-                "title": item.get("address", "").split(",")[0] if item.get("address") else "Unknown",
-                "city": extract_city(item.get("address", "")),
-                "price": item.get("price", 0),
-                "bedrooms": item.get("bedrooms", 0),
-                "bathrooms": item.get("bathrooms", 0),
-                "image": item.get("imgSrc")
-            })
+def search_page_key(key, filters, keywords, limit):
+    """Cache key for one page of results: the location key plus every filter that shapes the page."""
+    words = " ".join((keywords or "").lower().split())
+    return f"{key}|{json.dumps(filters, sort_keys=True)}|{words}|{limit}"
 
-        return jsonify({"results": results})
 
+def search_args(args):
+    """Parse the facet filters, keywords and limit shared by both serving modes."""
+    filters = facet_filters(args)
+    keywords = args.get("keywords", "").strip() or None
+    limit = int(args.get("limit", DEFAULT_RESULTS))
+    return filters, keywords, limit
+
+
+@api.route("/search", methods=["GET"])
+def search_homes():
+    """Search homes from the local listing index, refreshing it from Zillow on miss or staleness.
+
+    Optional filters: min_price, max_price, bedrooms, bathrooms (minimums), city,
+    keywords (full-text, relevance-ranked) and limit.
+    """
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"results": []})
+
+    key, location, status_type, home_type = search_cache_key(request.args)
+    try:
+        filters, keywords, limit = search_args(request.args)
+    except ValueError:
+        return jsonify({"error": "Filters and limit must be numbers"}), 400
+
+    source = "local"
+
+    def load_page():
+        nonlocal source
+        if not is_covered(location, status_type, home_type):
+            if not os.getenv("ZILLOW_API_KEY"):
+                raise RuntimeError("ZILLOW_API_KEY not configured")
+            search_refresh.do(key, lambda: refresh_listings(location, status_type, home_type))
+            source = "upstream"
+        return search_listings(location_match(location, status_type, home_type, filters), keywords, limit)
+
+    try:
+        page = search_cache.get_or_load(search_page_key(key, filters, keywords, limit), load_page)
     except Exception as e:
         traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
+        page = stale_search(location, status_type, home_type, filters, keywords, limit)
+        if not page or not page["results"]:
+            return jsonify({"error": str(e)}), 500
+        source = "stale"
 
-def extract_city(address):
-    """Extract city from Zillow's address string."""
-    try:
-        parts = address.split(",")
-        return parts[1].strip() if len(parts) > 1 else "Unknown"
-    except Exception:
-        return "Unknown"
+    return jsonify({**page, "source": source})
 
-def parse_property_summary(item):
-    """Map Zillow search result to our frontend format."""
-    return {
-        "id": str(item.get("zpid", "")),
-        "title": item.get("address", "").split(",")[0] if item.get("address") else "Unknown",
-        "city": extract_city(item.get("address", "")),
-        "price": item.get("price", 0),
-        "bedrooms": item.get("bedrooms", 0),
-        "bathrooms": item.get("bathrooms", 0),
-        "image": item.get("imgSrc", None)
-    }
 
-def parse_property_detail(data):
-    """Map Zillow single property detail to our frontend format."""
-    return {
-        "id": str(data.get("zpid", "")),
-        "title": data.get("address", "").split(",")[0] if data.get("address") else "Unknown",
-        "city": extract_city(data.get("address", "")),
-        "price": data.get("price", 0),
-        "bedrooms": data.get("bedrooms", 0),
-        "bathrooms": data.get("bathrooms", 0),
-        "image": (data.get("imgSrc") or 
-                  (data.get("photos", [{}])[0].get("url") if data.get("photos") else None))
-    }
+@api.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify(cache_stats())
+
 # ------ FORECAST ------
+def valid_price(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+
+
 @api.route("/forecast/favorites", methods=["GET"])
 def forecast_favorited_homes():
-    user_id = request.args.get("user_id")
+    user_id = caller_id(request.args.get("user_id") or request.args.get("userId"))
     if not user_id:
         return jsonify({"error": "Missing user_id"}), 400
 
-    favorites = list(db["Favorite"].find({"userId": user_id}))
+    # Skip favorites with no stored price
+    favorites = [fav for fav in find_favorites(user_id) if valid_price(fav.get("price"))]
     if not favorites:
         return jsonify({"forecast": []})
 
-    current_year = 2025
-    base_year = list(model["forecast"].values())[0]
-    forecasts = []
-
-    for fav in favorites:
-        base_price = fav.get("price")
-        if base_price is None:
-            # No price, skip this favorite
-            continue
-
-        forecast = []
-        for i in range(1, 6):
-            year = str(current_year + i)
-            if year in model["forecast"]:
-                scale = model["forecast"][year] / base_year
-                min_scale = model["lower"][year] / base_year
-                max_scale = model["upper"][year] / base_year
-
-                forecast.append({
-                    "date": year,
-                    "price": round(base_price * scale, 2),
-                    "min": round(base_price * min_scale, 2),
-                    "max": round(base_price * max_scale, 2),
-                })
-
-        forecasts.append({
-            "home": {
-                "_id": str(fav.get("_id", "")),
-                "title": fav.get("title", "Untitled"),
-                "price": base_price
-            },
-            "forecast": forecast,
-            "confidence": f"{model.get('confidence', 95)}%"
-        })
+    engine = get_forecast_engine()
+    confidence = f"{engine.confidence}%"
+    series = engine.forecast([fav["price"] for fav in favorites], [fav.get("city") for fav in favorites])
+    forecasts = [{
+        "home": {
+            "_id": fav.get("_id"),
+            "zpid": fav.get("zpid"),
+            "title": fav.get("title", "Untitled"),
+            "city": fav.get("city"),
+            "price": fav["price"],
+            "bedrooms": fav.get("bedrooms"),
+            "bathrooms": fav.get("bathrooms"),
+            "image": fav.get("image"),
+            "priceRefreshedAt": fav.get("priceRefreshedAt")
+        },
+        "forecast": forecast,
+        "confidence": confidence
+    } for fav, forecast in zip(favorites, series)]
 
     return jsonify({"forecast": forecasts})
 
@@ -412,89 +717,156 @@ def forecast_home():
 
     if None in (area, bedrooms, bathrooms, price):
         return jsonify({"error": "Missing required home data"}), 400
+    if not valid_price(price):
+        return jsonify({"error": "price must be a positive number"}), 400
+
+    engine = get_forecast_engine()
+    return jsonify({
+        "forecast": engine.forecast_one(price, data.get("city")),
+        "confidence": f"{engine.confidence}%"
+    })
 
-    current_year = 2025
-    base_year = list(model["forecast"].values())[0]
-    forecast = []
 
-    for i in range(1, 6):
-        year = str(current_year + i)
-        if year in model["forecast"]:
-            scale = model["forecast"][year] / base_year
-            min_scale = model["lower"][year] / base_year
-            max_scale = model["upper"][year] / base_year
+@api.route("/forecast/batch", methods=["POST"])
+def forecast_batch():
+    """Forecast many homes in one call: {"homes": [{"price": ..., ...}, ...]}."""
+    data = request.get_json(silent=True)
+    homes = data.get("homes") if isinstance(data, dict) else None
+    if not isinstance(homes, list):
+        return jsonify({"error": "homes must be a list"}), 400
 
-            forecast.append({
-                "date": year,
-                "price": round(price * scale, 2),
-                "min": round(price * min_scale, 2),
-                "max": round(price * max_scale, 2),
-            })
+    invalid = [i for i, home in enumerate(homes) if not isinstance(home, dict) or not valid_price(home.get("price"))]
+    if invalid:
+        return jsonify({"error": "Every home must be an object with a positive price", "invalid": invalid}), 400
 
+    engine = get_forecast_engine()
+    series = engine.forecast([home["price"] for home in homes], [home.get("city") for home in homes])
     return jsonify({
-        "forecast": forecast,
-        "confidence": f"{model.get('confidence', 95)}%"
+        "forecasts": [{"home": home, "forecast": forecast} for home, forecast in zip(homes, series)],
+        "confidence": f"{engine.confidence}%"
     })
 
 
+HOME_PROJECTION = {
+    field: 1 for field in
+    ("title", "address", "city", "price", "bedrooms", "bathrooms", "image", "description", "listedById")
+}
+
+
+def serialize_document(doc):
+    # ObjectId and datetime fields are encoded by the app's JSON provider (app/responses.py).
+    return doc
+
+
 @api.route("/homes", methods=["GET"])
 def get_homes():
-    user_id = request.args.get("user_id")
+    user_id = caller_id(request.args.get("user_id"))
     if not user_id:
         return jsonify({"error": "Missing user_id"}), 400
 
-    homes_cursor = db["Home"].find({"listedById": user_id})
-    homes = []
-    for home in homes_cursor:
-        home["_id"] = str(home["_id"])
-        homes.append(home)
+    return paginated_response("homes", db["Home"], {"listedById": user_id}, HOME_PROJECTION, serialize_document)
+
+
+SIMILAR_DEFAULT = 10
+SIMILAR_MAX = 50
+SIMILAR_PROJECTION = {"_id": 0, "zpid": 1, "title": 1, "city": 1, "price": 1, "bedrooms": 1, "bathrooms": 1, "image": 1}
 
-    return jsonify({"homes": homes})
+
+def find_homes(zpids):
+    """Listing details by zpid from `listings`, falling back to favorites for homes never searched."""
+    homes = {doc["zpid"]: doc for doc in db["listings"].find({"zpid": {"$in": zpids}}, SIMILAR_PROJECTION)}
+    missing = [zpid for zpid in zpids if zpid not in homes]
+    if missing:
+        for doc in db["Favorite"].find({"zpid": {"$in": missing}}, SIMILAR_PROJECTION):
+            homes.setdefault(doc["zpid"], doc)
+    return homes
+
+
+@api.route("/homes/<zpid>/similar", methods=["GET"])
+def similar_homes(zpid):
+    """Homes most like zpid by price, bedrooms, bathrooms and city, from the in-process vector index."""
+    try:
+        k = max(1, min(int(request.args.get("k", SIMILAR_DEFAULT)), SIMILAR_MAX))
+    except ValueError:
+        return jsonify({"error": "k must be a number"}), 400
+
+    zpid = normalize_zpid(zpid)
+    index = get_similar_index()
+    neighbours = index.similar(zpid, k)
+    if neighbours is None:
+        # Known to Mongo but newer than this worker's index (e.g. cached by another worker).
+        home = find_homes([zpid]).get(zpid)
+        if home is None:
+            return jsonify({"error": "Home not found"}), 404
+        index.upsert([home])
+        neighbours = index.similar(zpid, k) or []
+
+    homes = find_homes([other for other, _ in neighbours])
+    similar = [
+        {**homes[other], "id": other, "distance": round(distance, 4)}
+        for other, distance in neighbours if other in homes
+    ]
+    return jsonify({"zpid": zpid, "similar": similar, "approximate": index.approximate})
 
 
 # ------ Favorites ------
 @api.route("/favorites", methods=["POST"])
 def add_favorite():
     data = request.get_json()
-    user_id = data.get("userId")
-    zpid = data.get("zpid")
+    user_id = caller_id(data.get("userId"))
+    zpid = normalize_zpid(data.get("zpid"))
 
     if not user_id or not zpid:
         return jsonify({"error": "userId and zpid are required"}), 400
 
-    # Prevent duplicates
-    existing = db["Favorite"].find_one({"userId": user_id, "zpid": zpid})
-    if existing:
+    # One upsert against the unique (userId, zpid) index; double clicks can't create duplicates.
+    if not store_favorite(user_id, zpid, data):
         return jsonify({"message": "Already favorited"}), 200
-
-    favorite_doc = {
-        "userId": user_id,
-        "zpid": zpid,
-        "title": data.get("title"),
-        "city": data.get("city"),
-        "price": data.get("price"),
-        "bedrooms": data.get("bedrooms"),
-        "bathrooms": data.get("bathrooms"),
-        "image": data.get("image")
-    }
-    db["Favorite"].insert_one(favorite_doc)
+    index_homes([{**data, "zpid": zpid}])
     return jsonify({"message": "Favorite added"}), 201
 
 
+def favorites_batch_args(data, key):
+    """(user_id, items) from a batch body, or an error response."""
+    user_id = caller_id(data.get("userId"))
+    items = data.get(key)
+    if not user_id or not isinstance(items, list):
+        return None, (jsonify({"error": f"userId and a {key} list are required"}), 400)
+    if len(items) > FAVORITES_BATCH_LIMIT:
+        return None, (jsonify({"error": f"At most {FAVORITES_BATCH_LIMIT} {key} per request"}), 400)
+    return (user_id, items), None
+
+
+@api.route("/favorites/batch", methods=["POST"])
+def add_favorites_batch():
+    """Favorite many homes at once (saved searches, imports): {"userId", "favorites": [{"zpid", ...}]}."""
+    args, error = favorites_batch_args(request.get_json() or {}, "favorites")
+    if error:
+        return error
+    added, existing, invalid = add_favorites(*args)
+    index_homes([{**item, "zpid": normalize_zpid(item.get("zpid"))} for item in args[1] if isinstance(item, dict)])
+    return jsonify({"added": added, "existing": existing, "invalid": invalid}), 201 if added else 200
+
+
+@api.route("/favorites/batch", methods=["DELETE"])
+def remove_favorites_batch():
+    """Unfavorite many homes at once: {"userId", "zpids": [...]}."""
+    args, error = favorites_batch_args(request.get_json() or {}, "zpids")
+    if error:
+        return error
+    return jsonify({"removed": remove_favorites(*args)}), 200
+
+
 @api.route("/favorites", methods=["GET"])
 def get_favorites():
-    user_id = request.args.get("userId")
+    user_id = caller_id(request.args.get("userId"))
     if not user_id:
         return jsonify({"error": "userId required"}), 400
 
-    cursor = db["Favorite"].find({"userId": user_id})
-    results = []
-    for fav in cursor:
-        fav["_id"] = str(fav["_id"])
-        results.append(fav)
-
     # Always return 200 with an empty array instead of 404
-    return jsonify({"favorites": results})
+    return paginated_response(
+        "favorites", db["Favorite"], {"userId": user_id}, FAVORITE_PROJECTION, serialize_document
+    )
 
 
 @api.route("/favorites/<fav_id>", methods=["DELETE"])
@@ -506,3 +878,85 @@ def remove_favorite(fav_id):
         return jsonify({"message": "Favorite removed"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
+
+
+# ------ RECENTLY VIEWED ------
+def serialize_view(view):
+    # Buffered views carry aware datetimes, views read back from Mongo naive UTC ones.
+    viewed_at = view["viewedAt"].replace(tzinfo=None).isoformat(timespec="milliseconds") + "Z"
+    return {**view, "viewedAt": viewed_at}
+
+
+@api.route("/recently-viewed", methods=["POST"])
+def add_recently_viewed():
+    """Record a home view; buffered and written in bulk, so it costs no Mongo round-trip here."""
+    data = request.get_json() or {}
+    user_id = caller_id(data.get("userId"))
+    home_id = data.get("homeId") or data.get("zpid")
+    if not user_id or not home_id:
+        return jsonify({"error": "userId and homeId are required"}), 400
+
+    record_view(user_id, home_id, data)
+    return jsonify({"message": "View recorded"}), 202
+
+
+@api.route("/recently-viewed", methods=["GET"])
+def get_recently_viewed():
+    user_id = caller_id(request.args.get("userId"))
+    if not user_id:
+        return jsonify({"error": "userId required"}), 400
+    try:
+        limit = max(1, min(int(request.args.get("limit", VIEW_HISTORY_SIZE)), VIEW_HISTORY_SIZE))
+    except ValueError:
+        return jsonify({"error": "limit must be a number"}), 400
+
+    return jsonify({"views": [serialize_view(view) for view in recent_views(user_id, limit)]})
+
+
+# ------ DASHBOARD ------
+DASHBOARD_LIMIT = int(os.getenv("DASHBOARD_LIMIT", "200"))
+dashboard_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DASHBOARD_WORKERS", "8")), thread_name_prefix="dashboard"
+)
+
+
+def dashboard_forecasts(favorites):
+    """Vectorized forecasts for the priced favorites, keyed by favorite _id."""
+    priced = [fav for fav in favorites if valid_price(fav.get("price"))]
+    if not priced:
+        return [], None
+    engine = get_forecast_engine()
+    series = engine.forecast([fav["price"] for fav in priced], [fav.get("city") for fav in priced])
+    return [{"_id": fav["_id"], "forecast": forecast} for fav, forecast in zip(priced, series)], engine.confidence
+
+
+@api.route("/dashboard", methods=["GET"])
+def dashboard():
+    """Tasks, favorites and favorite forecasts for one user in a single call.
+
+    The task query runs on dashboard_pool while the favorites are read and
+    forecast on the request thread. Like every GET on this blueprint the body
+    gets an ETag (app/responses.py), so an unchanged dashboard is a 304.
+    """
+    user_id = caller_id(request.args.get("user_id") or request.args.get("userId"))
+    if not user_id:
+        return jsonify({"error": "Missing user_id"}), 400
+
+    def load_tasks():
+        cursor = db["Task"].find({"userId": user_id}, TASK_LIST_PROJECTION).sort("_id", 1).limit(DASHBOARD_LIMIT)
+        return [serialize_task_summary(t) for t in cursor]
+
+    # copy_context keeps the query in this request's Mongo accounting (app.metrics).
+    tasks_future = dashboard_pool.submit(contextvars.copy_context().run, load_tasks)
+    favorites = [serialize_document(fav) for fav in find_favorites(user_id, DASHBOARD_LIMIT)]
+    forecasts, confidence = dashboard_forecasts(favorites)
+
+    response = jsonify({
+        "tasks": tasks_future.result(),
+        "favorites": favorites,
+        "forecasts": forecasts,
+        "confidence": f"{confidence}%" if confidence is not None else None,
+    })
+    # Browsers may keep the body but must revalidate it every time.
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,294 @@
+"""Similar-homes recommender over an in-process vector index.
+
+Every home in `listings` and `Favorite` is encoded as a small float32 vector:
+standardized log price, bedrooms and bathrooms, plus a fixed pseudo-random
+embedding of its city so same-city homes sit closer together. Vectors live
+in one contiguous matrix; nearest neighbours are found by squared Euclidean
+distance, computed a chunk of rows at a time. Past SIMILAR_APPROX_MIN_SIZE
+homes a coarse inverted-file index (k-means cells) narrows each query to the
+rows of the SIMILAR_NPROBE nearest cells.
+
+New listings are added incrementally as search results are cached; the whole
+index is rebuilt from Mongo every SIMILAR_REBUILD_INTERVAL seconds, in the
+background, so other workers' additions and price changes catch up.
+"""
+import math
+import os
+import threading
+import time
+import traceback
+import zlib
+
+import numpy as np
+
+from app.db import db
+from app.forecast import region_key
+
+# Below this many homes an exact scan is fast enough; above it queries use the coarse index.
+APPROX_MIN_SIZE = int(os.getenv("SIMILAR_APPROX_MIN_SIZE", "200000"))
+# Coarse cells probed per query: more is slower but closer to the exact answer.
+NPROBE = int(os.getenv("SIMILAR_NPROBE", "8"))
+REBUILD_INTERVAL = float(os.getenv("SIMILAR_REBUILD_INTERVAL", "3600"))
+# Rows per distance block in exact scans, bounding the temporary memory per query.
+CHUNK_ROWS = 1 << 16
+
+# Relative importance of (log price, bedrooms, bathrooms) after standardization.
+FEATURE_WEIGHTS = np.array([2.0, 1.0, 1.0])
+CITY_DIMS = 8
+# Distance between two different cities' embeddings is about CITY_WEIGHT * sqrt(2).
+CITY_WEIGHT = float(os.getenv("SIMILAR_CITY_WEIGHT", "1.5"))
+DIM = len(FEATURE_WEIGHTS) + CITY_DIMS
+
+HOME_FIELDS = {"_id": 0, "zpid": 1, "price": 1, "bedrooms": 1, "bathrooms": 1, "city": 1}
+
+
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else 0.0
+
+
+def usable(doc):
+    price = doc.get("price")
+    return bool(doc.get("zpid")) and isinstance(price, (int, float)) and not isinstance(price, bool) and price > 0
+
+
+class HomeEncoder:
+    """Maps home documents to feature vectors, with scaling fixed when the index is built."""
+
+    def __init__(self, docs):
+        raw = self._raw(docs)
+        self.mean = raw.mean(axis=0) if len(raw) else np.zeros(len(FEATURE_WEIGHTS))
+        std = raw.std(axis=0) if len(raw) else np.ones(len(FEATURE_WEIGHTS))
+        self.scale = FEATURE_WEIGHTS / np.maximum(std, 1e-6)
+        self._cities = {}
+
+    @staticmethod
+    def _raw(docs):
+        return np.array(
+            [(math.log1p(_number(d.get("price"))), _number(d.get("bedrooms")), _number(d.get("bathrooms")))
+             for d in docs],
+            dtype=np.float64,
+        ).reshape(-1, len(FEATURE_WEIGHTS))
+
+    def city_vector(self, city):
+        key = region_key(city)
+        vector = self._cities.get(key)
+        if vector is None:
+            if key:
+                rng = np.random.default_rng(zlib.crc32(key.encode()))
+                vector = rng.standard_normal(CITY_DIMS)
+                vector *= CITY_WEIGHT / np.linalg.norm(vector)
+            else:
+                vector = np.zeros(CITY_DIMS)
+            self._cities[key] = vector
+        return vector
+
+    def encode(self, docs):
+        vectors = np.empty((len(docs), DIM), dtype=np.float32)
+        vectors[:, :len(FEATURE_WEIGHTS)] = (self._raw(docs) - self.mean) * self.scale
+        for i, doc in enumerate(docs):
+            vectors[i, len(FEATURE_WEIGHTS):] = self.city_vector(doc.get("city"))
+        return vectors
+
+
+def top_k(distances, k):
+    """Indexes of the k smallest distances, nearest first."""
+    k = min(k, len(distances))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    nearest = np.argpartition(distances, k - 1)[:k]
+    return nearest[np.argsort(distances[nearest], kind="stable")]
+
+
+class CoarseIndex:
+    """Inverted-file index: k-means cells over the vectors, each listing its member rows."""
+
+    def __init__(self, vectors, cells=None, iterations=8, sample=65536, seed=0):
+        rng = np.random.default_rng(seed)
+        cells = cells or max(1, int(math.sqrt(len(vectors))))
+        train = vectors[rng.choice(len(vectors), min(len(vectors), sample), replace=False)]
+        self.centroids = train[rng.choice(len(train), cells, replace=False)].copy()
+        for _ in range(iterations):
+            labels = self.assign(train)
+            counts = np.bincount(labels, minlength=cells)
+            sums = np.zeros_like(self.centroids, dtype=np.float64)
+            np.add.at(sums, labels, train)
+            filled = counts > 0
+            self.centroids[filled] = (sums[filled] / counts[filled, None]).astype(np.float32)
+        self.centroid_norms = (self.centroids ** 2).sum(axis=1)
+
+        self.labels = []
+        self._members = [[] for _ in range(cells)]
+        self._arrays = {}
+        self.add(0, vectors)
+
+    def assign(self, vectors):
+        """Nearest cell of every vector, a chunk at a time."""
+        norms = (self.centroids ** 2).sum(axis=1)
+        labels = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), CHUNK_ROWS // 16):
+            block = vectors[start:start + CHUNK_ROWS // 16]
+            labels[start:start + len(block)] = np.argmin(norms - 2 * block @ self.centroids.T, axis=1)
+        return labels
+
+    def add(self, first_row, vectors):
+        """Register rows first_row.. (new rows, or replacements of existing ones)."""
+        for row, label in enumerate(self.assign(vectors).tolist(), first_row):
+            if row < len(self.labels):
+                old = self.labels[row]
+                if old == label:
+                    continue
+                self._members[old].remove(row)
+                self._arrays.pop(old, None)
+                self.labels[row] = label
+            else:
+                self.labels.append(label)
+            self._members[label].append(row)
+            self._arrays.pop(label, None)
+
+    def candidates(self, query, nprobe):
+        """Rows in the nprobe cells nearest the query."""
+        cells = top_k(self.centroid_norms - 2 * self.centroids @ query, nprobe)
+        arrays = []
+        for cell in cells.tolist():
+            members = self._arrays.get(cell)
+            if members is None:
+                members = self._arrays[cell] = np.array(self._members[cell], dtype=np.intp)
+            arrays.append(members)
+        return np.concatenate(arrays) if arrays else np.empty(0, dtype=np.intp)
+
+
+class SimilarHomesIndex:
+    """Contiguous float32 vectors keyed by zpid, with exact or coarse-index k-NN queries."""
+
+    def __init__(self, docs, approx_min_size=APPROX_MIN_SIZE, nprobe=NPROBE):
+        docs = list({str(d["zpid"]): d for d in docs if usable(d)}.values())
+        self.encoder = HomeEncoder(docs)
+        self.nprobe = nprobe
+        self.zpids = [str(d["zpid"]) for d in docs]
+        self.rows = {zpid: row for row, zpid in enumerate(self.zpids)}
+        self.size = len(docs)
+        self.vectors = np.empty((max(1024, self.size), DIM), dtype=np.float32)
+        self.vectors[:self.size] = self.encoder.encode(docs)
+        self.norms = np.empty(len(self.vectors), dtype=np.float32)
+        self.norms[:self.size] = (self.vectors[:self.size] ** 2).sum(axis=1)
+        self.coarse = CoarseIndex(self.vectors[:self.size]) if self.size >= approx_min_size else None
+        self.built_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def approximate(self):
+        return self.coarse is not None
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, zpid):
+        return str(zpid) in self.rows
+
+    def upsert(self, docs):
+        """Add new homes and re-encode known ones (e.g. after a price change)."""
+        docs = list({str(d["zpid"]): d for d in docs if usable(d)}.values())
+        if not docs:
+            return
+        vectors = self.encoder.encode(docs)
+        with self._lock:
+            new = [i for i, d in enumerate(docs) if str(d["zpid"]) not in self.rows]
+            if self.size + len(new) > len(self.vectors):
+                # Grow geometrically; queries already running keep the old arrays.
+                capacity = max(2 * len(self.vectors), self.size + len(new))
+                grown = np.empty((capacity, DIM), dtype=np.float32)
+                grown[:self.size] = self.vectors[:self.size]
+                norms = np.empty(capacity, dtype=np.float32)
+                norms[:self.size] = self.norms[:self.size]
+                self.vectors, self.norms = grown, norms
+            for i, doc in enumerate(docs):
+                zpid = str(doc["zpid"])
+                row = self.rows.get(zpid)
+                if row is None:
+                    row = self.rows[zpid] = self.size
+                    self.zpids.append(zpid)
+                    self.size += 1
+                self.vectors[row] = vectors[i]
+                self.norms[row] = vectors[i] @ vectors[i]
+                if self.coarse is not None:
+                    self.coarse.add(row, vectors[i:i + 1])
+
+    def _exact(self, query, k, vectors, norms, size):
+        best_rows, best = np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        for start in range(0, size, CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, size)
+            distances = norms[start:stop] - 2 * (vectors[start:stop] @ query)
+            nearest = top_k(distances, k)
+            best_rows = np.concatenate([best_rows, nearest + start])
+            best = np.concatenate([best, distances[nearest]])
+            keep = top_k(best, k)
+            best_rows, best = best_rows[keep], best[keep]
+        return best_rows, best
+
+    def nearest(self, query, k=10, exclude=None):
+        """[(zpid, distance)] of the k homes closest to a query vector, nearest first."""
+        k_query = k + (1 if exclude is not None else 0)
+        with self._lock:
+            # Upserts may swap in grown arrays; work on the ones current right now.
+            vectors, norms, size = self.vectors, self.norms, self.size
+            candidates = self.coarse.candidates(query, self.nprobe) if self.coarse is not None else None
+        if candidates is not None:
+            distances = norms[candidates] - 2 * (vectors[candidates] @ query)
+            nearest = top_k(distances, k_query)
+            rows, distances = candidates[nearest], distances[nearest]
+        else:
+            rows, distances = self._exact(query, k_query, vectors, norms, size)
+        distances = np.sqrt(np.maximum(distances + query @ query, 0))
+        return [(self.zpids[row], float(d)) for row, d in zip(rows.tolist(), distances.tolist())
+                if row != exclude][:k]
+
+    def similar(self, zpid, k=10):
+        """The k homes most like zpid (excluding itself), or None if zpid isn't indexed."""
+        row = self.rows.get(str(zpid))
+        if row is None:
+            return None
+        return self.nearest(self.vectors[row].copy(), k, exclude=row)
+
+
+def load_homes():
+    """Every priced home in listings and favorites; listings win when both have a zpid."""
+    homes = {str(d["zpid"]): d for d in db["Favorite"].find({"price": {"$gt": 0}}, HOME_FIELDS) if d.get("zpid")}
+    homes.update((str(d["zpid"]), d) for d in db["listings"].find({"price": {"$gt": 0}}, HOME_FIELDS) if d.get("zpid"))
+    return list(homes.values())
+
+
+_index = None
+_lock = threading.Lock()
+_rebuilding = False
+
+
+def _rebuild():
+    global _index, _rebuilding
+    try:
+        _index = SimilarHomesIndex(load_homes())
+    except Exception:
+        # Keep serving the previous index.
+        traceback.print_exc()
+    finally:
+        _rebuilding = False
+
+
+def get_similar_index():
+    """The process-wide index: built on first use, rebuilt in the background once it's stale."""
+    global _index, _rebuilding
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = SimilarHomesIndex(load_homes())
+    elif time.monotonic() - _index.built_at > REBUILD_INTERVAL and not _rebuilding:
+        with _lock:
+            if not _rebuilding:
+                _rebuilding = True
+                threading.Thread(target=_rebuild, name="similar-homes-rebuild", daemon=True).start()
+    return _index
+
+
+def index_homes(docs):
+    """Add freshly cached listings to the index, if this process has built one."""
+    if _index is not None:
+        _index.upsert(docs)
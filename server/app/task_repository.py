@@ -0,0 +1,99 @@
+import os
+
+from bson.objectid import ObjectId
+from pymongo import DeleteMany, InsertOne
+from pymongo.errors import OperationFailure
+
+from app.db import db, get_async_db, get_client
+
+# Mongo error code for "Transaction numbers are only allowed on a replica set member or mongos".
+ILLEGAL_OPERATION = 20
+
+# Users per replace_many transaction: bounded so a large batch stays within Mongo's
+# transaction size and time limits, and a failure only loses its own chunk.
+WRITE_CHUNK_USERS = int(os.getenv("TASK_WRITE_CHUNK_USERS", "50"))
+
+# None = probe on first write; MONGO_TRANSACTIONS=0 skips transactions entirely.
+_transactions_supported = None if os.getenv("MONGO_TRANSACTIONS", "1") == "1" else False
+
+
+def _bulk_write(ops):
+    """Run ops as one ordered bulk_write, inside a transaction when the deployment allows it."""
+    global _transactions_supported
+    collection = db["Task"]
+
+    if _transactions_supported is not False:
+        try:
+            with get_client().start_session() as session:
+                session.with_transaction(lambda s: collection.bulk_write(ops, ordered=True, session=s))
+            _transactions_supported = True
+            return
+        except OperationFailure as e:
+            if e.code != ILLEGAL_OPERATION:
+                raise
+            # Standalone mongod (e.g. local development): fall back to a plain ordered bulk.
+            _transactions_supported = False
+
+    collection.bulk_write(ops, ordered=True)
+
+
+def _replace_ops(plans):
+    ops = []
+    for user_id, docs in plans.items():
+        ops.append(DeleteMany({"userId": user_id}))
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+            ops.append(InsertOne(doc))
+    return ops
+
+
+def replace_many(plans):
+    """Replace the task sets of several users, WRITE_CHUNK_USERS users per round-trip.
+
+    plans maps user_id -> list of task documents. Each document gets its _id
+    assigned client-side, so the inserted IDs are known without a read-back.
+    Each chunk commits on its own, and a user's delete and inserts always
+    share one. Returns {user_id: error message} for the users whose chunk
+    failed and were removed from plans; everyone left in plans is stored.
+    """
+    failed = {}
+    user_ids = list(plans)
+    for start in range(0, len(user_ids), WRITE_CHUNK_USERS):
+        chunk = {user_id: plans[user_id] for user_id in user_ids[start:start + WRITE_CHUNK_USERS]}
+        try:
+            _bulk_write(_replace_ops(chunk))
+        except Exception as e:
+            failed.update(dict.fromkeys(chunk, str(e)))
+    for user_id in failed:
+        del plans[user_id]
+    return failed
+
+
+def replace_tasks(user_id, docs):
+    """Atomically replace one user's tasks; returns the stored documents."""
+    _bulk_write(_replace_ops({user_id: docs}))
+    return docs
+
+
+async def replace_tasks_async(user_id, docs):
+    """replace_tasks for the async serving mode."""
+    global _transactions_supported
+    ops = _replace_ops({user_id: docs})
+    collection = get_async_db()["Task"]
+
+    if _transactions_supported is not False:
+        try:
+            async with collection.database.client.start_session() as session:
+                async def write(s):
+                    await collection.bulk_write(ops, ordered=True, session=s)
+
+                await session.with_transaction(write)
+            _transactions_supported = True
+            return docs
+        except OperationFailure as e:
+            if e.code != ILLEGAL_OPERATION:
+                raise
+            _transactions_supported = False
+
+    await collection.bulk_write(ops, ordered=True)
+    return docs
@@ -1,68 +1,244 @@
+import argparse
+import hashlib
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
 import pandas as pd
 from statsmodels.tsa.arima.model import ARIMA
-from joblib import dump
+from joblib import dump, load
 import numpy as np
 
+try:
+    from app.model_artifact import ModelArtifact
+except ImportError:  # run as `python train_model.py` from app/
+    from model_artifact import ModelArtifact
+
 # Constants
 DATASET_ID = "prevek18/ames-housing-dataset"
 MODEL_FILENAME = "house_price_model.joblib"
+ARTIFACT_VERSION = 2
+ARIMA_ORDER = (1, 1, 1)
+FUTURE_YEARS = 20
+# Groups with fewer distinct sale years than this fall back to the national curve.
+MIN_YEARS = 4
+# Regions are keyed like forecast.region_key(city), the only key the API looks up.
+REGION_COLUMN = "City"
+# The Ames dataset has no city column: every sale is in Ames.
+DEFAULT_CITY = "Ames"
+CACHE_DIR = ".train_cache"
+
 
 def download_dataset():
     import kagglehub
     dataset_path = kagglehub.dataset_download(DATASET_ID)
     return os.path.join(dataset_path, "AmesHousing.csv")
 
-def load_data(filepath):
+
+def load_data(filepath, region_column=REGION_COLUMN):
     df = pd.read_csv(filepath)
     df = df.loc[:, ~df.columns.str.contains('#NAME?', case=False, na=False)]
-    df = df[["Yr Sold", "SalePrice"]].dropna()
-    df.columns = ["year", "price"]
+    if region_column not in df.columns:
+        df[region_column] = DEFAULT_CITY
+    columns = {"Yr Sold": "year", "SalePrice": "price", region_column: "region"}
+    df = df[list(columns)].dropna()
+    df.columns = list(columns.values())
     return df
 
-def train_arima(df):
-    yearly = df.groupby("year")["price"].mean()
 
+def load_data_cached(filepath, region_column=REGION_COLUMN):
+    """load_data, with the parsed frame cached as Parquet (or Feather) next to the model.
+
+    The cache is keyed on the CSV's size and mtime plus the selected columns, so
+    reruns skip CSV parsing until the dataset actually changes.
+    """
+    stat = os.stat(filepath)
+    key = hashlib.sha1(
+        f"{os.path.abspath(filepath)}|{stat.st_size}|{stat.st_mtime_ns}|{region_column}".encode()
+    ).hexdigest()[:16]
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    try:
+        import pyarrow  # noqa: F401  (pandas' Parquet/Feather engine)
+        path, read, write = os.path.join(CACHE_DIR, f"{key}.parquet"), pd.read_parquet, "to_parquet"
+    except ImportError:
+        print("pyarrow not installed; caching parsed data as pickle instead of Parquet.")
+        path, read, write = os.path.join(CACHE_DIR, f"{key}.pkl"), pd.read_pickle, "to_pickle"
+
+    if os.path.exists(path):
+        print(f"Using cached parsed dataset {path}")
+        return read(path)
+
+    df = load_data(filepath, region_column)
+    getattr(df, write)(path)
+    return df
+
+
+def fit_series(yearly, last_year=None):
+    """Fit ARIMA on a smoothed, log-transformed yearly mean price series and forecast FUTURE_YEARS.
+
+    The forecast covers the FUTURE_YEARS after last_year (default: the series' own
+    last year), so a region with no sales in the final year still lines up with
+    the national curve.
+    """
+    last_year = int(last_year or yearly.index.max())
+    steps = last_year - int(yearly.index.max()) + FUTURE_YEARS
     smoothed = yearly.ewm(span=3).mean()
     log_prices = np.log(smoothed)
 
-    print("Smoothed log-transformed average prices:")
-    print(log_prices)
-
     # Fit ARIMA on smoothed log prices
-    model = ARIMA(log_prices, order=(1, 1, 1))
+    model = ARIMA(log_prices.reset_index(drop=True), order=ARIMA_ORDER)
     fitted_model = model.fit()
 
-    # Forecast 20 years
-    FUTURE_YEARS = 20
-    forecast_log = fitted_model.get_forecast(steps=FUTURE_YEARS)
-    forecast_values = forecast_log.predicted_mean
-    conf_int = forecast_log.conf_int()
+    forecast_log = fitted_model.get_forecast(steps=steps)
+    forecast_values = forecast_log.predicted_mean.iloc[-FUTURE_YEARS:]
+    conf_int = forecast_log.conf_int().iloc[-FUTURE_YEARS:]
 
     future = np.exp(forecast_values)
     lower = np.exp(conf_int.iloc[:, 0])
     upper = np.exp(conf_int.iloc[:, 1])
 
-    future_years = list(range(yearly.index.max() + 1, yearly.index.max() + 1 + FUTURE_YEARS))
+    future_years = list(range(last_year + 1, last_year + 1 + FUTURE_YEARS))
 
-    forecast_dict = {
-        "forecast": {str(y): round(p, 2) for y, p in zip(future_years, future)},
-        "lower": {str(y): round(p, 2) for y, p in zip(future_years, lower)},
-        "upper": {str(y): round(p, 2) for y, p in zip(future_years, upper)},
-        "confidence": 95
+    return {
+        "forecast": {str(y): round(float(p), 2) for y, p in zip(future_years, future)},
+        "lower": {str(y): round(float(p), 2) for y, p in zip(future_years, lower)},
+        "upper": {str(y): round(float(p), 2) for y, p in zip(future_years, upper)},
     }
 
-    print("Forecast with Smoothing + Confidence Interval:")
-    print(forecast_dict)
 
+def train_arima(df):
+    yearly = df.groupby("year")["price"].mean()
+
+    print("Average sale price per year:")
+    print(yearly)
+
+    forecast_dict = fit_series(yearly)
+    forecast_dict["confidence"] = 95
     return forecast_dict
 
+
+def group_key(region):
+    """Same normalisation as forecast.region_key, so a listing's city finds its curve."""
+    return str(region).strip().lower()
+
+
+def yearly_by_group(df):
+    """Return {group key: yearly mean price Series} for every group with enough history."""
+    groups = {}
+    for region, group in df.groupby("region"):
+        yearly = group.groupby("year")["price"].mean()
+        if len(yearly) >= MIN_YEARS:
+            groups[group_key(region)] = yearly
+    return groups
+
+
+def fingerprint(yearly, last_year):
+    """Identify a group's input so unchanged groups are not refit."""
+    payload = json.dumps({
+        "years": [int(y) for y in yearly.index],
+        "prices": [round(float(p), 4) for p in yearly.values],
+        "last_year": int(last_year),
+        "order": ARIMA_ORDER,
+        "future_years": FUTURE_YEARS,
+    })
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _fit_group(item):
+    key, yearly, last_year = item
+    try:
+        return key, fit_series(yearly, last_year), None
+    except Exception as e:  # a degenerate series must not sink the whole run
+        return key, None, str(e)
+
+
+def fit_groups(groups, workers, last_year):
+    """Fit every group in a process pool; returns {key: forecast dict}."""
+    results = {}
+    items = [(key, yearly, last_year) for key, yearly in groups.items()]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for key, forecast, error in pool.map(_fit_group, items, chunksize=4):
+            if error:
+                print(f" Skipping {key}: {error}")
+            else:
+                results[key] = forecast
+    return results
+
+
+def load_previous(path):
+    try:
+        previous = load(path)
+    except (FileNotFoundError, EOFError):
+        return {}
+    return previous if previous.get("version") == ARTIFACT_VERSION else {}
+
+
+def train_regions(df, previous, workers, force=False):
+    """Fit per-region models, reusing previous fits whose input fingerprint is unchanged."""
+    groups = yearly_by_group(df)
+    last_year = int(df["year"].max())
+    fingerprints = {key: fingerprint(yearly, last_year) for key, yearly in groups.items()}
+    old_regions = previous.get("regions", {})
+    old_fingerprints = previous.get("fingerprints", {})
+
+    stale = {
+        key: yearly for key, yearly in groups.items()
+        if force or key not in old_regions or old_fingerprints.get(key) != fingerprints[key]
+    }
+    print(f"{len(groups)} groups, {len(stale)} to refit, {len(groups) - len(stale)} unchanged")
+
+    regions = {key: old_regions[key] for key in groups if key not in stale}
+    regions.update(fit_groups(stale, workers, last_year))
+    return regions, {key: fingerprints[key] for key in regions}
+
+
+def benchmark_cores(df, core_counts):
+    """Report wall-clock for a full refit of every group at each worker count."""
+    groups = yearly_by_group(df)
+    print(f"Full refit of {len(groups)} groups:")
+    baseline = None
+    for workers in core_counts:
+        start = time.perf_counter()
+        fit_groups(groups, workers, int(df["year"].max()))
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"  {workers:>3} workers  {elapsed:8.2f} s  speedup {baseline / elapsed:5.2f}x")
+
+
 def main():
-    path = download_dataset()
-    df = load_data(path)
+    parser = argparse.ArgumentParser(description="Train the house price forecast model.")
+    parser.add_argument("--csv", help="use a local AmesHousing.csv instead of downloading it")
+    parser.add_argument("--output", default=MODEL_FILENAME)
+    parser.add_argument("--region-column", default=REGION_COLUMN)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--force", action="store_true", help="refit every group, ignoring fingerprints")
+    parser.add_argument("--bench-cores", type=int, nargs="+", help="time a full refit at these worker counts")
+    args = parser.parse_args()
+
+    path = args.csv or download_dataset()
+    df = load_data_cached(path, args.region_column)
+
+    if args.bench_cores:
+        benchmark_cores(df, args.bench_cores)
+        return
+
+    start = time.perf_counter()
     forecast_dict = train_arima(df)
-    dump(forecast_dict, MODEL_FILENAME)
-    print(f"Forecast saved to {MODEL_FILENAME}")
+    regions, fingerprints = train_regions(df, load_previous(args.output), args.workers, args.force)
+
+    forecast_dict.update({
+        "version": ARTIFACT_VERSION,
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "grouping": [args.region_column],
+        "regions": regions,
+        "fingerprints": fingerprints,
+    })
+    dump(forecast_dict, args.output)
+    # Serving workers memory-map this file and pick it up without a restart.
+    ModelArtifact.from_dict(forecast_dict).save(os.path.splitext(args.output)[0] + ".hpm")
+    print(f"Forecast with {len(regions)} regions saved to {args.output} in {time.perf_counter() - start:.1f}s")
 
 if __name__ == "__main__":
     main()
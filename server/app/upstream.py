@@ -0,0 +1,144 @@
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.metrics import ASYNC_HTTPX_HOOKS, HTTPX_HOOKS, observe_upstream
+
+# Outbound HTTP settings, shared by every upstream (Zillow, OpenAI, ...).
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "20"))
+POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "32"))
+MAX_CONCURRENCY_PER_HOST = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "16"))
+MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+RETRY_BACKOFF = float(os.getenv("UPSTREAM_RETRY_BACKOFF", "0.25"))
+QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "10"))
+# LLM completions legitimately take much longer than a Zillow lookup.
+OPENAI_READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", "60"))
+# The async serving mode multiplexes many requests per process, so it gets a larger pool.
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_UPSTREAM_MAX_CONNECTIONS", "256"))
+
+RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class UpstreamBusy(Exception):
+    """Raised when a host's concurrency cap stays saturated past QUEUE_TIMEOUT."""
+
+
+class UpstreamClient:
+    """Keep-alive HTTP client with per-host pools, timeouts, retries and a concurrency cap."""
+
+    def __init__(
+        self,
+        pool_size=POOL_SIZE,
+        max_concurrency=MAX_CONCURRENCY_PER_HOST,
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+        max_retries=MAX_RETRIES,
+        backoff=RETRY_BACKOFF,
+    ):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self._host_limits = {}
+        self._lock = threading.Lock()
+        self._new_session()
+
+    def _new_session(self):
+        self.session = requests.Session()
+        # Retries are handled below so they can share the jittered backoff.
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=self.pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._pid = os.getpid()
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            limit = self._host_limits.get(host)
+            if limit is None:
+                limit = self._host_limits[host] = threading.BoundedSemaphore(self.max_concurrency)
+            return limit
+
+    def _sleep_before_retry(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = min(float(retry_after), READ_TIMEOUT)
+        else:
+            # Exponential backoff with full jitter.
+            delay = random.uniform(0, self.backoff * (2 ** attempt))
+        time.sleep(delay)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        if self._pid != os.getpid():
+            # Forked (e.g. a pre-fork server worker): the parent's pooled sockets aren't ours.
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._new_session()
+        retryable = method.upper() in IDEMPOTENT_METHODS
+        limit = self._host_limit(url)
+        if not limit.acquire(timeout=QUEUE_TIMEOUT):
+            raise UpstreamBusy(f"Too many concurrent requests to {urlsplit(url).netloc}")
+        try:
+            attempt = 0
+            host = urlsplit(url).netloc
+            while True:
+                start = time.perf_counter()
+                try:
+                    resp = self.session.request(method, url, **kwargs)
+                except (requests.ConnectionError, requests.Timeout):
+                    observe_upstream(host, "error", time.perf_counter() - start)
+                    if not retryable or attempt >= self.max_retries:
+                        raise
+                    self._sleep_before_retry(attempt)
+                else:
+                    observe_upstream(host, resp.status_code, time.perf_counter() - start)
+                    if resp.status_code not in RETRY_STATUSES or not retryable or attempt >= self.max_retries:
+                        return resp
+                    self._sleep_before_retry(attempt, resp)
+                    resp.close()
+                attempt += 1
+        finally:
+            limit.release()
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+
+def openai_http_client():
+    """Pooled httpx client for the OpenAI SDK, sharing the same timeouts and caps."""
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=MAX_CONCURRENCY_PER_HOST,
+            max_keepalive_connections=MAX_CONCURRENCY_PER_HOST,
+        ),
+        timeout=httpx.Timeout(OPENAI_READ_TIMEOUT, connect=CONNECT_TIMEOUT, pool=QUEUE_TIMEOUT),
+        event_hooks=HTTPX_HOOKS,
+    )
+
+
+def async_http_client(read_timeout=READ_TIMEOUT):
+    """Pooled httpx.AsyncClient for the async serving mode."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=ASYNC_MAX_CONNECTIONS,
+            max_keepalive_connections=ASYNC_MAX_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(read_timeout, connect=CONNECT_TIMEOUT, pool=QUEUE_TIMEOUT),
+        transport=httpx.AsyncHTTPTransport(retries=MAX_RETRIES),
+        event_hooks=ASYNC_HTTPX_HOOKS,
+    )
+
+
+http = UpstreamClient()
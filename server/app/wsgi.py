@@ -0,0 +1,7 @@
+"""WSGI entry point for production servers: gunicorn -c gunicorn.conf.py (from server/)."""
+from app import create_app
+from app.prefork import preload
+
+# Background workers are started per worker process by the server's post-fork hook.
+application = create_app(background=False)
+preload()
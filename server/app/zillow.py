@@ -0,0 +1,55 @@
+import os
+
+from app.upstream import http
+
+
+def zillow_url(path):
+    return os.getenv("ZILLOW_API_URL", "https://zillow-com1.p.rapidapi.com") + path
+
+
+def zillow_headers():
+    return {
+        "X-RapidAPI-Key": os.getenv("ZILLOW_API_KEY"),
+        "X-RapidAPI-Host": "zillow-com1.p.rapidapi.com"
+    }
+
+
+def extract_city(address):
+    """Extract city from Zillow's address string."""
+    try:
+        parts = address.split(",")
+        return parts[1].strip() if len(parts) > 1 else "Unknown"
+    except Exception:
+        return "Unknown"
+
+def parse_property_summary(item):
+    """Map Zillow search result to our frontend format."""
+    return {
+        "id": str(item.get("zpid", "")),
+        "title": item.get("address", "").split(",")[0] if item.get("address") else "Unknown",
+        "city": extract_city(item.get("address", "")),
+        "price": item.get("price", 0),
+        "bedrooms": item.get("bedrooms", 0),
+        "bathrooms": item.get("bathrooms", 0),
+        "image": item.get("imgSrc", None)
+    }
+
+def parse_property_detail(data):
+    """Map Zillow single property detail to our frontend format."""
+    return {
+        "id": str(data.get("zpid", "")),
+        "title": data.get("address", "").split(",")[0] if data.get("address") else "Unknown",
+        "city": extract_city(data.get("address", "")),
+        "price": data.get("price", 0),
+        "bedrooms": data.get("bedrooms", 0),
+        "bathrooms": data.get("bathrooms", 0),
+        "image": (data.get("imgSrc") or
+                  (data.get("photos", [{}])[0].get("url") if data.get("photos") else None))
+    }
+
+
+def fetch_property(zpid):
+    """Fetch one property's current details from Zillow's /property endpoint."""
+    resp = http.get(zillow_url("/property"), headers=zillow_headers(), params={"zpid": zpid})
+    resp.raise_for_status()
+    return parse_property_detail(resp.json())
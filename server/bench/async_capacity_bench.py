@@ -0,0 +1,106 @@
+"""Compare concurrent-user capacity of the sync (Flask) and async (ASGI) serving modes.
+
+Both modes are pointed at the local stub upstream from bench/stubs.py, which
+sleeps --latency seconds per call to imitate Zillow/OpenAI.
+
+    python -m bench.async_capacity_bench --latency 0.5 --users 10 50 200
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from bench.stubs import start_stub_server
+
+SYNC_PORT = 5061
+ASYNC_PORT = 5062
+
+
+def start_sync_server():
+    from werkzeug.serving import make_server
+
+    from app import create_app
+
+    server = make_server("127.0.0.1", SYNC_PORT, create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown
+
+
+def start_async_server():
+    import uvicorn
+
+    from app.asgi import create_asgi_app
+
+    server = uvicorn.Server(uvicorn.Config(create_asgi_app(), port=ASYNC_PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def stop():
+        server.should_exit = True
+
+    return stop
+
+
+def drive(port, endpoint, users, requests_per_user):
+    session = requests.Session()
+    latencies, errors = [], 0
+
+    def one(i):
+        nonlocal errors
+        start = time.perf_counter()
+        if endpoint == "chat":
+            resp = session.post(f"http://127.0.0.1:{port}/api/chat", json={"message": f"question {i}"})
+        else:
+            # A unique location per request so the search cache never hides the upstream call.
+            resp = session.get(f"http://127.0.0.1:{port}/api/search", params={"q": f"city {i}"})
+        latencies.append(time.perf_counter() - start)
+        if resp.status_code != 200:
+            errors += 1
+
+    total = users * requests_per_user
+    start = time.perf_counter()
+    with ThreadPoolExecutor(users) as pool:
+        list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    return total / elapsed, np.percentile(ms, 50), np.percentile(ms, 99), errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.5, help="stub upstream latency in seconds")
+    parser.add_argument("--users", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--requests-per-user", type=int, default=3)
+    parser.add_argument("--endpoint", choices=["search", "chat"], default="search")
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub_server(latency=args.latency)
+    os.environ.update({
+        "ZILLOW_API_KEY": os.getenv("ZILLOW_API_KEY", "bench"),
+        "ZILLOW_API_URL": stub_url,
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "bench"),
+        "OPENAI_BASE_URL": stub_url + "/v1",
+    })
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    stops = [start_sync_server(), start_async_server()]
+    try:
+        print(f"{'mode':<6} {'users':>6} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for users in args.users:
+            for mode, port in (("sync", SYNC_PORT), ("async", ASYNC_PORT)):
+                rps, p50, p99, errors = drive(port, args.endpoint, users, args.requests_per_user)
+                print(f"{mode:<6} {users:>6} {rps:>8.1f} {p50:>9.1f} {p99:>9.1f} {errors:>7}")
+    finally:
+        for stop in stops:
+            stop()
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Per-request cost of resolving the caller: signed-token verification and the user LRU.
+
+    python -m bench.auth_bench --iterations 100000
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("AUTH_SECRET_KEY", "bench-secret")
+
+from bson.objectid import ObjectId
+
+from app import auth
+
+
+def per_call_us(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    user_id = str(ObjectId())
+    token = auth.issue_token(user_id)
+    header = f"Bearer {token}"
+    auth.user_cache.set(user_id, {"id": user_id, "name": "Bench", "email": "bench@example.com"})
+
+    def resolve():
+        auth.load_user(auth.user_id_from_header(header))
+
+    print(f"token length {len(token)} bytes")
+    for label, fn in [
+        ("issue_token", lambda: auth.issue_token(user_id)),
+        ("verify_token", lambda: auth.verify_token(token)),
+        ("user_id_from_header", lambda: auth.user_id_from_header(header)),
+        ("load_user (LRU hit)", lambda: auth.load_user(user_id)),
+        ("header -> user record", resolve),
+    ]:
+        print(f"{label:<24} {per_call_us(fn, args.iterations):8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
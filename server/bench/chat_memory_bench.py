@@ -0,0 +1,105 @@
+"""Prompt tokens per chat turn: resending the whole history vs. the compacted conversation memory.
+
+Drives /api/chat for one signed-in user against the local OpenAI stand-in and
+mongomock, and measures the prompts the stand-in actually receives:
+
+    python -m bench.chat_memory_bench --turns 60
+
+"cached prefix" is how much of each prompt repeats the previous turn's prompt
+byte for byte, i.e. what upstream prompt caching can reuse. Summarization
+calls are counted too, since they are the price of the bounded prompt.
+"""
+import argparse
+import os
+import random
+import time
+
+from bench.load_test import use_mongomock
+from bench.stubs import start_stub_server
+
+QUESTIONS = [
+    "What should I budget for closing costs on a {n}00k house in Detroit?",
+    "We have about {n}0k saved. Is that enough for a 10% down payment, and what about PMI?",
+    "Compare a 15-year and a 30-year mortgage at 6.{n}% for us; we care most about monthly payments.",
+    "My credit score is 7{n}0. Which loan programs should I look at and what rates are realistic?",
+    "Is it worth paying for an inspection on a newer build? The house is {n} years old.",
+]
+
+
+def cached_prefix_tokens(previous, current, message_tokens):
+    """Tokens in the leading messages of current that are byte-identical to previous's."""
+    same = 0
+    while same < min(len(previous), len(current)) and previous[same] == current[same]:
+        same += 1
+    return message_tokens(current[:same])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=60)
+    args = parser.parse_args()
+
+    server, url = start_stub_server()
+    server.bodies = []
+    os.environ.update({"OPENAI_API_KEY": "bench", "OPENAI_BASE_URL": url + "/v1", "MONGO_TLS": "0"})
+    use_mongomock()
+
+    from app import conversations, create_app
+    from app.conversations import CHAT_SYSTEM_PROMPT, message_tokens
+    from app.db import db
+
+    user_id = "bench-user"
+    db["Favorite"].insert_many([
+        {"userId": user_id, "zpid": str(i), "title": f"{i} Main St", "city": "Detroit, MI",
+         "price": 180000 + i * 9000, "bedrooms": 3, "bathrooms": 2}
+        for i in range(20)
+    ])
+    db["Task"].insert_many([
+        {"userId": user_id, "title": f"Task {i}", "category": "finance", "due_date": "within 2 weeks",
+         "priority": "high"}
+        for i in range(6)
+    ])
+
+    client = create_app().test_client()
+    rng = random.Random(0)
+    history = [{"role": "system", "content": CHAT_SYSTEM_PROMPT}]
+    rows, previous, conversation_id = [], None, None
+    for turn in range(1, args.turns + 1):
+        message = rng.choice(QUESTIONS).format(n=rng.randrange(1, 10))
+        sent = len(server.bodies)
+        reply = client.post("/api/chat", json={"userId": user_id, "message": message,
+                                               **({"conversationId": conversation_id} if conversation_id else {})}).json
+        conversation_id = reply["conversationId"]
+        prompt = next(b["messages"] for b in server.bodies[sent:] if b["model"] == "gpt-4")
+
+        # Stateless chat: the client resends everything said so far.
+        history.append({"role": "user", "content": message})
+        resend = message_tokens(history)
+        history.append({"role": "assistant", "content": reply["reply"]})
+
+        cached = cached_prefix_tokens(previous, prompt, message_tokens) if previous else 0
+        rows.append((turn, resend, message_tokens(prompt), cached))
+        previous = prompt
+        while conversations.compactions_running():
+            time.sleep(0.01)
+
+    summaries = [b for b in server.bodies if b["model"] == conversations.SUMMARY_MODEL]
+    summary_tokens = sum(message_tokens(b["messages"]) for b in summaries)
+
+    print(f"{args.turns} turns, prompt budget {conversations.CONTEXT_TOKENS} tokens")
+    print(f"{'turn':>5} {'resend history':>15} {'memory':>8} {'cached prefix':>14}")
+    shown = {1, 2, 5, 10, 20, 30, 40, 50, args.turns}
+    for turn, resend, memory, cached in rows:
+        if turn in shown:
+            print(f"{turn:>5} {resend:>15} {memory:>8} {cached:>14}")
+    total_resend = sum(r[1] for r in rows)
+    total_memory = sum(r[2] for r in rows)
+    print(f"{'total':>5} {total_resend:>15} {total_memory:>8} {sum(r[3] for r in rows):>14}")
+    print(f"max prompt: resend {max(r[1] for r in rows)}, memory {max(r[2] for r in rows)}")
+    print(f"summarization calls {len(summaries)}, {summary_tokens} prompt tokens "
+          f"(memory total incl. summaries {total_memory + summary_tokens})")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Favorites at 10k per user: find_one + insert_one vs. upsert vs. batch add, double-click races and covered reads.
+
+    python -m bench.favorites_bench --mongo mongodb://localhost:27017/homefinder_bench --favorites 10000
+    python -m bench.favorites_bench --mongomock --favorites 2000
+
+Only a real mongod gives meaningful numbers: it also reports round-trips and,
+from explain(), the documents examined to read every favorite with and without
+the covering index. --mongomock just checks the bench runs (its global lock
+also hides the double-click race).
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import MongoClient, monitoring
+
+from bench.load_test import use_mongomock
+from bench.task_write_bench import CommandCounter
+
+
+def favorite(i):
+    return {"zpid": str(100000 + i), "title": f"{i} Main St", "city": "Detroit", "price": 150000 + i,
+            "bedrooms": 3, "bathrooms": 2, "image": f"https://photos.example.com/{i}.jpg"}
+
+
+def legacy_add(collection, user_id, item):
+    """The old add_favorite: check, then insert."""
+    if collection.find_one({"userId": user_id, "zpid": item["zpid"]}):
+        return False
+    collection.insert_one({"userId": user_id, **item})
+    return True
+
+
+def timed(counter, fn):
+    counter.count = 0
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start, counter.count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default="mongodb://localhost:27017/homefinder_bench")
+    parser.add_argument("--mongomock", action="store_true")
+    parser.add_argument("--favorites", type=int, default=10000, help="favorites per user")
+    parser.add_argument("--clicks", type=int, default=200, help="homes double-clicked concurrently")
+    args = parser.parse_args()
+
+    os.environ["MONGO_TLS"] = "0"
+    counter = CommandCounter()
+    if args.mongomock:
+        use_mongomock()
+    else:
+        os.environ["DATABASE_URL"] = args.mongo
+        monitoring.register(counter)
+
+    from app.db import db
+    from app.favorite_repository import (
+        BATCH_LIMIT, FAVORITE_PROJECTION, add_favorite, add_favorites, find_favorites, normalize_zpid,
+    )
+    from app.migrations import INDEXES
+
+    favorites, legacy = db["Favorite"], db["FavoriteLegacy"]
+    for keys, options in (spec if isinstance(spec, tuple) else (spec, {}) for spec in INDEXES["Favorite"]):
+        favorites.create_index(keys, **options)
+    # The old layout: no unique pair index, only (userId, _id).
+    legacy.create_index([("userId", 1), ("_id", 1)])
+    items = [favorite(i) for i in range(args.favorites)]
+    n = len(items)
+
+    print(f"{n} favorites for one user")
+    print(f"{'':<24} {'wall-clock':>11} {'round-trips':>12}")
+    rows = [
+        ("find_one + insert_one", lambda: [legacy_add(legacy, "legacy", item) for item in items]),
+        ("upsert per favorite", lambda: [add_favorite("single", item["zpid"], item) for item in items]),
+        ("batch add", lambda: [add_favorites("batch", items[i:i + BATCH_LIMIT]) for i in range(0, n, BATCH_LIMIT)]),
+    ]
+    for label, fn in rows:
+        seconds, trips = timed(counter, fn)
+        print(f"{label:<24} {seconds:>10.2f}s {trips if trips else '-':>12}")
+
+    # Double clicks: every home is favorited twice at the same moment.
+    clicks = [favorite(n + i) for i in range(args.clicks)] * 2
+    with ThreadPoolExecutor(16) as pool:
+        list(pool.map(lambda item: legacy_add(legacy, "racer", item), clicks))
+        list(pool.map(lambda item: add_favorite("racer", normalize_zpid(item["zpid"]), item), clicks))
+    print(f"\n{args.clicks} homes double-clicked: legacy stored {legacy.count_documents({'userId': 'racer'})}, "
+          f"upsert stored {favorites.count_documents({'userId': 'racer'})}")
+
+    seconds, _ = timed(counter, lambda: list(find_favorites("batch")))
+    print(f"\nread all {n} favorites (forecast/dashboard path) {seconds * 1000:.0f} ms")
+    if not args.mongomock:
+        for label, collection, user_id in (("covering index", favorites, "batch"),
+                                           ("(userId, _id) only", legacy, "legacy")):
+            cursor = collection.find({"userId": user_id}, FAVORITE_PROJECTION).sort("_id", 1)
+            stats = cursor.explain()["executionStats"]
+            print(f"  {label:<20} keys examined {stats['totalKeysExamined']:>6}, "
+                  f"docs examined {stats['totalDocsExamined']:>6}, {stats['executionTimeMillis']} ms")
+        MongoClient(args.mongo).drop_database(db.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Microbenchmark: per-home Python loop vs. the vectorized ForecastEngine.
+
+    python -m bench.forecast_bench --sizes 1 100 100000
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from joblib import load
+
+from app.forecast import CURRENT_YEAR, ForecastEngine
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "app", "house_price_model.joblib")
+
+
+def legacy_forecast(model, prices):
+    """The per-request, per-home loop the forecast routes used before the engine."""
+    results = []
+    for price in prices:
+        base_year = list(model["forecast"].values())[0]
+        forecast = []
+        for i in range(1, 6):
+            year = str(CURRENT_YEAR + i)
+            if year in model["forecast"]:
+                forecast.append({
+                    "date": year,
+                    "price": round(price * model["forecast"][year] / base_year, 2),
+                    "min": round(price * model["lower"][year] / base_year, 2),
+                    "max": round(price * model["upper"][year] / base_year, 2),
+                })
+        results.append(forecast)
+    return results
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    model = load(MODEL_PATH)
+    if "forecast" not in model:
+        model = {"forecast": model, "lower": model, "upper": model, "confidence": 95}
+    engine = ForecastEngine(model)
+    rng = np.random.default_rng(0)
+
+    print(f"{'homes':>8} {'loop ms':>10} {'engine ms':>10} {'matrix ms':>10}")
+    for n in args.sizes:
+        prices = rng.uniform(80_000, 900_000, n).round(0).tolist()
+        loop = best_of(lambda: legacy_forecast(model, prices), args.repeat)
+        full = best_of(lambda: engine.forecast(prices), args.repeat)
+        matrix = best_of(lambda: engine.forecast_matrix(prices), args.repeat)
+        print(f"{n:>8} {loop:>10.3f} {full:>10.3f} {matrix:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Compare bare requests.get against the pooled UpstreamClient on a local stub.
+
+    python -m bench.http_client_bench --requests 2000 --concurrency 16
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from app.upstream import UpstreamClient
+from bench.stubs import start_stub_server
+
+
+def run(label, fetch, url, total, concurrency):
+    latencies = []
+
+    def one(_):
+        start = time.perf_counter()
+        fetch(url, params={"location": "Detroit, MI"}).json()
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    print(f"{label:<10} {total / elapsed:8.0f} req/s   p50 {np.percentile(ms, 50):6.2f} ms   p99 {np.percentile(ms, 99):6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.0, help="stub latency in seconds")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency)
+    url = base_url + "/propertyExtendedSearch"
+    try:
+        run("before", requests.get, url, args.requests, args.concurrency)
+        client = UpstreamClient(max_concurrency=args.concurrency)
+        run("after", client.get, url, args.requests, args.concurrency)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
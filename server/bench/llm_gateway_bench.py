@@ -0,0 +1,119 @@
+"""A burst of chat and batch task-regeneration calls against a local OpenAI stand-in that 429s past its limit.
+
+Compares calling the SDK directly (its default retries) with going through
+app.llm.LLMGateway configured for the stand-in's limit, then checks that
+identical in-flight prompts reach the upstream once:
+
+    python -m bench.llm_gateway_bench --limit 10 --bulk 40 --interactive 10
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+
+from bench.stubs import RateLimitedStubHandler, start_stub_server
+
+
+def run_burst(call, interactive, bulk):
+    """Fire bulk calls, then interactive ones, all at once; return per-lane (latencies, failures)."""
+    results = {"interactive": ([], []), "bulk": ([], [])}
+    lock = threading.Lock()
+
+    def worker(lane, i):
+        start = time.perf_counter()
+        try:
+            call(lane, i)
+            outcome = None
+        except Exception as e:
+            outcome = type(e).__name__
+        with lock:
+            latencies, failures = results[lane]
+            if outcome is None:
+                latencies.append(time.perf_counter() - start)
+            else:
+                failures.append(outcome)
+
+    threads = [threading.Thread(target=worker, args=("bulk", i)) for i in range(bulk)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)  # the batch job is already queued when users start chatting
+    users = [threading.Thread(target=worker, args=("interactive", i)) for i in range(interactive)]
+    for t in users:
+        t.start()
+    for t in threads + users:
+        t.join()
+    return results
+
+
+def report(label, results, server):
+    print(f"\n{label}: upstream completions {getattr(server, 'completions', 0)}, "
+          f"429s {getattr(server, 'rejected', 0)}")
+    for lane, (latencies, failures) in results.items():
+        if latencies:
+            latencies.sort()
+            p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+            timing = f"p50 {statistics.median(latencies) * 1000:7.0f} ms  p95 {p95 * 1000:7.0f} ms"
+        else:
+            timing = "no successes"
+        print(f"  {lane:<12} ok {len(latencies):>3}  failed {len(failures):>3}  {timing}")
+
+
+def reset(server):
+    server.completions = server.rejected = 0
+    server.__dict__.pop("completion_times", None)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limit", type=int, default=10, help="stand-in completions per second")
+    parser.add_argument("--latency", type=float, default=0.2, help="stand-in completion latency (s)")
+    parser.add_argument("--interactive", type=int, default=10)
+    parser.add_argument("--bulk", type=int, default=40)
+    parser.add_argument("--duplicates", type=int, default=20)
+    args = parser.parse_args()
+
+    handler = type("LimitedHandler", (RateLimitedStubHandler,), {"per_second": args.limit})
+    server, url = start_stub_server(args.latency, handler=handler)
+    os.environ.update({"OPENAI_API_KEY": "bench", "OPENAI_BASE_URL": url + "/v1"})
+
+    from openai import OpenAI
+
+    from app.llm import LLMGateway
+    from app.upstream import openai_http_client
+
+    def messages(lane, i):
+        return [{"role": "user", "content": f"{lane} prompt {i}"}]
+
+    sdk = OpenAI(http_client=openai_http_client())
+    direct = run_burst(
+        lambda lane, i: sdk.chat.completions.create(model="gpt-4", messages=messages(lane, i), max_tokens=200),
+        args.interactive, args.bulk,
+    )
+    report("SDK directly (2 retries)", direct, server)
+
+    reset(server)
+    gateway = LLMGateway(rpm=args.limit * 60, max_concurrency=8)
+    gated = run_burst(
+        lambda lane, i: gateway.complete(lane=lane, model="gpt-4", messages=messages(lane, i), max_tokens=200),
+        args.interactive, args.bulk,
+    )
+    report(f"LLMGateway (rpm={args.limit * 60})", gated, server)
+
+    reset(server)
+    threads = [
+        threading.Thread(target=gateway.complete, kwargs={
+            "model": "gpt-4", "messages": messages("same", 0), "max_tokens": 200})
+        for _ in range(args.duplicates)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f"\n{args.duplicates} identical concurrent prompts -> {getattr(server, 'completions', 0)} upstream call(s)")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""Mixed-workload load test of the Flask API against local stand-ins.
+
+Boots create_app() on a threaded local server, backed by a local mongod (--mongo)
+or mongomock (--mongomock), with the stub OpenAI/Zillow server from bench.stubs.
+Virtual users then loop over a weighted mix of login, dashboard load,
+search and task generation. Latency percentiles and throughput are
+reported per endpoint and per workload, and saved as JSON for diffing
+between commits:
+
+    python -m bench.load_test --mongomock --duration 30 --concurrency 16 --latency 0.05
+    python -m bench.load_test --mongo mongodb://localhost:27017/homefinder_bench --output before.json
+    python -m bench.load_test --compare before.json after.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import requests
+
+from bench.stubs import start_stub_server
+
+# Relative weight of each workload in the mix.
+DEFAULT_MIX = {"login": 20, "dashboard": 40, "search": 30, "generate": 10}
+CITIES = ["Detroit", "Ann Arbor", "Lansing", "Troy", "Novi", "Flint", "Warren", "Livonia",
+          "Dearborn", "Canton", "Southfield", "Pontiac", "Royal Oak", "Rochester", "Sterling Heights"]
+PASSWORD = "bench-password"
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def use_mongomock():
+    """Point app.db at an in-process mongomock client (no mongod needed)."""
+    try:
+        import mongomock
+        import mongomock.collection
+    except ImportError:
+        raise SystemExit("--mongomock needs `pip install mongomock`")
+
+    # pymongo 4.9+ passes `sort` to bulk updates, which mongomock does not accept yet.
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+    def add_update_without_sort(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+
+    mongomock.collection.BulkOperationBuilder.add_update = add_update_without_sort
+
+    import app.db
+
+    app.db._client = mongomock.MongoClient("mongodb://localhost/homefinder_bench")
+    app.db._client_pid = os.getpid()
+
+
+def boot(args, stub_url):
+    os.environ.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": stub_url + "/v1",
+        "ZILLOW_API_KEY": "bench",
+        "ZILLOW_API_URL": stub_url,
+        "MONGO_TLS": "0",
+    })
+    os.environ.setdefault("LOG_SAMPLE_RATE", "0")
+    if args.mongomock:
+        # mongomock has no sessions, so no transactions either.
+        os.environ["MONGO_TRANSACTIONS"] = "0"
+        use_mongomock()
+    else:
+        os.environ["DATABASE_URL"] = args.mongo
+
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no per-request access lines
+
+    from app import create_app
+
+    server = make_server("127.0.0.1", 0, create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def seed(base_url, users, favorites_per_user):
+    """Register users through the API and give each some favorites and tasks directly in Mongo."""
+    from app.db import db
+
+    rng = random.Random(0)
+    accounts = []
+    session = requests.Session()
+    for i in range(users):
+        email = f"bench-{i}@example.com"
+        resp = session.post(f"{base_url}/api/register", json={"email": email, "name": f"Bench {i}", "password": PASSWORD})
+        user_id = resp.json().get("id") if resp.status_code == 201 else None
+        if user_id is None:
+            user = db["User"].find_one({"email": email})
+            user_id = str(user["_id"])
+        login = session.post(f"{base_url}/api/login", json={"email": email, "password": PASSWORD}).json()
+        accounts.append({"email": email, "id": user_id, "token": login.get("token")})
+
+    favorites, tasks = [], []
+    for account in accounts:
+        for zpid in rng.sample(range(1, 500), favorites_per_user):
+            favorites.append({"userId": account["id"], "zpid": zpid, "title": f"{zpid} Main St",
+                              "city": rng.choice(CITIES), "price": rng.randrange(120_000, 650_000, 1000),
+                              "bedrooms": rng.randint(1, 5), "bathrooms": rng.randint(1, 3)})
+        for n in range(6):
+            tasks.append({"title": f"Task {n}", "category": "finance", "due_date": "within 2 weeks",
+                          "priority": "high", "completed": False, "userId": account["id"]})
+    db["Favorite"].insert_many(favorites)
+    db["Task"].insert_many(tasks)
+    return accounts
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, ok):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+
+class VirtualUser:
+    def __init__(self, base_url, account, recorder, seed):
+        self.base_url = base_url
+        self.account = account
+        self.recorder = recorder
+        self.rng = random.Random(seed)
+        self.session = requests.Session()
+        if account.get("token"):
+            self.session.headers["Authorization"] = f"Bearer {account['token']}"
+
+    def call(self, method, path, **kwargs):
+        name = f"{method} {path.split('?')[0]}"
+        start = time.perf_counter()
+        try:
+            resp = self.session.request(method, self.base_url + path, timeout=60, **kwargs)
+            resp.content  # include body transfer
+            ok = resp.status_code < 400
+        except requests.RequestException:
+            resp, ok = None, False
+        self.recorder.record(name, time.perf_counter() - start, ok)
+        return resp
+
+    def login(self):
+        self.call("POST", "/api/login", json={"email": self.account["email"], "password": PASSWORD})
+
+    def dashboard(self):
+        # What HomeDashboard.jsx requests on page load, revalidating with the last ETag.
+        headers = {"If-None-Match": self.etag} if getattr(self, "etag", None) else {}
+        resp = self.call("GET", f"/api/dashboard?userId={self.account['id']}", headers=headers)
+        if resp is not None and resp.headers.get("ETag"):
+            self.etag = resp.headers["ETag"]
+
+    def dashboard_legacy(self):
+        # The separate per-widget requests the dashboard made before /api/dashboard.
+        user_id = self.account["id"]
+        self.call("GET", f"/api/tasks?user_id={user_id}")
+        self.call("GET", f"/api/favorites?userId={user_id}")
+        self.call("GET", f"/api/forecast/favorites?userId={user_id}")
+
+    def search(self):
+        city = self.rng.choice(CITIES)
+        params = {"q": f"{city}, MI"}
+        if self.rng.random() < 0.5:
+            params["min_price"] = self.rng.choice([150_000, 250_000, 350_000])
+        self.call("GET", "/api/search", params=params)
+
+    def generate(self):
+        self.call("POST", "/api/tasks/generate", json={
+            "credit_score": self.rng.choice([580, 640, 700, 760, 810]),
+            "refinancing_info": self.rng.choice(["I want to refinance", "first home", "not sure"]),
+            "user_id": self.account["id"],
+        })
+
+    def run(self, mix, deadline):
+        names, weights = zip(*mix.items())
+        while time.monotonic() < deadline:
+            workload = self.rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            getattr(self, workload)()
+            self.recorder.record(f"workload:{workload}", time.perf_counter() - start, True)
+
+
+def summarize(recorder, elapsed):
+    summary = {}
+    for name, samples in sorted(recorder.samples.items()):
+        ms = np.array(samples) * 1000
+        summary[name] = {
+            "count": len(samples),
+            "errors": recorder.errors.get(name, 0),
+            "rps": round(len(samples) / elapsed, 2),
+            "mean_ms": round(float(ms.mean()), 2),
+            "p50_ms": round(float(np.percentile(ms, 50)), 2),
+            "p90_ms": round(float(np.percentile(ms, 90)), 2),
+            "p99_ms": round(float(np.percentile(ms, 99)), 2),
+            "max_ms": round(float(ms.max()), 2),
+        }
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(result):
+    print(f"{result['requests']} requests in {result['duration_s']} s "
+          f"({result['throughput_rps']} req/s, {result['errors']} errors)")
+    print(f"{'endpoint':<32} {'count':>6} {'err':>5} {'rps':>7} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    for name, s in result["endpoints"].items():
+        print(f"{name:<32} {s['count']:>6} {s['errors']:>5} {s['rps']:>7} "
+              f"{s['p50_ms']:>8} {s['p90_ms']:>8} {s['p99_ms']:>8} {s['max_ms']:>8}")
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    print(f"{'endpoint':<32} {'p50 ms':>18} {'p99 ms':>18} {'rps':>16}")
+
+    def delta(old, new):
+        change = f"{(new - old) / old * 100:+.0f}%" if old else "n/a"
+        return f"{new:>8} {change:>6}"
+
+    for name, new in after["endpoints"].items():
+        old = before["endpoints"].get(name)
+        if old is None:
+            print(f"{name:<32} (new)")
+            continue
+        print(f"{name:<32} {delta(old['p50_ms'], new['p50_ms']):>18} "
+              f"{delta(old['p99_ms'], new['p99_ms']):>18} {delta(old['rps'], new['rps']):>16}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default="mongodb://localhost:27017/homefinder_bench")
+    parser.add_argument("--mongomock", action="store_true", help="use in-process mongomock instead of --mongo")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub OpenAI/Zillow latency (s)")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=16, help="virtual users")
+    parser.add_argument("--users", type=int, default=50, help="seeded accounts")
+    parser.add_argument("--favorites", type=int, default=12, help="favorites per seeded account")
+    parser.add_argument("--mix", type=json.loads, default=DEFAULT_MIX,
+                        help='workload weights as JSON, e.g. \'{"search": 1}\'')
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="JSON results path (default: bench/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="diff two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    stub, stub_url = start_stub_server(args.latency)
+    server, base_url = boot(args, stub_url)
+    accounts = seed(base_url, args.users, args.favorites)
+
+    recorder = Recorder()
+    deadline = time.monotonic() + args.duration
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for i in range(args.concurrency):
+            user = VirtualUser(base_url, accounts[i % len(accounts)], recorder, args.seed * 1000 + i)
+            pool.submit(user.run, args.mix, deadline)
+    elapsed = time.perf_counter() - start
+
+    endpoints = summarize(recorder, elapsed)
+    requests_made = sum(s["count"] for n, s in endpoints.items() if not n.startswith("workload:"))
+    result = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "duration_s": round(elapsed, 2),
+        "requests": requests_made,
+        "errors": sum(s["errors"] for s in endpoints.values()),
+        "throughput_rps": round(requests_made / elapsed, 2),
+        "endpoints": endpoints,
+    }
+    print_summary(result)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{result['commit'] or 'nogit'}.json")
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Saved {output}")
+
+    server.shutdown()
+    stub.shutdown()
+    if not args.mongomock:
+        from pymongo import MongoClient
+
+        MongoClient(args.mongo).drop_database("homefinder_bench")
+
+
+if __name__ == "__main__":
+    main()
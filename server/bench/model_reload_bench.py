@@ -0,0 +1,146 @@
+"""Per-worker memory and reload latency: unpickled joblib dicts vs. the memory-mapped artifact.
+
+    python -m bench.model_reload_bench --regions 2000 --workers 4
+
+Builds a synthetic model with --regions regional curves, then starts
+--workers processes per format. Each one loads the model the way the API does
+and reports how much its RSS and PSS grew. PSS splits shared page-cache
+pages between the processes that map them. Reload latency is measured
+in-process: replace the file, then time the first get_forecast_engine()
+call that returns the new engine.
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+from joblib import dump, load
+
+import app.forecast as forecast
+from app.model_artifact import ModelArtifact
+
+YEARS = [str(y) for y in range(2011, 2031)]
+
+
+def synthetic_model(regions, seed=0):
+    rng = np.random.default_rng(seed)
+
+    def curve():
+        prices = 180_000 * np.cumprod(1 + rng.normal(0.02, 0.01, len(YEARS)))
+        spread = np.linspace(0.02, 0.25, len(YEARS))
+        return {
+            "forecast": dict(zip(YEARS, prices.round(2).tolist())),
+            "lower": dict(zip(YEARS, (prices * (1 - spread)).round(2).tolist())),
+            "upper": dict(zip(YEARS, (prices * (1 + spread)).round(2).tolist())),
+        }
+
+    model = {**curve(), "confidence": 95, "version": 2}
+    model["regions"] = {f"region-{i}": curve() for i in range(regions)}
+    return model
+
+
+def memory_kb():
+    """(rss, pss) of this process in kB."""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0])
+    return values["Rss"], values["Pss"]
+
+
+def worker(mode, path, ready, done, results):
+    before = memory_kb()
+    if mode == "joblib":
+        # What the API used to do: keep the unpickled dict and build from it.
+        model = load(path)
+        engine = forecast.ForecastEngine(model)
+    else:
+        engine = forecast.ForecastEngine(ModelArtifact.open(path))
+    engine.forecast([250_000] * 100, [f"region-{i}" for i in range(100)])
+    after = memory_kb()
+    ready.release()
+    done.wait()  # keep the mapping alive until every worker has measured
+    results.put((after[0] - before[0], after[1] - before[1]))
+
+
+def measure_workers(mode, path, workers):
+    ctx = multiprocessing.get_context("spawn")
+    ready, done, results = ctx.Semaphore(0), ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, path, ready, done, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    for _ in procs:
+        ready.acquire()
+    done.set()
+    deltas = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return max(d[0] for d in deltas), max(d[1] for d in deltas)
+
+
+def reload_latency(model, directory, repeat):
+    """ms from the file being replaced to get_forecast_engine() returning the new engine."""
+    forecast.MODEL_RELOAD_INTERVAL = 0
+    forecast.MODEL_PATH = os.path.join(directory, "model.joblib")
+    forecast.COMPACT_MODEL_PATH = os.path.join(directory, "model.hpm")
+    dump(model, forecast.MODEL_PATH)
+    forecast._engine = None
+    forecast.get_forecast_engine()
+
+    timings = {"joblib": [], "compact": []}
+    for _ in range(repeat):
+        # Retrain drops a new joblib file: parse it, write the artifact, map it.
+        time.sleep(0.01)  # distinct mtime
+        dump(model, forecast.MODEL_PATH)
+        start = time.perf_counter()
+        forecast.get_forecast_engine()
+        timings["joblib"].append(time.perf_counter() - start)
+
+        # A new compact artifact is renamed into place: map it directly.
+        time.sleep(0.01)
+        ModelArtifact.from_dict(model).save(forecast.COMPACT_MODEL_PATH)
+        start = time.perf_counter()
+        forecast.get_forecast_engine()
+        timings["compact"].append(time.perf_counter() - start)
+
+    forecast.MODEL_RELOAD_INTERVAL = 5
+    start = time.perf_counter()
+    for _ in range(100_000):
+        forecast.get_forecast_engine()
+    check_us = (time.perf_counter() - start) / 100_000 * 1e6
+    return {name: min(values) * 1000 for name, values in timings.items()}, check_us
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--regions", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    model = synthetic_model(args.regions)
+    with tempfile.TemporaryDirectory() as directory:
+        joblib_path = os.path.join(directory, "bench.joblib")
+        compact_path = os.path.join(directory, "bench.hpm")
+        dump(model, joblib_path)
+        ModelArtifact.from_dict(model).save(compact_path)
+        print(f"{args.regions} regions: joblib {os.path.getsize(joblib_path) / 1024:.0f} kB, "
+              f"compact {os.path.getsize(compact_path) / 1024:.0f} kB")
+
+        print(f"{'format':>8} {'workers':>8} {'rss +kB':>9} {'pss +kB':>9}")
+        for mode, path in (("joblib", joblib_path), ("mmap", compact_path)):
+            rss, pss = measure_workers(mode, path, args.workers)
+            print(f"{mode:>8} {args.workers:>8} {rss:>9} {pss:>9}")
+
+        latency, check_us = reload_latency(model, directory, args.repeat)
+        print(f"reload after new joblib: {latency['joblib']:.1f} ms (parse + convert + map)")
+        print(f"reload after new artifact: {latency['compact']:.1f} ms (map only)")
+        print(f"get_forecast_engine() between checks: {check_us:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Upstream calls and wall-clock for one favorites price refresh against the local Zillow stub.
+
+Needs a local mongod (no TLS):
+
+    python -m bench.price_refresh_bench --users 200 --favorites 10 --zpids 300 --latency 0.05
+"""
+import argparse
+import os
+import random
+import time
+
+from pymongo import MongoClient, monitoring
+
+from bench.stubs import start_stub_server
+from bench.task_write_bench import CommandCounter
+
+
+def seed_favorites(db, users, per_user, zpids):
+    rng = random.Random(0)
+    docs = []
+    for u in range(users):
+        for zpid in rng.sample(range(1, zpids + 1), per_user):
+            # Snapshot prices as the client sent them, deliberately stale.
+            docs.append({"userId": f"user-{u}", "zpid": zpid, "title": f"{zpid} Main St",
+                         "city": "Detroit", "price": 100000, "bedrooms": 1, "bathrooms": 1})
+    db["Favorite"].insert_many(docs)
+    return len(docs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default="mongodb://localhost:27017/homefinder_bench")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--favorites", type=int, default=10, help="favorites per user")
+    parser.add_argument("--zpids", type=int, default=300, help="distinct homes users pick from")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub Zillow latency (s)")
+    parser.add_argument("--rate", type=float, default=50, help="upstream calls per second")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.latency)
+    counter = CommandCounter()
+    monitoring.register(counter)
+    os.environ.update({"DATABASE_URL": args.mongo, "MONGO_TLS": "0", "ZILLOW_API_URL": url})
+
+    from app.db import db
+    from app.price_refresh import refresh_prices, stalest_zpids
+
+    favorites = seed_favorites(db, args.users, args.favorites, args.zpids)
+    counter.count = 0
+    start = time.perf_counter()
+    stats = refresh_prices(stalest_zpids(), rate=args.rate, concurrency=args.concurrency)
+    elapsed = time.perf_counter() - start
+
+    print(f"{favorites} favorites, {stats['zpids']} distinct zpids")
+    print(f"upstream calls     {getattr(server, 'property_requests', 0)} (a per-favorite refresh makes {favorites})")
+    print(f"mongo round-trips  {counter.count}")
+    print(f"favorites updated  {stats['modified']}, failed fetches {stats['failed']}")
+    print(f"wall-clock         {elapsed:.2f} s off the request path")
+
+    server.shutdown()
+    MongoClient(args.mongo).drop_database(db.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Mongo writes for a minute of browsing: one upsert per view vs. the buffered, coalesced flush.
+
+Each simulated user views `--views` homes over a minute, drawn from a small
+pool of `--homes` they keep going back to. The baseline upserts one
+RecentlyViewed document per view (as the Prisma handler does, before any
+capping); the buffer flushes every `--flush` simulated seconds.
+
+    python -m bench.recently_viewed_bench --mongomock --users 200 --views 60 --homes 15
+    python -m bench.recently_viewed_bench --mongo mongodb://localhost:27017/homefinder_bench
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+from pymongo import MongoClient, monitoring
+
+from bench.load_test import use_mongomock
+from bench.task_write_bench import CommandCounter
+
+
+def browsing(users, views, homes, seconds=60):
+    """(second, user, home) view events in time order."""
+    rng = random.Random(0)
+    events = [
+        (rng.uniform(0, seconds), f"user-{u}", f"home-{u}-{rng.randrange(homes)}")
+        for u in range(users) for _ in range(views)
+    ]
+    return sorted(events)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default="mongodb://localhost:27017/homefinder_bench")
+    parser.add_argument("--mongomock", action="store_true")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--views", type=int, default=60, help="views per user per minute")
+    parser.add_argument("--homes", type=int, default=15, help="distinct homes each user browses")
+    parser.add_argument("--flush", type=float, default=5, help="flush interval (simulated seconds)")
+    args = parser.parse_args()
+
+    # The bench drives the flushes itself.
+    os.environ["RECENTLY_VIEWED_FLUSH_INTERVAL"] = "3600"
+    os.environ["MONGO_TLS"] = "0"
+    counter = CommandCounter()
+    if args.mongomock:
+        use_mongomock()
+    else:
+        os.environ["DATABASE_URL"] = args.mongo
+        monitoring.register(counter)
+
+    from app import recently_viewed
+    from app.db import db
+
+    events = browsing(args.users, args.views, args.homes)
+
+    counter.count = 0
+    start = time.perf_counter()
+    for _, user_id, home_id in events:
+        db["RecentlyViewed"].update_one(
+            {"userId": user_id, "homeId": home_id},
+            {"$set": {"viewedAt": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+    per_view_seconds = time.perf_counter() - start
+    per_view_commands = counter.count or len(events)
+
+    counter.count = 0
+    flushes = users_written = 0
+    next_flush = args.flush
+    start = time.perf_counter()
+    for second, user_id, home_id in events:
+        while second >= next_flush:
+            written = recently_viewed.flush_views()
+            flushes += bool(written)
+            users_written += written
+            next_flush += args.flush
+        recently_viewed.record_view(user_id, home_id)
+    written = recently_viewed.flush_views()
+    flushes += bool(written)
+    users_written += written
+    buffered_seconds = time.perf_counter() - start
+    buffered_commands = counter.count or flushes
+
+    buffer = recently_viewed.buffer
+    print(f"{len(events)} views by {args.users} users over a minute, {args.homes} homes each")
+    print(f"coalesced in the buffer   {buffer.coalesced} of {buffer.recorded} views")
+    print(f"{'':<18} {'write cmds':>11} {'docs written':>13} {'wall-clock':>11}")
+    print(f"{'upsert per view':<18} {per_view_commands:>11} {len(events):>13} {per_view_seconds:>10.2f}s")
+    print(f"{'buffered flush':<18} {buffered_commands:>11} {users_written:>13} {buffered_seconds:>10.2f}s")
+
+    sizes = [len(doc["views"]) for doc in db[recently_viewed.COLLECTION].find({}, {"views": 1})]
+    print(f"history documents {len(sizes)}, longest {max(sizes)} views (cap {recently_viewed.HISTORY_SIZE})")
+
+    if not args.mongomock:
+        MongoClient(args.mongo).drop_database(db.name)
+
+
+if __name__ == "__main__":
+    main()
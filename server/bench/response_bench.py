@@ -0,0 +1,93 @@
+"""Serialization time and payload size: Flask's stdlib JSON vs. FastJSONProvider, identity vs. gzip/br.
+
+    python -m bench.response_bench --results 500 --repeat 20
+"""
+import argparse
+import gzip
+import time
+from datetime import datetime, timezone
+
+from bson.objectid import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app import responses
+from app.responses import FastJSONProvider
+from bench.stubs import fake_listing
+
+
+def search_payload(n):
+    listings = [fake_listing(i) for i in range(1, n + 1)]
+    return {
+        "results": [{"id": str(l["zpid"]), "title": l["address"].split(",")[0], "city": "Detroit",
+                     "price": l["price"], "bedrooms": l["bedrooms"], "bathrooms": l["bathrooms"],
+                     "image": l["imgSrc"]} for l in listings],
+        "total": n,
+        "facets": {"city": [{"value": "Detroit", "count": n}]},
+        "source": "local",
+    }
+
+
+def favorites_payload(n):
+    """Favorites as stored: ObjectId and datetime fields, as routes return them now."""
+    now = datetime.now(timezone.utc)
+    return {"favorites": [
+        {"_id": ObjectId(), "userId": "user-1", "zpid": i, "title": f"{i} Main St", "city": "Detroit",
+         "price": 150000 + i, "bedrooms": 3, "bathrooms": 2, "image": f"https://photos.example.com/{i}.jpg",
+         "priceRefreshedAt": now}
+        for i in range(n)
+    ], "next_cursor": None}
+
+
+def stringify(payload):
+    """What routes had to do for the stdlib provider: str() every ObjectId/datetime by hand."""
+    return {"favorites": [
+        {**fav, "_id": str(fav["_id"]), "priceRefreshedAt": fav["priceRefreshedAt"].isoformat()}
+        for fav in payload["favorites"]
+    ], "next_cursor": None}
+
+
+def best_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--results", type=int, default=500)
+    parser.add_argument("--favorites", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    stdlib, fast = DefaultJSONProvider(app), FastJSONProvider(app)
+
+    print(f"{'payload':<22} {'stdlib ms':>10} {'orjson ms':>10}")
+    cases = [
+        (f"search x{args.results}", search_payload(args.results), None),
+        (f"favorites x{args.favorites}", favorites_payload(args.favorites), stringify),
+    ]
+    with app.app_context():
+        for label, payload, prepare in cases:
+            legacy = (lambda: stdlib.response(prepare(payload))) if prepare else (lambda: stdlib.response(payload))
+            print(f"{label:<22} {best_ms(legacy, args.repeat):>10.2f} "
+                  f"{best_ms(lambda: fast.response(payload), args.repeat):>10.2f}")
+
+        print(f"\n{'payload':<22} {'identity':>9} {'gzip':>7} {'gzip ms':>8} {'br':>7} {'br ms':>7}")
+        for label, payload, _ in cases:
+            body = fast.dumps_bytes(payload)
+            gz = gzip.compress(body, compresslevel=responses.GZIP_LEVEL)
+            line = f"{label:<22} {len(body):>9} {len(gz):>7} " \
+                   f"{best_ms(lambda: gzip.compress(body, compresslevel=responses.GZIP_LEVEL), args.repeat):>8.2f}"
+            if responses.brotli is not None:
+                br = responses.compress(body, "br")
+                line += f" {len(br):>7} {best_ms(lambda: responses.compress(body, 'br'), args.repeat):>7.2f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""The app as bench.serving_bench serves it, over seeded data.
+
+    python -m bench.serving_app            # the old deployment: main.py's dev server
+    gunicorn -c gunicorn.conf.py bench.serving_app:application
+"""
+import os
+
+from bench.serving_bench import seed
+
+if os.getenv("SERVING_BENCH_MONGOMOCK") == "1":
+    from bench.load_test import use_mongomock
+
+    use_mongomock()
+    import app.db
+
+    # Workers are forked with a copy of the seeded in-memory database; keep using it
+    # instead of connecting a fresh (real) client after the fork.
+    _mock = app.db._client
+    app.db.get_client = lambda: _mock
+
+from app.db import db
+
+seed(db)
+
+if __name__ == "__main__":
+    from main import app
+
+    app.run(debug=True, port=int(os.getenv("PORT", "5000")))
+else:
+    from app.wsgi import application  # noqa: F401
@@ -0,0 +1,203 @@
+"""Read-endpoint throughput: `python main.py` (Werkzeug dev server) vs. gunicorn with gunicorn.conf.py.
+
+Both servers run as subprocesses over the same seeded data (bench.serving_app)
+and get the same closed-loop load on the read endpoints. Memory is reported as
+RSS and PSS summed over the server's processes; PSS splits pages shared
+copy-on-write between the processes sharing them.
+
+    python -m bench.serving_bench --mongomock --listings 2000 --duration 20 --concurrency 32
+    python -m bench.serving_bench --mongo mongodb://localhost:27017/homefinder_bench
+
+With --mongomock each process holds its own in-memory copy of the data
+(forked from the master for gunicorn), so only a real mongod gives
+representative numbers; mongomock also mutates shared projection dicts, so a
+few concurrent reads fail with 500s under it. The load generator shares the
+machine's cores with the server.
+"""
+import argparse
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USERS = 100
+FAVORITES_PER_USER = 20
+# mongomock answers $in lookups by scanning; keep the listings small with --mongomock.
+LISTINGS = int(os.getenv("SERVING_BENCH_LISTINGS", "20000"))
+CITIES = ["Detroit", "Ann Arbor", "Lansing", "Troy", "Novi", "Flint", "Warren", "Livonia"]
+
+
+def seed(db):
+    """Deterministic users' favorites and tasks plus cached listings; skipped when already there."""
+    if db["listings"].estimated_document_count() == LISTINGS:
+        return
+    rng = random.Random(0)
+    for name in ("listings", "Favorite", "Task"):
+        db[name].delete_many({})
+    db["listings"].insert_many([
+        {"zpid": str(i), "title": f"{i} Main St", "city": rng.choice(CITIES), "location": "bench",
+         "price": rng.randrange(90_000, 900_000, 1000), "bedrooms": rng.randint(1, 6),
+         "bathrooms": rng.randint(1, 4), "listedById": "zillow"}
+        for i in range(LISTINGS)
+    ])
+    db["Favorite"].insert_many([
+        {"userId": f"user-{u}", "zpid": str(zpid), "title": f"{zpid} Main St", "city": rng.choice(CITIES),
+         "price": rng.randrange(120_000, 650_000, 1000), "bedrooms": rng.randint(1, 5), "bathrooms": rng.randint(1, 3)}
+        for u in range(USERS) for zpid in rng.sample(range(LISTINGS), FAVORITES_PER_USER)
+    ])
+    db["Task"].insert_many([
+        {"userId": f"user-{u}", "title": f"Task {n}", "category": "finance", "due_date": "within 2 weeks",
+         "priority": "high", "completed": False}
+        for u in range(USERS) for n in range(6)
+    ])
+
+
+def read_paths(rng):
+    user = f"user-{rng.randrange(USERS)}"
+    return rng.choice([
+        f"/api/dashboard?userId={user}",
+        f"/api/favorites?userId={user}",
+        f"/api/forecast/favorites?userId={user}",
+        f"/api/tasks?user_id={user}",
+        f"/api/homes/{rng.randrange(LISTINGS)}/similar",
+    ])
+
+
+def process_tree(pid):
+    pids = [pid]
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/task/{p}/children") as f:
+                pids += [int(child) for child in f.read().split()]
+        except OSError:
+            pass
+    return pids
+
+
+def memory_mb(pid):
+    """(RSS, PSS) in MB summed over pid and its descendants."""
+    rss = pss = 0
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/smaps_rollup") as f:
+                for line in f:
+                    key, value = line.split(":", 1)
+                    if key in ("Rss", "Pss"):
+                        kb = int(value.split()[0])
+                        rss += kb if key == "Rss" else 0
+                        pss += kb if key == "Pss" else 0
+        except OSError:
+            pass
+    return rss / 1024, pss / 1024
+
+
+def wait_ready(url, proc, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"server exited with {proc.returncode}")
+        try:
+            if requests.get(url + "/api/health", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise SystemExit("server did not become ready")
+
+
+def run_load(url, concurrency, seconds, seed_value=0):
+    """Closed-loop load: each thread issues the next request when the last returns."""
+    latencies, errors = [], {}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def user(i):
+        rng = random.Random(seed_value * 1000 + i)
+        session = requests.Session()
+        mine, failed = [], []
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                resp = session.get(url + read_paths(rng), timeout=30)
+                if resp.status_code >= 400:
+                    failed.append(str(resp.status_code))
+            except requests.RequestException as e:
+                failed.append(type(e).__name__)
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+            for reason in failed:
+                errors[reason] = errors.get(reason, 0) + 1
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(concurrency)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - start
+    ms = np.array(latencies) * 1000
+    return len(latencies) / elapsed, np.percentile(ms, 50), np.percentile(ms, 99), errors
+
+
+def main():
+    global LISTINGS
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default="mongodb://localhost:27017/homefinder_bench")
+    parser.add_argument("--mongomock", action="store_true")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, help="gunicorn workers (default: gunicorn.conf.py's)")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--listings", type=int, default=LISTINGS)
+    args = parser.parse_args()
+    # The server processes (bench.serving_app) seed and the load draws zpids from the same count.
+    os.environ["SERVING_BENCH_LISTINGS"] = str(args.listings)
+    LISTINGS = args.listings
+
+    env = {**os.environ, "MONGO_TLS": "0", "LOG_SAMPLE_RATE": "0", "PRICE_REFRESH_INTERVAL": "0",
+           "OPENAI_API_KEY": "bench", "PORT": str(args.port)}
+    if args.mongomock:
+        env.update({"SERVING_BENCH_MONGOMOCK": "1", "MONGO_TRANSACTIONS": "0"})
+    else:
+        env["DATABASE_URL"] = args.mongo
+        from pymongo import MongoClient
+
+        seed(MongoClient(args.mongo).get_database())
+    if args.workers:
+        env["WEB_CONCURRENCY"] = str(args.workers)
+
+    url = f"http://127.0.0.1:{args.port}"
+    servers = [
+        ("python main.py (dev)", [sys.executable, "-m", "bench.serving_app"]),
+        ("gunicorn", [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+                      "--bind", f"127.0.0.1:{args.port}", "bench.serving_app:application"]),
+    ]
+    print(f"{os.cpu_count()} CPUs, {args.concurrency} concurrent clients, {args.duration:.0f}s per server")
+    print(f"{'':<22} {'req/s':>8} {'p50':>9} {'p99':>9} {'errors':>7} {'RSS MB':>8} {'PSS MB':>8} {'procs':>6}")
+    for label, command in servers:
+        proc = subprocess.Popen(command, cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL, start_new_session=True)
+        try:
+            wait_ready(url, proc)
+            run_load(url, args.concurrency, args.warmup)
+            rps, p50, p99, errors = run_load(url, args.concurrency, args.duration, seed_value=1)
+            rss, pss = memory_mb(proc.pid)
+            procs = len(process_tree(proc.pid))
+            print(f"{label:<22} {rps:>8.0f} {p50:>7.1f}ms {p99:>7.1f}ms {sum(errors.values()):>7} "
+                  f"{rss:>8.0f} {pss:>8.0f} {procs:>6}" + (f"  {errors}" if errors else ""))
+        finally:
+            os.killpg(proc.pid, signal.SIGTERM)
+            proc.wait(timeout=60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Similar-homes queries over synthetic listings: exact scan vs. the coarse (IVF) index.
+
+    python -m bench.similar_homes_bench --homes 1000000 --queries 200
+
+Reports build time, per-query p50/p99, recall@k of the coarse index against
+the exact answer, and the cost of incrementally adding listings.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.similar_homes import SimilarHomesIndex
+
+
+def synthetic_homes(n, cities=2000, seed=0):
+    rng = random.Random(seed)
+    names = [f"City {i}, ST" for i in range(cities)]
+    homes = []
+    for i in range(n):
+        bedrooms = rng.choice((1, 2, 2, 3, 3, 3, 4, 4, 5, 6))
+        homes.append({
+            "zpid": str(10_000_000 + i),
+            "city": names[int(rng.paretovariate(1.2)) % cities],
+            "price": round(rng.lognormvariate(12.4, 0.6) * (0.8 + bedrooms / 10), -2),
+            "bedrooms": bedrooms,
+            "bathrooms": max(1, bedrooms - rng.choice((0, 1, 1, 2))),
+        })
+    return homes
+
+
+def percentile(samples, q):
+    return statistics.quantiles(samples, n=100)[q - 1] * 1000
+
+
+def timed_queries(index, zpids, k):
+    results, samples = {}, []
+    for zpid in zpids:
+        start = time.perf_counter()
+        results[zpid] = index.similar(zpid, k)
+        samples.append(time.perf_counter() - start)
+    return results, samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--homes", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--upserts", type=int, default=1000)
+    args = parser.parse_args()
+
+    homes = synthetic_homes(args.homes)
+    zpids = [home["zpid"] for home in random.Random(1).sample(homes, args.queries)]
+    print(f"{args.homes} homes, {args.queries} queries, k={args.k}")
+    print(f"{'':<16} {'build':>8} {'p50':>9} {'p99':>9} {'recall@k':>9}")
+
+    start = time.perf_counter()
+    exact = SimilarHomesIndex(homes, approx_min_size=args.homes + 1)
+    build = time.perf_counter() - start
+    truth, samples = timed_queries(exact, zpids, args.k)
+    print(f"{'exact scan':<16} {build:>7.1f}s {percentile(samples, 50):>7.2f}ms {percentile(samples, 99):>7.2f}ms {1:>9.3f}")
+
+    start = time.perf_counter()
+    approx = SimilarHomesIndex(homes, approx_min_size=0)
+    build = time.perf_counter() - start
+    for nprobe in args.nprobe:
+        approx.nprobe = nprobe
+        found, samples = timed_queries(approx, zpids, args.k)
+        # Ties at the k-th distance make several answers correct; count any neighbour no farther than it.
+        hits = sum(
+            sum(d <= truth[z][-1][1] + 1e-5 for _, d in found[z]) for z in zpids if truth[z]
+        )
+        recall = hits / sum(len(truth[z]) for z in zpids)
+        label = f"coarse nprobe={nprobe}"
+        print(f"{label:<16} {build:>7.1f}s {percentile(samples, 50):>7.2f}ms {percentile(samples, 99):>7.2f}ms {recall:>9.3f}")
+
+    new = synthetic_homes(args.upserts, seed=2)
+    for home in new:
+        home["zpid"] = "new-" + home["zpid"]
+    for label, index in (("exact", exact), ("coarse", approx)):
+        start = time.perf_counter()
+        for i in range(0, len(new), 40):
+            # Search results arrive a page (~40 listings) at a time.
+            index.upsert(new[i:i + 40])
+        seconds = time.perf_counter() - start
+        print(f"upsert {args.upserts} listings ({label}) {seconds * 1000:.0f} ms, "
+              f"{seconds / args.upserts * 1e6:.0f} us per listing")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Measure cold start: interpreter launch -> import app -> create_app() -> first response.
+
+Each run is a fresh subprocess so nothing is warm. Run it on two commits to compare.
+
+    python -m bench.startup_bench --runs 5 --path /api/health
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CHILD = """
+import time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+response = app.test_client().get({path!r})
+done = time.perf_counter()
+print(imported - start, done - start, response.status_code)
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/api/health")
+    args = parser.parse_args()
+
+    server_dir = os.path.join(os.path.dirname(__file__), "..")
+    imports, firsts, walls = [], [], []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD.format(path=args.path)],
+            cwd=server_dir, capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        walls.append(time.perf_counter() - start)
+        imported, first, status = out.split()
+        imports.append(float(imported))
+        firsts.append(float(first))
+
+    print(f"{args.path} (status {status}), median of {args.runs} runs")
+    print(f"  import app            {statistics.median(imports) * 1000:8.1f} ms")
+    print(f"  import-to-response    {statistics.median(firsts) * 1000:8.1f} ms")
+    print(f"  process wall clock    {statistics.median(walls) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
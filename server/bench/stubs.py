@@ -0,0 +1,157 @@
+"""Local stand-ins for the Zillow (RapidAPI) and OpenAI upstreams used by the benchmarks."""
+import collections
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def fake_listing(zpid, city="Detroit"):
+    return {
+        "zpid": zpid,
+        "address": f"{zpid} Main St, {city}, MI 48201",
+        "price": 150000 + (zpid % 50) * 5000,
+        "bedrooms": 1 + zpid % 5,
+        "bathrooms": 1 + zpid % 3,
+        "imgSrc": f"https://photos.example.com/{zpid}.jpg",
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive between requests.
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    token_interval = 0.02
+    results_per_search = 40
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        if url.path.endswith("/propertyExtendedSearch"):
+            city = params.get("location", ["Detroit"])[0].split(",")[0].title()
+            props = [fake_listing(i, city) for i in range(1, self.results_per_search + 1)]
+            self._send_json({"props": props})
+        elif url.path.endswith("/property"):
+            self.server.property_requests = getattr(self.server, "property_requests", 0) + 1
+            self._send_json(fake_listing(int(params.get("zpid", ["1"])[0])))
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        # Benchmarks that inspect prompts set server.bodies to a list.
+        bodies = getattr(self.server, "bodies", None)
+        if bodies is not None:
+            bodies.append(body)
+        time.sleep(self.latency)
+        if self.path.endswith("/chat/completions") and body.get("stream"):
+            self._stream_completion(body)
+        elif self.path.endswith("/chat/completions"):
+            self._send_json(fake_completion(body))
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def _stream_completion(self, body):
+        """Emit an OpenAI-style SSE stream, one word per chunk, token_interval apart."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        words = ("Here is some stub advice about buying a home. " * 10).split()
+        try:
+            for word in words:
+                chunk = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                self.server.streamed_chunks = getattr(self.server, "streamed_chunks", 0) + 1
+                time.sleep(self.token_interval)
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The API closed the stream (e.g. its client disconnected); stop generating.
+            self.server.cancelled_streams = getattr(self.server, "cancelled_streams", 0) + 1
+        self.close_connection = True
+
+
+class RateLimitedStubHandler(StubHandler):
+    """Like StubHandler, but completions past `per_second` in a rolling second get OpenAI-style 429s."""
+
+    per_second = 10
+    _limit_lock = threading.Lock()
+
+    def _retry_after(self):
+        """0 if this completion is within the limit, else seconds until a slot frees up."""
+        now = time.monotonic()
+        with self._limit_lock:
+            window = self.server.__dict__.setdefault("completion_times", collections.deque())
+            while window and window[0] <= now - 1.0:
+                window.popleft()
+            if len(window) < self.per_second:
+                window.append(now)
+                return 0.0
+            return window[0] + 1.0 - now
+
+    def do_POST(self):
+        wait = self._retry_after() if self.path.endswith("/chat/completions") else 0.0
+        if not wait:
+            self.server.completions = getattr(self.server, "completions", 0) + 1
+            return super().do_POST()
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.rejected = getattr(self.server, "rejected", 0) + 1
+        body = json.dumps({"error": {"message": "Rate limit reached", "type": "requests",
+                                     "code": "rate_limit_exceeded"}}).encode()
+        self.send_response(429)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("retry-after-ms", str(int(wait * 1000)))
+        self.send_header("Retry-After", str(math.ceil(wait)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def fake_completion(body):
+    tasks = [
+        {"title": f"Task {i}", "category": "finance", "due_date": "within 2 weeks", "priority": "high"}
+        for i in range(6)
+    ]
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": json.dumps(tasks)},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 120, "completion_tokens": 180, "total_tokens": 300},
+    }
+
+
+def start_stub_server(latency=0.0, handler=StubHandler, port=0):
+    """Start a stub upstream on a background thread and return (server, base_url)."""
+    handler_cls = type("ConfiguredStubHandler", (handler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler_cls)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
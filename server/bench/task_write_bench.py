@@ -0,0 +1,84 @@
+"""Round-trips and wall-clock for replacing a user's tasks: insert_one loop vs. one bulk write.
+
+Needs a local mongod (no TLS):
+
+    python -m bench.task_write_bench --mongo mongodb://localhost:27017/homefinder_bench
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from pymongo import MongoClient, monitoring
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def make_tasks(user_id, n):
+    return [
+        {"title": f"Task {i}", "category": "finance", "due_date": "within 2 weeks",
+         "priority": "high", "completed": False, "userId": user_id}
+        for i in range(n)
+    ]
+
+
+def legacy_replace(db, user_id, docs):
+    """The original generate_tasks write path."""
+    db["Task"].delete_many({"userId": user_id})
+    for doc in docs:
+        db["Task"].insert_one(dict(doc))
+
+
+def measure(label, fn, counter, iterations, tasks_per_user):
+    counter.count = 0
+    timings = []
+    for i in range(iterations):
+        docs = make_tasks(f"user-{i % 50}", tasks_per_user)
+        start = time.perf_counter()
+        fn(f"user-{i % 50}", docs)
+        timings.append(time.perf_counter() - start)
+    ms = np.array(timings) * 1000
+    print(f"{label:<18} {counter.count / iterations:6.1f} round-trips/req   "
+          f"p50 {np.percentile(ms, 50):6.2f} ms   p99 {np.percentile(ms, 99):6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default="mongodb://localhost:27017/homefinder_bench")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--tasks", type=int, default=7)
+    args = parser.parse_args()
+
+    counter = CommandCounter()
+    monitoring.register(counter)
+    os.environ.update({"DATABASE_URL": args.mongo, "MONGO_TLS": "0"})
+
+    from app import task_repository
+    from app.db import db
+
+    measure("insert_one loop", lambda u, docs: legacy_replace(db, u, docs), counter, args.iterations, args.tasks)
+    measure("replace_tasks", task_repository.replace_tasks, counter, args.iterations, args.tasks)
+
+    plans = {f"user-{i}": make_tasks(f"user-{i}", args.tasks) for i in range(200)}
+    counter.count = 0
+    start = time.perf_counter()
+    task_repository.replace_many(plans)
+    print(f"replace_many x200   {counter.count} round-trips   {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    MongoClient(args.mongo).drop_database(db.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""gunicorn settings for production. From server/:
+
+    gunicorn -c gunicorn.conf.py
+
+The app is imported once in the master (preload_app), which loads the
+forecast model and similar-homes index before forking workers, so they start
+warm and share that memory copy-on-write (see app/prefork.py).
+
+Graceful reload: `kill -HUP <master>` replaces the workers one generation at
+a time, letting in-flight requests finish within graceful_timeout. Workers
+are forked from the preloaded master, so HUP does not pick up new code (a new
+forecast model file is picked up by the workers anyway); to deploy code
+without dropping connections, `kill -USR2 <master>` starts a new master
+alongside, then `kill -QUIT <old master>`.
+
+Metrics (/api/metrics) and in-process caches are per worker.
+"""
+import os
+
+
+def available_cpus():
+    try:
+        # Respects CPU pinning (taskset, container cpusets), unlike os.cpu_count().
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+CPUS = available_cpus()
+
+wsgi_app = "app.wsgi:application"
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+preload_app = True
+
+# Requests mostly wait on Mongo, Zillow and OpenAI, so each worker runs a few
+# threads; the processes are what spread CPU work (JSON, numpy) past the GIL.
+workers = int(os.getenv("WEB_CONCURRENCY", str(2 * CPUS + 1)))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+# Every worker has its own password-hashing pool. Each may use every core: pools
+# start processes only as hashes arrive, and the kernel shares the cores when
+# several workers hash at once. Splitting the cores (CPUS // workers) would leave
+# one process per worker, and HashPoolBusy 503s would start at about one
+# concurrent login per worker. Set PASSWORD_HASH_WORKERS (and
+# PASSWORD_HASH_MAX_PENDING, default 4 per hash process) to override.
+os.environ.setdefault("PASSWORD_HASH_WORKERS", str(CPUS))
+
+# Seconds a worker may go silent before it is restarted. gthread workers keep
+# heartbeating while requests run, so slow LLM calls don't trip it.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+# Time in-flight requests (including chat streams) get to finish on reload/stop.
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Recycle workers after this many requests (0 = never); jitter staggers the restarts.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+# Heartbeat files on tmpfs: a slow or full disk under /tmp can't stall workers.
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+# The app writes its own structured access lines (app/metrics.py).
+accesslog = None
+
+
+def post_fork(server, worker):
+    from app.prefork import after_fork
+
+    after_fork()
+
+
+def worker_exit(server, worker):
+    from app.prefork import before_exit
+
+    before_exit()
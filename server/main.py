@@ -1,7 +1,11 @@
+import os
+
 from app import create_app
 
 app = create_app()
 
 if __name__ == "__main__":
-    print(" Starting Flask app...")
-    app.run(debug=True, port=5000)
+    # Development only: single process, and the reloader/debugger when FLASK_DEBUG=1.
+    # Production: gunicorn -c gunicorn.conf.py (see gunicorn.conf.py).
+    print(" Starting Flask development server...")
+    app.run(debug=os.getenv("FLASK_DEBUG", "1") == "1", port=int(os.getenv("PORT", "5000")))
@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+os.environ.setdefault("MONGO_TRANSACTIONS", "0")
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """Point app.db at a fresh in-memory mongomock database."""
+    mongomock = pytest.importorskip("mongomock")
+    from mongomock.collection import BulkOperationBuilder
+
+    import app.db
+
+    # pymongo passes sort= for UpdateOne, which mongomock's bulk builder doesn't take yet.
+    add_update = BulkOperationBuilder.add_update
+    monkeypatch.setattr(
+        BulkOperationBuilder, "add_update", lambda self, *args, sort=None, **kwargs: add_update(self, *args, **kwargs)
+    )
+    client = mongomock.MongoClient("mongodb://localhost/test")
+    monkeypatch.setattr(app.db, "_client", client)
+    monkeypatch.setattr(app.db, "_client_pid", os.getpid())
+    return client.get_database()
+
+
+@pytest.fixture
+def client(mongo):
+    from app import create_app
+
+    return create_app(background=False).test_client()
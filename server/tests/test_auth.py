@@ -0,0 +1,29 @@
+from itsdangerous import URLSafeTimedSerializer
+
+from app.auth import issue_token
+
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def foreign_token(user_id):
+    """A token signed with a key this process doesn't have (another worker's, or from before a restart)."""
+    return URLSafeTimedSerializer("some-other-key", salt="auth-token").dumps(user_id)
+
+
+def test_unverifiable_token_falls_back_to_user_id(client):
+    response = client.get("/api/tasks?user_id=u1", headers=bearer(foreign_token("u1")))
+    assert response.status_code == 200
+
+
+def test_endpoints_needing_a_token_say_why(client):
+    response = client.get("/api/me", headers=bearer(foreign_token("u1")))
+    assert response.status_code == 401
+    assert response.json["error"] == "Invalid token"
+    assert client.get("/api/me").json["error"] == "Authorization required"
+
+
+def test_token_must_match_claimed_user(client):
+    response = client.get("/api/tasks?user_id=u2", headers=bearer(issue_token("u1")))
+    assert response.status_code == 403
@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+from app.cache import AsyncSingleFlight, TieredCache, TTLCache, cache_stats
+
+
+def test_follower_survives_cancelled_leader():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return len(calls)
+
+        leader = asyncio.create_task(flight.do("key", load))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(flight.do("key", load))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+
+        result = await follower
+        assert leader.cancelled()
+        # The follower took over and ran the load itself.
+        assert result == 2
+        assert calls == [1, 1]
+
+    asyncio.run(scenario())
+
+
+def test_followers_share_the_leaders_result():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "value"
+
+        results = await asyncio.gather(*(flight.do("key", load) for _ in range(5)))
+        assert results == ["value"] * 5
+        assert len(calls) == 1
+        assert flight.coalesced == 4
+
+    asyncio.run(scenario())
+
+
+def test_lru_evicts_the_least_recently_used():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.evictions == 1
+
+
+def test_entries_expire():
+    cache = TTLCache(ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+
+
+def test_tiered_cache_loads_once_and_registers_its_stats():
+    cache = TieredCache("test_tiered", maxsize=4, ttl=60)
+    calls = []
+
+    def load():
+        calls.append(1)
+        return {"value": len(calls)}
+
+    assert cache.get_or_load("k", load) == {"value": 1}
+    assert cache.get_or_load("k", load) == {"value": 1}
+    assert cache.loads == 1
+
+    assert cache_stats()["test_tiered"]["local"]["hits"] >= 1
+
+
+def test_none_results_are_not_cached():
+    cache = TieredCache("test_tiered_none", ttl=60)
+    calls = []
+    cache.get_or_load("k", lambda: calls.append(1))
+    cache.get_or_load("k", lambda: calls.append(1))
+    assert len(calls) == 2
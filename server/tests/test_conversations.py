@@ -0,0 +1,72 @@
+import pytest
+
+import app.conversations as conversations
+from app.conversations import build_messages, compact, make_turn, message_tokens, remember, turns_to_fold
+
+
+@pytest.fixture
+def budgets(monkeypatch):
+    monkeypatch.setattr(conversations, "HISTORY_TOKENS", 100)
+    monkeypatch.setattr(conversations, "KEEP_TOKENS", 40)
+    monkeypatch.setattr(conversations, "CONTEXT_TOKENS", 200)
+    monkeypatch.setattr(conversations, "schedule_compaction", lambda conversation_id: None)
+
+
+def exchange(n, size=36):
+    """n question/answer pairs of about size/4 tokens each."""
+    turns = []
+    for i in range(n):
+        turns += [make_turn("user", f"q{i} ".ljust(size, ".")), make_turn("assistant", f"a{i} ".ljust(size, "."))]
+    return turns
+
+
+def test_nothing_is_folded_under_the_history_budget(budgets):
+    assert turns_to_fold(exchange(5)) == []  # 10 turns x 10 tokens
+
+
+def test_folds_down_to_the_keep_budget_starting_at_a_question(budgets):
+    turns = exchange(8)
+    folded = turns_to_fold(turns)
+    kept = turns[len(folded):]
+
+    assert folded == turns[:len(folded)]
+    assert sum(turn["tokens"] for turn in kept) <= 40
+    assert kept[0]["role"] == "user"
+
+
+def test_always_keeps_the_latest_turn(budgets):
+    turns = [make_turn("user", "x" * 800)]
+    assert turns_to_fold(turns) == []
+
+
+def test_prompt_stays_within_budget_and_keeps_the_newest_turns(mongo, budgets):
+    conversation = {"userId": "u1", "summary": "Budget is $400k.", "turns": exchange(20)}
+    messages = build_messages(conversation, "What about Ames?")
+
+    assert message_tokens(messages) <= 200
+    assert messages[1]["content"].endswith("Budget is $400k.")
+    assert messages[-1] == {"role": "user", "content": "What about Ames?"}
+    assert messages[-2]["content"] == conversation["turns"][-1]["content"]
+
+
+def test_prompt_prefix_is_stable_between_turns(mongo, budgets):
+    conversation = {"userId": "u1", "summary": "", "turns": exchange(2)}
+    before = build_messages(conversation, "first")
+    conversation["turns"] += exchange(1)
+    after = build_messages(conversation, "second")
+    assert after[:len(before) - 1] == before[:-1]
+
+
+def test_compaction_folds_turns_into_the_summary(mongo, budgets, monkeypatch):
+    monkeypatch.setattr(conversations, "summarize", lambda summary, turns: f"{len(turns)} turns folded")
+    conversation = conversations.open_conversation("u1")
+    for i in range(8):
+        remember(conversation, f"q{i} ".ljust(36, "."), f"a{i} ".ljust(36, "."))
+
+    assert compact(conversation["_id"])
+    doc = mongo["Conversation"].find_one({"_id": conversation["_id"]})
+    assert doc["compactions"] == 1
+    assert doc["summary"] == f"{doc['summarizedTurns']} turns folded"
+    assert doc["summarizedTurns"] + len(doc["turns"]) == 16
+    assert sum(turn["tokens"] for turn in doc["turns"]) <= 40
+    assert not compact(conversation["_id"])
@@ -0,0 +1,44 @@
+import pytest
+from pymongo import ASCENDING
+
+import app.migrations as migrations
+import app.routes as routes
+
+
+@pytest.fixture(autouse=True)
+def no_index_updates(monkeypatch):
+    monkeypatch.setattr(routes, "index_homes", lambda homes: None)
+
+
+def test_adding_a_favorite_twice_stores_it_once(client, mongo):
+    first = client.post("/api/favorites", json={"userId": "u1", "zpid": 123, "title": "12 Elm St"})
+    again = client.post("/api/favorites", json={"userId": "u1", "zpid": "123"})
+
+    assert (first.status_code, again.status_code) == (201, 200)
+    assert list(mongo["Favorite"].find({}, {"_id": 0, "userId": 1, "zpid": 1})) == [{"userId": "u1", "zpid": "123"}]
+
+
+def test_batch_add_counts_duplicates_and_invalid_items(client, mongo):
+    client.post("/api/favorites", json={"userId": "u1", "zpid": "1"})
+    body = {"userId": "u1", "favorites": [{"zpid": "1"}, {"zpid": 2}, {"zpid": "2"}, {}, 5, None]}
+
+    response = client.post("/api/favorites/batch", json=body)
+    assert response.status_code == 201
+    assert response.json == {"added": 1, "existing": 1, "invalid": [3, 4, 5]}
+    assert sorted(mongo["Favorite"].distinct("zpid")) == ["1", "2"]
+
+
+def test_migration_normalizes_dedupes_and_retires_old_indexes(mongo, monkeypatch):
+    monkeypatch.setattr(migrations, "VALIDATORS", {})  # mongomock has no collMod
+    favorites = mongo["Favorite"]
+    favorites.insert_many([{"userId": "u1", "zpid": 123}, {"userId": "u1", "zpid": "123"}, {"userId": "u2", "zpid": 7}])
+    favorites.create_index([("userId", ASCENDING)])
+    favorites.create_index([("userId", ASCENDING), ("_id", ASCENDING)])
+
+    migrations.migrate(log=lambda message: None)
+    migrations.migrate(log=lambda message: None)  # idempotent
+
+    assert sorted((doc["userId"], doc["zpid"]) for doc in favorites.find()) == [("u1", "123"), ("u2", "7")]
+    indexes = favorites.index_information()
+    assert "userId_1" not in indexes and "userId_1__id_1" not in indexes
+    assert indexes["userId_1_zpid_1"]["unique"]
@@ -0,0 +1,44 @@
+import pytest
+
+import app.routes as routes
+from app.forecast import ForecastEngine
+
+YEARS = [str(y) for y in range(2026, 2031)]
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    model = {
+        "forecast": {y: 100.0 + i for i, y in enumerate(YEARS)},
+        "lower": {y: 90.0 + i for i, y in enumerate(YEARS)},
+        "upper": {y: 110.0 + i for i, y in enumerate(YEARS)},
+        "confidence": 95,
+    }
+    engine = ForecastEngine(model)
+    monkeypatch.setattr(routes, "get_forecast_engine", lambda: engine)
+    return engine
+
+
+@pytest.mark.parametrize("homes, invalid", [
+    ([5], [0]),
+    ([{"price": 200_000}, "house", None, {"price": -1}, {"price": True}], [1, 2, 3, 4]),
+    ([{"price": 200_000}, [], {}], [1, 2]),
+])
+def test_batch_reports_invalid_homes(client, engine, homes, invalid):
+    response = client.post("/api/forecast/batch", json={"homes": homes})
+    assert response.status_code == 400
+    assert response.json["invalid"] == invalid
+
+
+@pytest.mark.parametrize("body", [None, [], {"homes": "x"}, {"homes": {"price": 1}}])
+def test_batch_needs_a_list_of_homes(client, engine, body):
+    response = client.post("/api/forecast/batch", json=body)
+    assert response.status_code == 400
+
+
+def test_batch_forecasts_every_home(client, engine):
+    response = client.post("/api/forecast/batch", json={"homes": [{"price": 200_000}, {"price": 100_000, "city": "Ames"}]})
+    assert response.status_code == 200
+    forecasts = response.json["forecasts"]
+    assert [f["home"]["price"] for f in forecasts] == [200_000, 100_000]
+    assert forecasts[1]["forecast"][0] == {"date": "2026", "price": 100_000.0, "min": 90_000.0, "max": 110_000.0}
@@ -0,0 +1,40 @@
+import app.routes as routes
+from app.listings import location_match, save_listings, search_listings, stale_search
+
+
+def home(zpid, city="Detroit"):
+    return {"id": str(zpid), "title": f"{zpid} Main St", "city": city, "price": 100_000, "bedrooms": 3}
+
+
+def location_zpids(location):
+    page = search_listings(location_match(location, "ForSale", "Houses", {}))
+    return sorted(result["id"] for result in page["results"])
+
+
+def test_refresh_drops_homes_no_longer_returned(mongo):
+    save_listings([home(1), home(2), home(3)], "detroit, mi", "ForSale", "Houses")
+    save_listings([home(1), home(3)], "detroit, mi", "ForSale", "Houses")
+    assert location_zpids("detroit, mi") == ["1", "3"]
+
+
+def test_stale_search_stays_within_the_location(mongo):
+    save_listings([home(1)], "detroit, mi", "ForSale", "Houses")
+    save_listings([home(2, "Lansing, MI")], "lansing, mi", "ForSale", "Houses")
+
+    page = stale_search("detroit, mi", "ForSale", "Houses", {}, None)
+    assert [result["id"] for result in page["results"]] == ["1"]
+
+
+def test_repeat_search_is_served_from_the_page_cache(client, monkeypatch):
+    save_listings([home(1), home(2)], "austin, tx", "ForSale", "Houses")
+    routes.search_cache.local.clear()
+    calls = []
+    monkeypatch.setattr(routes, "is_covered", lambda *args: calls.append(args) or True)
+
+    first = client.get("/api/search?q=Austin, TX").json
+    second = client.get("/api/search?q=austin,tx").json
+    assert first["total"] == second["total"] == 2
+    assert len(calls) == 1
+
+    client.get("/api/search?q=austin,tx&bedrooms=4")
+    assert len(calls) == 2
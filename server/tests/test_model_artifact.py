@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from app.forecast import ForecastEngine
+from app.model_artifact import ModelArtifact
+
+YEARS = [str(y) for y in range(2021, 2031)]
+
+
+def curve(start, step):
+    forecast = {y: start + step * i for i, y in enumerate(YEARS)}
+    return {"forecast": forecast, "lower": {y: p * 0.9 for y, p in forecast.items()},
+            "upper": {y: p * 1.1 for y, p in forecast.items()}}
+
+
+MODEL = {**curve(100.0, 2.0), "confidence": 90, "regions": {"ames": curve(200.0, 10.0)}}
+
+
+def test_saved_artifact_forecasts_like_the_dict(tmp_path):
+    path = tmp_path / "model.hpm"
+    ModelArtifact.from_dict(MODEL).save(path)
+    mapped = ForecastEngine(ModelArtifact.open(path))
+    in_memory = ForecastEngine(MODEL)
+
+    assert mapped.confidence == 90
+    for city in (None, "Ames", "Elsewhere"):
+        assert mapped.forecast_one(300_000, city) == in_memory.forecast_one(300_000, city)
+    # 2026 is the sixth year of the Ames curve: (200 + 50) / 200 of the base price.
+    assert mapped.forecast_one(300_000, " AMES ")[0]["price"] == 375_000.0
+
+
+def test_engine_serves_a_view_of_the_mapping(tmp_path):
+    path = tmp_path / "model.hpm"
+    ModelArtifact.from_dict(MODEL).save(path)
+    artifact = ModelArtifact.open(path)
+    engine = ForecastEngine(artifact)
+
+    assert isinstance(artifact.ratios, np.memmap)
+    assert np.shares_memory(engine.ratios, artifact.ratios)
+
+
+def test_regions_must_share_the_national_years():
+    model = {**MODEL, "regions": {"ames": {"forecast": {"2021": 1.0}}}}
+    with pytest.raises(ValueError, match="ames"):
+        ModelArtifact.from_dict(model)
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "model.hpm"
+    path.write_bytes(b"not a model")
+    with pytest.raises(ValueError):
+        ModelArtifact.open(path)
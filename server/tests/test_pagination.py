@@ -0,0 +1,51 @@
+import pytest
+
+import app.auth
+
+INTERNAL = {"X-Internal-Token": "internal-secret"}
+
+
+@pytest.fixture
+def tasks(mongo, monkeypatch):
+    monkeypatch.setattr(app.auth, "INTERNAL_API_TOKEN", "internal-secret")
+    mongo["Task"].insert_many([
+        {"title": f"task {i}", "userId": user_id, "completed": False}
+        for i, user_id in enumerate(["u1", "u1", "u1", "u2"])
+    ])
+
+
+@pytest.mark.parametrize("query", ["", "?limit=2", "?after=000000000000000000000000", "?stream=1"])
+def test_unscoped_task_reads_are_refused(client, tasks, query):
+    assert client.get(f"/api/tasks{query}").status_code == 400
+
+
+def test_pages_stay_within_the_user(client, tasks):
+    first = client.get("/api/tasks?user_id=u1&limit=2").json
+    assert len(first["tasks"]) == 2
+    rest = client.get(f"/api/tasks?user_id=u1&limit=2&after={first['next_cursor']}").json
+    assert len(rest["tasks"]) == 1
+    assert rest["next_cursor"] is None
+    assert sorted(task["title"] for task in first["tasks"] + rest["tasks"]) == ["task 0", "task 1", "task 2"]
+
+
+def test_full_list_without_paging_args(client, tasks):
+    response = client.get("/api/tasks?user_id=u1")
+    assert len(response.json["tasks"]) == 3
+    # One body rather than a stream, so it can be revalidated and compressed.
+    assert response.headers.get("ETag")
+
+    streamed = client.get("/api/tasks?user_id=u1&stream=1")
+    assert streamed.is_streamed
+    assert streamed.json == response.json
+
+
+def test_internal_callers_page_through_everything(client, tasks):
+    assert len(client.get("/api/tasks?limit=10", headers=INTERNAL).json["tasks"]) == 4
+    assert client.get("/api/tasks", headers=INTERNAL).status_code == 400
+    assert client.get("/api/tasks?limit=10", headers={"X-Internal-Token": "wrong"}).status_code == 400
+
+
+def test_user_list_is_internal_only(client, tasks, mongo):
+    mongo["User"].insert_one({"email": "a@example.com", "password": "x"})
+    assert client.get("/api/users?limit=10").status_code == 400
+    assert client.get("/api/users?limit=10", headers=INTERNAL).json["users"][0]["email"] == "a@example.com"
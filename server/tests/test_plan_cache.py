@@ -0,0 +1,24 @@
+from app.plan_cache import plan_key
+from app.routes import TASK_MODEL, build_task_prompt
+
+
+def test_key_determines_prompt():
+    first = (712, "I'd like to refi", {"title": "12 Elm St", "price": 250_000})
+    second = (688, "refinancing", {"title": "9 Oak Ave", "price": 180_000})
+
+    assert plan_key(TASK_MODEL, *first) == plan_key(TASK_MODEL, *second)
+    assert build_task_prompt(*first) == build_task_prompt(*second)
+
+
+def test_prompt_has_no_user_details():
+    prompt = build_task_prompt(712, "refi", {"title": "12 Elm St", "price": 250_000})
+    assert "12 Elm St" not in prompt
+    assert "712" not in prompt
+    assert "250000" not in prompt
+
+
+def test_different_bands_get_different_plans():
+    house = {"title": "12 Elm St", "price": 250_000}
+    assert plan_key(TASK_MODEL, 712, "refi", house) != plan_key(TASK_MODEL, 812, "refi", house)
+    assert plan_key(TASK_MODEL, 712, "refi", house) != plan_key(TASK_MODEL, 712, "buying", house)
+    assert plan_key(TASK_MODEL, 712, "refi", house) != plan_key(TASK_MODEL, 712, "refi", {"price": 900_000})
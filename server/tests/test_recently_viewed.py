@@ -0,0 +1,60 @@
+import pytest
+
+import app.recently_viewed as recently_viewed
+from app.recently_viewed import ViewBuffer, flush_views, make_view, merge_views
+
+
+@pytest.fixture
+def views(mongo, monkeypatch):
+    monkeypatch.setattr(recently_viewed, "buffer", ViewBuffer())
+    monkeypatch.setattr(recently_viewed, "HISTORY_SIZE", 3)
+    recently_viewed.history_cache.local.clear()
+    return recently_viewed.buffer
+
+
+def stored(mongo, user_id="u1"):
+    return [view["homeId"] for view in mongo["ViewHistory"].find_one({"_id": user_id})["views"]]
+
+
+def view_all(buffer, *home_ids, user_id="u1"):
+    for home_id in home_ids:
+        buffer.add(user_id, make_view(home_id))
+
+
+def test_history_update_prepends_dedupes_and_caps(mongo, views):
+    view_all(views, "a", "b")
+    flush_views()
+    assert stored(mongo) == ["b", "a"]
+
+    view_all(views, "c", "a", "d")
+    flush_views()
+    assert stored(mongo) == ["d", "a", "c"]
+
+
+def test_titles_starting_with_a_dollar_are_stored_verbatim(mongo, views):
+    views.add("u1", make_view("a", {"title": "$450k condo"}))
+    flush_views()
+    assert mongo["ViewHistory"].find_one({"_id": "u1"})["views"][0]["title"] == "$450k condo"
+
+
+def test_buffer_coalesces_repeat_views(views):
+    view_all(views, "a", "b", "a")
+    assert len(views) == 2
+    assert views.coalesced == 1
+    assert [view["homeId"] for view in views.pending("u1")] == ["a", "b"]
+
+
+def test_merge_views_keeps_the_newest_view_of_each_home():
+    newest = [make_view("b"), make_view("a")]
+    older = [make_view("c"), make_view("b")]
+    assert [view["homeId"] for view in merge_views(newest, older, limit=5)] == ["b", "a", "c"]
+
+
+@pytest.mark.parametrize("limit, expected", [("0", 1), ("-3", 1), ("2", 2), ("99", 3)])
+def test_limit_is_clamped(client, views, monkeypatch, limit, expected):
+    monkeypatch.setattr("app.routes.VIEW_HISTORY_SIZE", 3)
+    view_all(views, "a", "b", "c")
+    flush_views()
+    response = client.get(f"/api/recently-viewed?userId=u1&limit={limit}")
+    assert response.status_code == 200
+    assert len(response.json["views"]) == expected
@@ -0,0 +1,40 @@
+from app.similar_homes import SimilarHomesIndex
+from bench.similar_homes_bench import synthetic_homes
+
+
+def home(zpid, price, bedrooms=3, city="Ames"):
+    return {"zpid": zpid, "price": price, "bedrooms": bedrooms, "bathrooms": 2, "city": city}
+
+
+def test_nearest_prefers_same_city_and_similar_price():
+    index = SimilarHomesIndex([
+        home("a", 250_000), home("b", 255_000), home("c", 900_000),
+        home("d", 252_000, city="Detroit"), home("e", 250_000, bedrooms=6),
+    ])
+    assert [zpid for zpid, _ in index.similar("a", k=2)] == ["b", "e"]
+    assert index.similar("missing") is None
+
+
+def test_upsert_adds_and_re_encodes_homes():
+    index = SimilarHomesIndex([home("a", 250_000), home("b", 900_000), home("c", 400_000)])
+    index.upsert([home("d", 251_000), home("b", 249_000), {"zpid": "bad", "price": 0}])
+
+    assert len(index) == 4 and "bad" not in index
+    assert {zpid for zpid, _ in index.similar("a", k=2)} == {"b", "d"}
+
+
+def test_coarse_index_finds_most_exact_neighbours():
+    homes = synthetic_homes(5000, cities=50)
+    exact = SimilarHomesIndex(homes, approx_min_size=len(homes) + 1)
+    coarse = SimilarHomesIndex(homes, approx_min_size=0, nprobe=16)
+    assert coarse.approximate and not exact.approximate
+
+    queries = [h["zpid"] for h in homes[::250]]
+    hits = total = 0
+    for zpid in queries:
+        truth = exact.similar(zpid, k=10)
+        found = coarse.similar(zpid, k=10)
+        total += len(truth)
+        # Ties at the k-th distance make several answers correct.
+        hits += sum(d <= truth[-1][1] + 1e-5 for _, d in found)
+    assert hits / total >= 0.9
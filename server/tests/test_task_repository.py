@@ -0,0 +1,44 @@
+import pytest
+
+from app import task_repository
+from app.task_repository import replace_many, replace_tasks
+
+
+def plan(user_id, n=2):
+    return [{"title": f"{user_id} task {i}", "userId": user_id} for i in range(n)]
+
+
+@pytest.fixture
+def chunks(monkeypatch):
+    monkeypatch.setattr(task_repository, "WRITE_CHUNK_USERS", 2)
+    writes = []
+    write = task_repository._bulk_write
+    monkeypatch.setattr(task_repository, "_bulk_write", lambda ops: writes.append(len(ops)) or write(ops))
+    return writes
+
+
+def test_replace_many_commits_in_bounded_chunks(mongo, chunks):
+    replace_tasks("u0", plan("u0", 5))
+    plans = {f"u{i}": plan(f"u{i}") for i in range(5)}
+
+    assert replace_many(plans) == {}
+    # 1 single-user write, then 3 chunks: 2 + 2 + 1 users, each a delete plus its inserts.
+    assert chunks == [6, 6, 6, 3]
+    assert mongo["Task"].count_documents({"userId": "u0"}) == 2
+    assert mongo["Task"].count_documents({}) == 10
+
+
+def test_a_failed_chunk_only_loses_its_own_users(mongo, chunks, monkeypatch):
+    write = task_repository._bulk_write
+
+    def flaky(ops):
+        if any(getattr(op, "_doc", {}).get("userId") == "u2" for op in ops):
+            raise RuntimeError("transaction too large")
+        write(ops)
+
+    monkeypatch.setattr(task_repository, "_bulk_write", flaky)
+    plans = {f"u{i}": plan(f"u{i}") for i in range(5)}
+
+    assert replace_many(plans) == {"u2": "transaction too large", "u3": "transaction too large"}
+    assert sorted(plans) == ["u0", "u1", "u4"]
+    assert sorted(mongo["Task"].distinct("userId")) == ["u0", "u1", "u4"]